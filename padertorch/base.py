@@ -6,6 +6,7 @@ by instances of pytorch.train.Trainer.
 """
 import io
 import abc
+import time
 from pathlib import Path
 
 import numpy as np
@@ -14,6 +15,7 @@ from torch import nn
 
 from paderbox.utils.nested import deflatten
 from padertorch.configurable import Configurable
+from padertorch.train import checkpoint as checkpoint_utils
 
 __all__ = [
     'Module',
@@ -51,6 +53,7 @@ class Module(nn.Module, Configurable, abc.ABC):
 
             map_location='cpu',
             consider_mpi=False,
+            mmap=False,
     ) -> 'Module':
         """Instantiate the module from given config and checkpoint.
 
@@ -64,6 +67,13 @@ class Module(nn.Module, Configurable, abc.ABC):
                 If True and mpi is used, only read config_path and
                 checkpoint_path once and broadcast the content with mpi.
                 Reduces the io load.
+            mmap:
+                If True, memory map the checkpoint instead of reading it
+                (see `padertorch.train.checkpoint.torch_load`). Only the
+                tensors of `in_checkpoint_path` are read from the disk and
+                the pages are shared between all processes on the same
+                host. With consider_mpi, each process maps the checkpoint,
+                instead of broadcasting the content.
 
         Returns:
         
@@ -82,8 +92,13 @@ class Module(nn.Module, Configurable, abc.ABC):
         )
 
         # Load weights
+        start = time.perf_counter()
         if consider_mpi:
             import dlp_mpi
+        # With mmap, each process maps the file. The operating system shares
+        # the pages between the processes on the same host.
+        broadcast = consider_mpi and not mmap
+        if broadcast:
             if dlp_mpi.IS_MASTER:
                 checkpoint_path_content = Path(checkpoint_path).read_bytes()
             else:
@@ -95,7 +110,9 @@ class Module(nn.Module, Configurable, abc.ABC):
                 map_location=map_location,
             )
         else:
-            checkpoint = torch.load(checkpoint_path, map_location=map_location)
+            checkpoint = checkpoint_utils.torch_load(
+                checkpoint_path, map_location=map_location, mmap=mmap
+            )
 
         if in_checkpoint_path:
             for part in in_checkpoint_path.split('.'):
@@ -104,8 +121,41 @@ class Module(nn.Module, Configurable, abc.ABC):
                     checkpoint = checkpoint[part]
                 except KeyError:
                     raise ValueError(part, in_checkpoint_path, checkpoint)
+
+        # Checkpoints of Trainer(deduplicate_checkpoints=True) reference
+        # the tensors. Load only the tensors of in_checkpoint_path.
+        digests = checkpoint_utils.tensor_blob_digests(checkpoint)
+        if digests:
+            blob_store = checkpoint_utils.TensorBlobStore(
+                checkpoint_path.parent
+            )
+            if broadcast:
+                if dlp_mpi.IS_MASTER:
+                    blobs = {
+                        digest: blob_store.blob_path(digest).read_bytes()
+                        for digest in digests
+                    }
+                else:
+                    blobs = None
+                blobs = dlp_mpi.bcast(blobs)
+                checkpoint = checkpoint_utils.resolve_tensor_blobs(
+                    checkpoint,
+                    lambda digest: torch.load(
+                        io.BytesIO(blobs[digest]), map_location=map_location
+                    ),
+                )
+            else:
+                checkpoint = blob_store.resolve(
+                    checkpoint, map_location=map_location, mmap=mmap
+                )
         module.load_state_dict(checkpoint)
 
+        if not consider_mpi or dlp_mpi.IS_MASTER:
+            print(
+                f'Loaded {in_checkpoint_path or "checkpoint"} from '
+                f'{checkpoint_path} in {time.perf_counter() - start:.2f} s'
+            )
+
         return module
 
     @classmethod
@@ -117,6 +167,7 @@ class Module(nn.Module, Configurable, abc.ABC):
             in_config_path: str = 'trainer.model',
             in_checkpoint_path: str = 'model',
             consider_mpi=False,
+            mmap=False,
     ) -> 'Module':
         """Instantiate the module from a given storage directory.
 
@@ -137,6 +188,7 @@ class Module(nn.Module, Configurable, abc.ABC):
             in_config_path: In case you want to load an inner module.
             in_checkpoint_path: In case you want to load an inner module.
             consider_mpi: If you use MPI: Only load on master, the distribute.
+            mmap: Memory map the checkpoint, see `from_config_and_checkpoint`.
 
         Returns:
 
@@ -148,6 +200,7 @@ class Module(nn.Module, Configurable, abc.ABC):
             in_config_path=in_config_path,
             in_checkpoint_path=in_checkpoint_path,
             consider_mpi=consider_mpi,
+            mmap=mmap,
         )
 
 
@@ -0,0 +1,173 @@
+"""
+Measures the memory and the time of a training step (forward and backward)
+with and without activation checkpointing (`checkpoint`) for the DPRNN, the
+TransformerStack, the CNN1d and the WaveNet.
+
+The memory is the peak memory, that is allocated in a training step, i.e.
+the activations that are kept for the backward and the gradients.
+On the CPU, it is computed from the allocations that the profiler records,
+on the GPU it is `torch.cuda.max_memory_allocated`.
+
+Example call:
+    python -m padertorch.contrib.examples.activation_checkpointing.benchmark
+
+    python -m padertorch.contrib.examples.activation_checkpointing.benchmark with device=cuda length=32000 'checkpoints=[False, 2, True]'
+
+Config:
+    device: cpu or cuda
+    repetitions: The number of measured steps
+    length: The number of frames, i.e. the length of the sequences
+    checkpoints: The values of the `checkpoint` argument of the modules
+        (bool, the number of blocks or a list of block indices, see
+        `padertorch.utils.checkpoint_indices`). The ratios are relative to
+        the first value.
+"""
+import itertools
+import time
+
+import torch
+from sacred import Experiment
+
+from padertorch.modules.dual_path_rnn import DPRNN
+from padertorch.modules.wavenet.wavenet import WaveNet
+from padertorch.contrib.je.modules.conv import CNN1d
+from padertorch.contrib.je.modules.transformer import TransformerStack
+
+nickname = 'activation_checkpointing_benchmark'
+ex = Experiment(nickname)
+
+
+@ex.config
+def config():
+    device = 'cpu'
+    repetitions = 3
+    length = 16000
+    checkpoints = [False, True]
+
+
+def get_modules(length):
+    """
+    Returns for each module a function that creates the module (with the
+    checkpoint argument) and the inputs for the forward.
+    """
+    batch_size = 2
+    upsamp_stride = 256
+    return {
+        'DPRNN': (
+            lambda checkpoint: DPRNN(
+                feat_size=64, rnn_size=128, window_length=100, hop_size=50,
+                num_blocks=6, checkpoint=checkpoint,
+            ),
+            lambda: (
+                torch.randn(batch_size, length, 64),
+                torch.tensor([length] * batch_size),
+            ),
+        ),
+        'TransformerStack': (
+            lambda checkpoint: TransformerStack(
+                128, 128, 6, num_heads=4, bidirectional=True,
+                checkpoint=checkpoint,
+            ),
+            lambda: (torch.randn(batch_size, length // 4, 128),),
+        ),
+        'CNN1d': (
+            lambda checkpoint: CNN1d(
+                in_channels=80, out_channels=8 * [128], kernel_size=3,
+                norm='batch', checkpoint=checkpoint,
+            ),
+            lambda: (torch.randn(batch_size, 80, length),),
+        ),
+        'WaveNet': (
+            lambda checkpoint: WaveNet(
+                n_cond_channels=80, upsamp_window=1024,
+                upsamp_stride=upsamp_stride, n_layers=16,
+                max_dilation=128, n_residual_channels=64,
+                n_skip_channels=128, n_in_channels=256, n_out_channels=256,
+                checkpoint=checkpoint,
+            ),
+            lambda: (
+                torch.randn(batch_size, 80, length // upsamp_stride + 3),
+                torch.rand(batch_size, length // upsamp_stride * upsamp_stride)
+                * 2 - 1,
+            ),
+        ),
+    }
+
+
+def peak_memory(step, device):
+    """
+    The peak memory in bytes, that is allocated during `step`, i.e. the
+    activations, that are kept for the backward, and the gradients.
+
+    On the CPU, the allocations are recorded with the profiler and the peak
+    is computed with the granularity of the top level operations.
+    """
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+        torch.cuda.reset_peak_memory_stats(device)
+        memory_before = torch.cuda.memory_allocated(device)
+        step()
+        torch.cuda.synchronize(device)
+        return torch.cuda.max_memory_allocated(device) - memory_before
+    else:
+        with torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU],
+                profile_memory=True,
+        ) as prof:
+            step()
+        events = sorted(
+            [e for e in prof.events() if e.cpu_parent is None],
+            key=lambda e: e.time_range.start,
+        )
+        return max(itertools.accumulate(
+            [e.cpu_memory_usage for e in events]
+        ))
+
+
+def measure(module, inputs, device, repetitions):
+    """
+    Returns the peak memory of a training step and the mean time of
+    `repetitions` training steps.
+    """
+    def step():
+        module(*inputs)[0].float().mean().backward()
+        module.zero_grad(set_to_none=True)
+
+    # Warmup, e.g. cudnn benchmark and lazy initializations
+    step()
+    memory = peak_memory(step, device)
+
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        step()
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    return memory, (time.perf_counter() - start) / repetitions
+
+
+@ex.automain
+def main(device, repetitions, length, checkpoints):
+    device = torch.device(device)
+    print(f'{"module":<18}{"checkpoint":>12}{"memory MiB":>12}{"time [s]":>12}')
+    for name, (get_module, get_inputs) in get_modules(length).items():
+        torch.manual_seed(0)
+        inputs = tuple(x.to(device) for x in get_inputs())
+        results = []
+        for checkpoint in checkpoints:
+            torch.manual_seed(0)
+            module = get_module(checkpoint).to(device)
+            results.append(measure(module, inputs, device, repetitions))
+            memory, duration = results[-1]
+            del module
+            print(
+                f'{name:<18}{str(checkpoint):>12}'
+                f'{memory / 2**20:>12.1f}{duration:>12.3f}'
+            )
+        for checkpoint, (memory, duration) in zip(checkpoints[1:], results[1:]):
+            print(
+                f'{"":<18}{"ratio " + str(checkpoint):>12}'
+                f'{memory / results[0][0]:>12.2f}'
+                f'{duration / results[0][1]:>12.2f}'
+            )
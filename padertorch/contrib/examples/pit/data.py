@@ -10,10 +10,15 @@ from paderbox.transform import stft
 
 def prepare_iterable(
         db, dataset: str, batch_size, return_keys=None, prefetch=True,
+        filter_fn=None,
 ):
     audio_keys = ['observation', 'speech_source']
     iterator = db.get_dataset(dataset)
 
+    if filter_fn is not None:
+        # Before the maps, i.e. the removed examples are not read.
+        iterator = iterator.filter(filter_fn, lazy=False)
+
     iterator = (
         iterator
         .map(partial(read_audio, audio_keys=audio_keys))
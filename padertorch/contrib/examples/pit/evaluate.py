@@ -66,6 +66,11 @@ def config():
     ))
     batch_size = 1
     datasets = ["mix_2_spk_min_cv", "mix_2_spk_min_tt"]
+    # The metrics of each example are cached for the weights of the model,
+    # i.e. an evaluation of the same checkpoint skips the scored examples
+    # (e.g. a restarted evaluation). Set it to the cache_dir of another
+    # evaluation to share the cache or to None to disable the cache.
+    cache_dir = str(Path(experiment_dir) / 'cache')
     locals()  # Fix highlighting
 
 
@@ -119,7 +124,8 @@ def init(_config, _run):
 
 
 @ex.main
-def main(_run, batch_size, datasets, debug, experiment_dir, database_json):
+def main(_run, batch_size, datasets, debug, experiment_dir, database_json,
+         cache_dir):
     experiment_dir = Path(experiment_dir)
 
     if IS_MASTER:
@@ -129,24 +135,47 @@ def main(_run, batch_size, datasets, debug, experiment_dir, database_json):
     model = get_model()
     db = JsonDatabase(json_path=database_json)
 
+    if cache_dir is not None:
+        cache = pt.train.cache.ResultCache(cache_dir)
+        model_digest = pt.train.checkpoint.state_dict_digest(
+            model.state_dict())
+
     model.eval()
     with torch.no_grad():
         summary = defaultdict(dict)
         for dataset in datasets:
+            cached_ids = set()
+            if cache_dir is not None:
+                def get_cache_key(example_id):
+                    return model_digest, nickname, dataset, example_id
+
+                # All ranks need the same examples for split_managed.
+                cached_ids = {
+                    example_id
+                    for example_id in db.get_dataset(dataset).keys()
+                    if get_cache_key(example_id) in cache
+                }
+                if IS_MASTER:
+                    for example_id in cached_ids:
+                        summary[dataset][example_id] = cache.get(
+                            get_cache_key(example_id))
+
             iterable = prepare_iterable(
                 db, dataset, batch_size,
                 return_keys=None,
                 prefetch=False,
+                filter_fn=lambda example: (
+                    example['example_id'] not in cached_ids),
             )
 
             for batch in split_managed(iterable, is_indexable=False,
                                        progress_bar=True,
                                        allow_single_worker=debug
                                        ):
+                example_id = batch['example_id'][0]
                 entry = dict()
                 model_output = model(pt.data.example_to_device(batch))
 
-                example_id = batch['example_id'][0]
                 s = batch['s'][0]
                 Y = batch['Y'][0]
                 mask = model_output[0].numpy()
@@ -162,7 +191,9 @@ def main(_run, batch_size, datasets, debug, experiment_dir, database_json):
                 entry['metrics'] \
                     = pb_bss.evaluation.OutputMetrics(speech_prediction=z, speech_source=s).as_dict()
 
-        summary[dataset][example_id] = entry
+                summary[dataset][example_id] = entry
+                if cache_dir is not None:
+                    cache[get_cache_key(example_id)] = entry
 
     summary_list = COMM.gather(summary, root=MASTER)
 
@@ -75,6 +75,12 @@ def config():
     sample_rate = 8000
     target = 'speech_source'
     database_json = None
+    # The metrics of each example are cached for the weights of the model,
+    # i.e. an evaluation of the same checkpoint skips the scored examples
+    # (e.g. a restarted evaluation). Set it to the cache_dir of another
+    # evaluation to share the cache or to None to disable the cache.
+    # Not used with export_audio.
+    cache_dir = str(Path(experiment_dir) / 'cache')
 
     if database_json is None:
         raise MissingConfigError(
@@ -198,7 +204,7 @@ def init(_config, _run):
 
 @ex.main
 def main(_run, datasets, debug, experiment_dir, export_audio,
-         sample_rate, _log, database_json):
+         sample_rate, target, _log, database_json, cache_dir):
     experiment_dir = Path(experiment_dir)
 
     if mpi.IS_MASTER:
@@ -208,15 +214,39 @@ def main(_run, datasets, debug, experiment_dir, export_audio,
     model = get_model()
     db = JsonDatabase(database_json)
 
+    # The audio has to be exported for each evaluation.
+    use_cache = cache_dir is not None and not export_audio
+    if use_cache:
+        cache = pt.train.cache.ResultCache(cache_dir)
+        model_digest = pt.train.checkpoint.state_dict_digest(
+            model.state_dict())
+
     model.eval()
     with torch.no_grad():
         summary = defaultdict(dict)
         for dataset in datasets:
+            iterator_slice = slice(mpi.RANK, 20 if debug else None, mpi.SIZE)
+            cached_ids = set()
+            if use_cache:
+                def get_cache_key(example_id):
+                    return (
+                        model_digest, nickname, dataset, example_id, target,
+                        str(sample_rate),
+                    )
+
+                for example_id in db.get_dataset(dataset).keys()[iterator_slice]:
+                    cache_key = get_cache_key(example_id)
+                    if cache_key in cache:
+                        summary[dataset][example_id] = cache.get(cache_key)
+                        cached_ids.add(example_id)
+
             iterable = prepare_iterable(
                 db, dataset, 1,
                 chunk_size=-1,
                 prefetch=False,
-                iterator_slice=slice(mpi.RANK, 20 if debug else None, mpi.SIZE),
+                iterator_slice=iterator_slice,
+                filter_fn=lambda example: (
+                    example['example_id'] not in cached_ids),
             )
 
             if export_audio:
@@ -249,6 +279,8 @@ def main(_run, datasets, debug, experiment_dir, export_audio,
                             audio_path = experiment_dir / 'audio' / dataset / f'{example_id}_{k}.wav'
                             pb.io.dump_audio(audio, audio_path, sample_rate=sample_rate)
                             entry['audio_path'].setdefault('estimated', []).append(audio_path)
+                    if use_cache:
+                        cache[get_cache_key(example_id)] = entry
                 except:
                     _log.error(f'Exception was raised in example with ID "{example_id}"')
                     raise
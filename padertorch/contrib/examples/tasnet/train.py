@@ -140,7 +140,7 @@ def pre_batch_transform(inputs):
 
 def prepare_iterable(
         db, dataset: str, batch_size, chunk_size, prefetch=True,
-        iterator_slice=None
+        iterator_slice=None, filter_fn=None
 ):
     """
     This is re-used in the evaluate script
@@ -150,6 +150,10 @@ def prepare_iterable(
     if iterator_slice is not None:
         iterator = iterator[iterator_slice]
 
+    if filter_fn is not None:
+        # Before the maps, i.e. the removed examples are not read.
+        iterator = iterator.filter(filter_fn, lazy=False)
+
     iterator = (
         iterator
         .map(pre_batch_transform)
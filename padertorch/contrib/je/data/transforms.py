@@ -8,6 +8,7 @@ import torch
 from paderbox.transform.module_fbank import MelTransform as BaseMelTransform
 from paderbox.transform.module_stft import STFT as BaseSTFT
 from paderbox.utils.nested import nested_op
+from padertorch.data.collate import pad_batch
 from padertorch.utils import to_list
 from tqdm import tqdm
 
@@ -270,26 +271,8 @@ class Collate:
     def collate(self, *batch):
         batch = list(batch)
         if self.stack_arrays and isinstance(batch[0], np.ndarray):
-            shapes = [array.shape for array in batch]
-            if self.cut_end:
-                target_shape = np.min(shapes, axis=0)
-            else:
-                target_shape = np.max(shapes, axis=0)
-            for i, array in enumerate(batch):
-                diff = target_shape - array.shape
-                assert np.argwhere(diff != 0).size <= 1, (
-                    'arrays are only allowed to differ in one dim',
-                    array.shape, target_shape,
-                )
-                if np.any(diff > 0):
-                    pad = [(0, n) for n in diff]
-                    batch[i] = np.pad(array, pad_width=pad, mode='constant')
-                elif np.any(diff < 0):
-                    sliceing = [slice(None) if n >= 0 else slice(n) for n in diff]
-                    batch[i] = array[tuple(sliceing)]
-            batch = np.array(batch).astype(batch[0].dtype)
-            if self.to_tensor:
-                batch = torch.from_numpy(batch)
+            batch = pad_batch(
+                batch, cut_end=self.cut_end, to_tensor=self.to_tensor)
         return batch
 
 
@@ -5,6 +5,10 @@ from paderbox.utils.nested import nested_op
 class SWAHook(TriggeredHook):
     """
     performs stochastic weight averaging of the trainers model or a submodule of it
+
+    See `padertorch.train.hooks.WeightAveragingHook` for an EMA/SWA of the
+    whole model in preallocated buffers, that are not stored in each
+    trainer checkpoint.
     """
     def __init__(self, trigger, submodule=None):
         """
@@ -5,7 +5,9 @@ import torch
 import torch.nn.functional as F
 from padertorch.base import Module
 from padertorch.ops.mappings import ACTIVATION_FN_MAP
-from padertorch.utils import to_list
+from padertorch.utils import (
+    to_list, checkpoint_activations, checkpoint_indices
+)
 from padertorch.contrib.je.modules.norm import Norm
 from torch import nn
 from copy import copy
@@ -471,14 +473,29 @@ class _CNN(Module):
             pool_type='max',
             pool_size=1,
             return_pool_indices=False,
+            checkpoint=False,
     ):
+        """
+
+        Args:
+            ...
+            checkpoint: If True, the activations inside of each layer (e.g.
+                the output of the convolution before the normalization and
+                the activation function) are recomputed in the backward
+                instead of stored (see
+                `padertorch.utils.checkpoint_activations`). An int or a list
+                of layer indices selects the layers
+                (see `padertorch.utils.checkpoint_indices`).
+        """
         super().__init__()
 
+        self.checkpoint = checkpoint
         self.in_channels = in_channels
         self.out_channels = copy(out_channels)
         num_layers = len(out_channels)
         assert num_layers >= input_layer + output_layer, (num_layers, input_layer, output_layer)
         self.num_layers = num_layers
+        self._checkpoint_indices = checkpoint_indices(checkpoint, num_layers)
         self.kernel_sizes = to_list(kernel_size, num_layers)
         residual_connections = to_list(residual_connections, num_layers)
         self.residual_connections = [
@@ -605,11 +622,14 @@ class _CNN(Module):
                         dense_skip_signals[dst_idx].append((i, x_skip))
                     else:
                         dense_skip_signals[dst_idx].append((i, x))
-            x, seq_len = conv(
-                x,
+            conv_kwargs = dict(
                 seq_len=seq_len, out_shape=out_shapes[i], out_lengths=out_lengths[i],
                 norm_kwargs=norm_kwargs
             )
+            if i in self._checkpoint_indices:
+                x, seq_len = checkpoint_activations(conv, x, **conv_kwargs)
+            else:
+                x, seq_len = conv(x, **conv_kwargs)
             for src_idx, x_ in dense_skip_signals[i + 1]:
                 x_ = F.interpolate(x_, size=x.shape[2:])
                 if self.is_transpose():
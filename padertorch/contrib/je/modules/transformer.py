@@ -4,6 +4,7 @@ import numpy as np
 
 from padertorch.base import Module
 from padertorch.ops.mappings import ACTIVATION_FN_MAP
+from padertorch.utils import checkpoint_activations, checkpoint_indices
 from padertorch.contrib.je.modules.norm import Norm
 from padertorch.contrib.je.modules.global_pooling import compute_mask
 
@@ -144,7 +145,7 @@ class TransformerStack(Module):
     def __init__(
             self, input_size, hidden_size, num_layers, output_size=None,
             num_heads=1, bidirectional=False, cross_attention=False,
-            activation='relu', norm='layer', norm_kwargs={}
+            activation='relu', norm='layer', norm_kwargs={}, checkpoint=False,
     ):
         """
         https://arxiv.org/abs/1706.03762
@@ -159,6 +160,11 @@ class TransformerStack(Module):
             activation:
             norm:
             norm_kwargs:
+            checkpoint: If True, the activations inside of each
+                TransformerBlock are recomputed in the backward instead of
+                stored (see `padertorch.utils.checkpoint_activations`). An
+                int or a list of layer indices selects the layers
+                (see `padertorch.utils.checkpoint_indices`).
 
         Returns:
 
@@ -176,8 +182,14 @@ class TransformerStack(Module):
         torch.Size([2, 3, 6])
         >>> attn(x, state=[torch.zeros((2, 6, 8)), torch.zeros((2, 6, 6))])[0].shape
         torch.Size([2, 3, 6])
+        >>> attn = TransformerStack(8, 6, 2, 6, 2, checkpoint=True)
+        >>> attn(x.requires_grad_())[0].sum().backward()
+        >>> attn.stack[0].hidden.weight.grad.shape
+        torch.Size([6, 6])
         """
         super().__init__()
+        self.checkpoint = checkpoint
+        self._checkpoint_indices = checkpoint_indices(checkpoint, num_layers)
         self.input_size = input_size
         self.output_size = hidden_size if output_size is None else output_size
         stack = list()
@@ -199,10 +211,14 @@ class TransformerStack(Module):
     def forward(self, x, v=None, seq_len_x=None, seq_len_v=None, state=None):
         new_state = []
         for i, layer in enumerate(self.stack):
-            x, x_ = layer(
-                x, v=v, seq_len_x=seq_len_x, seq_len_v=seq_len_v,
+            kwargs = dict(
+                v=v, seq_len_x=seq_len_x, seq_len_v=seq_len_v,
                 state=None if state is None else state[i],
             )
+            if i in self._checkpoint_indices:
+                x, x_ = checkpoint_activations(layer, x, **kwargs)
+            else:
+                x, x_ = layer(x, **kwargs)
             new_state.append(x_)
         if self.output_layer is not None:
             x = self.output_layer(x)
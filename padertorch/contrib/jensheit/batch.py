@@ -2,7 +2,8 @@ import numpy as np
 import torch
 
 from padertorch.configurable import Configurable
-from padertorch.data.utils import pad_tensor, collate_fn
+from padertorch.data.collate import pad_batch
+from padertorch.data.utils import collate_fn
 
 
 class Padder(Configurable):
@@ -44,14 +45,7 @@ class Padder(Configurable):
                 )
                 dtypes = [vec.dtype for vec in batch]
                 assert dtypes.count(dtypes[-1]) == len(dtypes), dtypes
-                if len(axis) == 1:
-                    axis = axis[0]
-                    pad = max(dims[axis])
-                    array = np.stack([pad_tensor(vec, pad, axis)
-                                      for vec in batch], axis=0)
-                else:
-                    array = np.stack(batch, axis=0)
-                array = array.astype(dtypes[0])
+                array = pad_batch(batch)
                 complex_dtypes = [np.complex64, np.complex128]
                 if self.to_torch and not array.dtype.kind in {'U', 'S'} \
                         and not array.dtype in complex_dtypes:
@@ -5,6 +5,8 @@ import numpy as np
 
 from dataclasses import dataclass
 
+from padertorch.data.fragmenter import fragment_axis
+
 
 def _getitem_on_axis(array, item, axis):
     slicer = [slice(None)] * array.ndim
@@ -33,9 +35,10 @@ class Chunk:
     `lazy_dataset.FilterException` is raised.
 
     This chunking returns a list of chunked examples that can be unbatched.
-    Everything that is not listed in `chunk_keys` is simply copied from the
-    input example to the output examples. The key `num_samples` is updated
-    with the `chunk_size`.
+    Everything that is not listed in `chunk_keys` is shared (not copied)
+    between the output examples. The key `num_samples` is updated
+    with the `chunk_size`. The chunks are read only views of the input
+    (see `padertorch.data.fragmenter.fragment_axis`).
 
     Examples:
         >>> c = Chunk(chunk_size=32000, chunk_keys=('x', 'y'))
@@ -106,21 +109,16 @@ class Chunk:
         if to_chunk_length < self.chunk_size:
             raise lazy_dataset.FilterException()
 
-        # Cut overlapping chunks
-        chunks = []
-
+        # Cut overlapping chunks, only full sizes
         shift = self.chunk_size // 2
-        for chunk_beginning in range(
-                0,
-                to_chunk_length - self.chunk_size + 1,  # only full sizes
-                shift,
-        ):
-            chunk_end = chunk_beginning + self.chunk_size
-            chunk = deepcopy(example)
-            chunk.update({
-                k: _getitem_on_axis(v, slice(chunk_beginning, chunk_end), axis=self.axis)
-                for k, v in to_chunk.items()
-            })
+        to_chunk = {
+            k: fragment_axis(v, self.chunk_size, shift, axis=self.axis)
+            for k, v in to_chunk.items()
+        }
+        chunks = []
+        for i in range(len(next(iter(to_chunk.values())))):
+            chunk = dict(example)
+            chunk.update({k: v[i] for k, v in to_chunk.items()})
             chunk.update(num_samples=self.chunk_size)
             chunks.append(chunk)
 
@@ -2,3 +2,18 @@ from . import batch
 from . import utils
 
 from .batch import *
+from . import collate
+
+from .collate import *
+from . import shared_memory
+
+from .shared_memory import *
+from . import bucketing
+
+from .bucketing import *
+from . import cache
+
+from .cache import *
+from . import packed_audio
+
+from .packed_audio import *
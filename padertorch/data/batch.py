@@ -1,10 +1,18 @@
+import queue
+import threading
+
 import numpy as np
 import torch
 
+from .shared_memory import SharedArray
+
 
 __all__ = [
     'example_to_device',
     'example_to_numpy',
+    'get_batch_size',
+    'split_batch',
+    'DevicePrefetcher',
     'Sorter',
 ]
 
@@ -14,6 +22,8 @@ def example_to_device(example, device=None):
     Moves a nested structure to the device.
     Numpy arrays are converted to torch.Tensor, except complex numpy arrays
     that aren't supported in the moment in torch.
+    `SharedArray` handles (see `padertorch.data.shared_memory`) are
+    resolved to numpy arrays without a copy and then converted.
 
     The original doctext from torch for `.to`:
     Tensor.to(device=None, dtype=None, non_blocking=False, copy=False) → Tensor
@@ -55,6 +65,8 @@ def example_to_device(example, device=None):
             return example_to_device(
                 torch.from_numpy(example), device=device
             )
+    elif isinstance(example, SharedArray):
+        return example_to_device(example.numpy(), device=device)
     elif hasattr(example, '__dataclass_fields__'):
         return example.__class__(
             **{
@@ -104,6 +116,227 @@ def example_to_numpy(example, detach=False):
         return example
 
 
+def _leaves(example):
+    if isinstance(example, dict):
+        for value in example.values():
+            yield from _leaves(value)
+    elif isinstance(example, (tuple, list)):
+        for element in example:
+            yield from _leaves(element)
+    elif hasattr(example, '__dataclass_fields__'):
+        for f in example.__dataclass_fields__:
+            yield from _leaves(getattr(example, f))
+    else:
+        yield example
+
+
+def get_batch_size(example):
+    """
+    Returns the length of the first axis of the first array or tensor in a
+    nested structure (the same structures as for `example_to_device`).
+
+    >>> get_batch_size({'example_id': ['a', 'b'], 'x': np.zeros((2, 5))})
+    2
+    """
+    for leaf in _leaves(example):
+        if (torch.is_tensor(leaf) or isinstance(leaf, np.ndarray)) \
+                and leaf.ndim > 0:
+            return leaf.shape[0]
+    raise ValueError(
+        f'Could not find an array or a tensor in the example:\n{example}'
+    )
+
+
+def split_batch(example, num_parts):
+    """
+    Splits a batch along the batch axis into `num_parts` parts, e.g. to
+    process a batch, that does not fit into the memory, in multiple steps.
+
+    The batch size is the length of the first axis of the first array or
+    tensor (see `get_batch_size`). Arrays, tensors and lists with this length
+    are split (as `np.array_split`), all other values (e.g. scalars and
+    arrays with another length) are used for each part.
+
+    >>> batch = {
+    ...     'x': np.zeros((5, 3)),
+    ...     'num_samples': [3, 3, 2, 2, 1],
+    ...     'sample_rate': 8000,
+    ... }
+    >>> for part in split_batch(batch, 2):
+    ...     print(part['x'].shape, part['num_samples'], part['sample_rate'])
+    (3, 3) [3, 3, 2] 8000
+    (2, 3) [2, 1] 8000
+    """
+    batch_size = get_batch_size(example)
+    if not 1 <= num_parts <= batch_size:
+        raise ValueError(
+            f'Can not split a batch with {batch_size} examples into '
+            f'{num_parts} parts.'
+        )
+    boundaries = np.cumsum([0] + [
+        len(indices)
+        for indices in np.array_split(np.arange(batch_size), num_parts)
+    ])
+
+    def split(example, start, stop):
+        if isinstance(example, dict):
+            return example.__class__({
+                key: split(value, start, stop)
+                for key, value in example.items()
+            })
+        elif isinstance(example, (tuple, list)):
+            if len(example) == batch_size:
+                return example.__class__(example[start:stop])
+            return example.__class__([
+                split(element, start, stop) for element in example
+            ])
+        elif torch.is_tensor(example) or isinstance(example, np.ndarray):
+            if example.ndim > 0 and example.shape[0] == batch_size:
+                return example[start:stop]
+            return example
+        elif hasattr(example, '__dataclass_fields__'):
+            return example.__class__(
+                **{
+                    f: split(getattr(example, f), start, stop)
+                    for f in example.__dataclass_fields__
+                }
+            )
+        else:
+            return example
+
+    return [
+        split(example, start, stop)
+        for start, stop in zip(boundaries[:-1], boundaries[1:])
+    ]
+
+
+class DevicePrefetcher:
+    """
+    Wraps an iterable and applies `example_to_device` in a background thread,
+    so that the conversion from numpy to torch and the host to device copy of
+    the next examples overlap with the processing of the current example.
+
+    At most `buffer_size` examples are kept on the device in advance.
+    Exceptions that are raised in the background thread (e.g. in the data
+    loading) are raised again in the consuming thread.
+
+    When the device is a GPU, the copy is done on a separate CUDA stream
+    and the stream is synchronized before the example is handed to the
+    consumer, so the returned tensors can be used on the default stream.
+    The memory of the tensors is allocated on the copy stream, hence each
+    tensor is recorded on the current stream of the consumer, when the
+    example is taken from the buffer (`Tensor.record_stream`). Otherwise,
+    the caching allocator could reuse the memory for the next copy, while
+    the consumer stream still uses the freed tensor.
+
+    >>> examples = [{'a': np.arange(2)}, {'a': np.arange(2, 4)}]
+    >>> for example in DevicePrefetcher(examples, device='cpu'):
+    ...     print(example)
+    {'a': tensor([0, 1])}
+    {'a': tensor([2, 3])}
+    >>> len(DevicePrefetcher(examples, device='cpu'))
+    2
+
+    """
+    class _Stop:
+        pass
+
+    class _Raise:
+        def __init__(self, exception):
+            self.exception = exception
+
+    def __init__(self, iterable, device=None, buffer_size=1):
+        assert buffer_size >= 1, buffer_size
+        self.iterable = iterable
+        self.device = device
+        self.buffer_size = buffer_size
+
+    def __len__(self):
+        return len(self.iterable)
+
+    def _get_cuda_device(self):
+        if self.device is None or self.device == 'cpu':
+            return None
+        device = torch.device(
+            'cuda', self.device) if isinstance(self.device, int) \
+            else torch.device(self.device)
+        if device.type != 'cuda':
+            return None
+        return device
+
+    def _worker(
+            self, buffer: queue.Queue, stop_event: threading.Event, device
+    ):
+        def put(item):
+            while not stop_event.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        try:
+            stream = None if device is None else torch.cuda.Stream(device)
+            for example in self.iterable:
+                if stream is None:
+                    example = example_to_device(example, self.device)
+                else:
+                    with torch.cuda.stream(stream):
+                        example = example_to_device(example, self.device)
+                    stream.synchronize()
+                if not put(example):
+                    return
+        except BaseException as e:
+            put(self._Raise(e))
+        else:
+            put(self._Stop())
+
+    def __iter__(self):
+        buffer = queue.Queue(maxsize=self.buffer_size)
+        stop_event = threading.Event()
+        device = self._get_cuda_device()
+        thread = threading.Thread(
+            target=self._worker, args=(buffer, stop_event, device),
+            daemon=True,
+        )
+        thread.start()
+        try:
+            while True:
+                item = buffer.get()
+                if isinstance(item, self._Stop):
+                    break
+                elif isinstance(item, self._Raise):
+                    raise item.exception
+                if device is not None:
+                    _record_stream(item, torch.cuda.current_stream(device))
+                yield item
+                del item  # Do not hold a reference while waiting.
+        finally:
+            # Signal the worker to stop, e.g. when the consumer leaves the
+            # loop early (StopTraining).
+            stop_event.set()
+
+
+def _record_stream(example, stream):
+    """
+    Calls `tensor.record_stream(stream)` for each CUDA tensor in a nested
+    structure (see `DevicePrefetcher`).
+    """
+    if isinstance(example, dict):
+        for value in example.values():
+            _record_stream(value, stream)
+    elif isinstance(example, (tuple, list)):
+        for element in example:
+            _record_stream(element, stream)
+    elif torch.is_tensor(example):
+        if example.is_cuda:
+            example.record_stream(stream)
+    elif hasattr(example, '__dataclass_fields__'):
+        for f in example.__dataclass_fields__:
+            _record_stream(getattr(example, f), stream)
+
+
 class Sorter:
     # pb.database.keys.NUM_SAMPLES is 'num_samples'
     def __init__(self, key=lambda example: example['num_samples']):
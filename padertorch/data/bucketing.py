@@ -0,0 +1,347 @@
+import functools
+
+import lazy_dataset
+import numpy as np
+
+
+__all__ = [
+    'BucketBatchSampler',
+    'BucketBatchDataset',
+    'bucket_batch',
+]
+
+
+class BucketBatchSampler:
+    """
+    Forms batches of indices from precomputed lengths (e.g. `num_samples`
+    or `num_frames`), such that examples of similar length are in the same
+    batch.
+
+    The indices are sorted by length and greedily grouped, while
+     - the batch has at most `batch_size` examples,
+     - the padded size of the batch (number of examples times the maximum
+       length) is at most `max_total_size` (e.g. a sample or frame budget)
+       and
+     - each example is padded by at most `max_padding_rate` of the maximum
+       length, i.e. the padding rate of each batch is at most
+       `max_padding_rate`.
+    An example that alone exceeds `max_total_size` forms its own batch.
+
+    Each iteration is an epoch with a random state, that depends on `seed`
+    and the epoch (i.e. reproducible). With `shuffle`, the lengths are
+    jittered for the sort (by up to `jitter * max_padding_rate`), hence the
+    composition of the batches changes between the epochs, while the
+    limits above are kept. Then the order of the batches is shuffled.
+    Within a batch, the indices are sorted by length in descending order
+    (cf. `padertorch.data.Sorter`).
+
+    >>> sampler = BucketBatchSampler(
+    ...     [3, 10, 4, 9, 10, 3], batch_size=3, max_padding_rate=0.3,
+    ...     shuffle=False)
+    >>> list(sampler)
+    [[2, 0, 5], [1, 4, 3]]
+    >>> sampler.padding_rate
+    0.07142857142857142
+    >>> sampler = BucketBatchSampler(
+    ...     [3, 10, 4, 9, 10, 3], max_total_size=20, max_padding_rate=0.5)
+    >>> list(sampler)
+    [[1, 3], [4], [2, 0, 5]]
+    >>> list(sampler)
+    [[2, 0, 5], [4], [1, 3]]
+    >>> sampler.set_epoch(3)
+    >>> list(sampler)
+    [[2, 0, 5], [1], [4, 3]]
+    >>> sampler.statistics()
+    {'padding_rate': 0.07142857142857142, 'batch_size': 2.0, 'total_size': 14.0}
+    """
+    def __init__(
+            self,
+            lengths,
+            batch_size=None,
+            max_total_size=None,
+            max_padding_rate=0.1,
+            shuffle=True,
+            seed=0,
+            jitter=0.5,
+    ):
+        """
+        Args:
+            lengths: The length of each example.
+            batch_size: The maximum number of examples in a batch.
+            max_total_size: The maximum number of examples times the maximum
+                length in a batch.
+            max_padding_rate: The maximum fraction of the maximum length in
+                a batch, that an example may be padded.
+            shuffle: Whether to change the batches and their order in each
+                epoch.
+            seed: The seed for the shuffle. Together with the epoch it
+                defines the batches.
+            jitter: The maximum relative noise of the lengths for the sort
+                as fraction of `max_padding_rate`. A larger jitter changes
+                the batches more, but increases the padding.
+        """
+        assert batch_size is not None or max_total_size is not None, (
+            'Either batch_size or max_total_size must be set',
+            batch_size, max_total_size
+        )
+        assert 0 <= max_padding_rate < 1, max_padding_rate
+        assert 0 <= jitter <= 1, jitter
+        self.lengths = np.asarray(lengths)
+        assert self.lengths.ndim == 1, self.lengths.shape
+        self.batch_size = batch_size
+        self.max_total_size = max_total_size
+        self.max_padding_rate = max_padding_rate
+        self.shuffle = shuffle
+        self.seed = seed
+        self.jitter = jitter
+        self.epoch = 0
+
+        # The epoch of the running iteration (None before the first one)
+        self._iteration_epoch = None
+        # The key and the grouped batches of the last requested epoch
+        self._grouped = None
+
+    def _group(self, order):
+        """
+        Greedy grouping of the indices in `order`. The order is sorted by
+        the (jittered) lengths, hence the limits are checked with the
+        minimum and maximum length of the batch.
+        """
+        batches = []
+        start = 0
+        min_length = max_length = None
+        for i, length in enumerate(self.lengths[order]):
+            if i > start:
+                size = i - start + 1
+                new_min = min(min_length, length)
+                new_max = max(max_length, length)
+                if (
+                    (self.batch_size is not None and size > self.batch_size)
+                    or (self.max_total_size is not None
+                        and size * new_max > self.max_total_size)
+                    or new_min < new_max * (1 - self.max_padding_rate)
+                ):
+                    batches.append(order[start:i])
+                    start = i
+                else:
+                    min_length, max_length = new_min, new_max
+                    continue
+            min_length = max_length = length
+        batches.append(order[start:])
+        return batches
+
+    def _get_grouped(self, epoch):
+        """
+        Returns the grouped batches of an epoch (sorted by length) and the
+        random state for the order of the batches.
+        """
+        if self.shuffle:
+            rng = np.random.RandomState([self.seed, epoch])
+            noise = rng.uniform(size=len(self.lengths))
+            sort_lengths = self.lengths * (
+                1 + self.jitter * self.max_padding_rate * noise)
+            # The permutation exchanges examples with equal sort length
+            order = np.lexsort((rng.permutation(len(self.lengths)),
+                                sort_lengths))
+            key = ('epoch', epoch)
+        else:
+            rng = None
+            order = np.argsort(self.lengths, kind='stable')
+            key = 'sorted'
+
+        if self._grouped is None or self._grouped[0] != key:
+            self._grouped = (key, self._group(order))
+        return self._grouped[1], rng
+
+    def _current_epoch(self):
+        if self._iteration_epoch is None:
+            return self.epoch
+        else:
+            return self._iteration_epoch
+
+    def __len__(self):
+        """
+        The number of batches of the current epoch, i.e. of the running
+        iteration or, before the first iteration, of the next.
+        """
+        return len(self._get_grouped(self._current_epoch())[0])
+
+    def set_epoch(self, epoch):
+        """
+        Sets the epoch of the next iteration, e.g. to resume a training.
+        """
+        self.epoch = epoch
+        self._iteration_epoch = None
+
+    def get_batches(self, epoch):
+        """
+        Returns the batches (lists of indices) of an epoch.
+        """
+        batches, rng = self._get_grouped(epoch)
+        batches = [
+            batch[np.argsort(-self.lengths[batch], kind='stable')].tolist()
+            for batch in batches
+        ]
+        if self.shuffle:
+            # The rng already drew the noise and the permutation
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        return batches
+
+    def __iter__(self):
+        batches = self.get_batches(self.epoch)
+        self._iteration_epoch = self.epoch
+        self.epoch += 1
+        return iter(batches)
+
+    def _batch_sizes_and_max_lengths(self):
+        batches, _ = self._get_grouped(self._current_epoch())
+        return (
+            np.array([len(batch) for batch in batches]),
+            np.array([self.lengths[batch].max() for batch in batches]),
+        )
+
+    @property
+    def padding_rate(self):
+        """
+        The fraction of the padded batches of the current epoch, that is
+        padding.
+        """
+        batch_sizes, max_lengths = self._batch_sizes_and_max_lengths()
+        total = np.sum(batch_sizes * max_lengths)
+        return float((total - np.sum(self.lengths)) / total)
+
+    def statistics(self):
+        """
+        The padding rate, the mean batch size and the mean padded size of
+        the batches of the current epoch, e.g. for the summary
+        (see `padertorch.train.hooks.DataStatisticsHook`).
+        """
+        batch_sizes, max_lengths = self._batch_sizes_and_max_lengths()
+        return {
+            'padding_rate': self.padding_rate,
+            'batch_size': float(np.mean(batch_sizes)),
+            'total_size': float(np.mean(batch_sizes * max_lengths)),
+        }
+
+
+def _take(dataset, indices):
+    return [dataset[index] for index in indices]
+
+
+class BucketBatchDataset(lazy_dataset.Dataset):
+    """
+    Dataset of batches (lists of examples) from an indexable dataset and a
+    `BucketBatchSampler`. Each iteration is a new epoch of the sampler.
+
+    Like `dataset.shuffle(reshuffle=True)`, this dataset is not indexable,
+    but it can be prefetched (the batches of an epoch are fixed, when the
+    iteration starts).
+    """
+    def __init__(self, input_dataset, sampler):
+        assert len(input_dataset) == len(sampler.lengths), (
+            len(input_dataset), len(sampler.lengths))
+        self.input_dataset = input_dataset
+        self.sampler = sampler
+
+    def copy(self, freeze=False):
+        if freeze:
+            return lazy_dataset.new(list(self.sampler)).map(functools.partial(
+                _take, self.input_dataset.copy(freeze=freeze)))
+        else:
+            return self.__class__(
+                input_dataset=self.input_dataset.copy(freeze=freeze),
+                sampler=self.sampler,
+            )
+
+    @property
+    def indexable(self):
+        return False
+
+    @property
+    def ordered(self) -> bool:
+        return not self.sampler.shuffle
+
+    def __len__(self):
+        return len(self.sampler)
+
+    def __iter__(self, with_key=False):
+        if with_key:
+            raise NotImplementedError(
+                f'keys are not defined for {self.__class__.__name__}')
+        for indices in self.sampler:
+            yield _take(self.input_dataset, indices)
+
+    def __str__(self):
+        return f'{self.__class__.__name__}(len={len(self)}, ' \
+               f'padding_rate={self.sampler.padding_rate:.3f})'
+
+
+def bucket_batch(
+        dataset,
+        len_key='num_samples',
+        lengths=None,
+        batch_size=None,
+        max_total_size=None,
+        max_padding_rate=0.1,
+        shuffle=True,
+        seed=0,
+        jitter=0.5,
+):
+    """
+    Batches an indexable dataset with a `BucketBatchSampler`, i.e. examples
+    of similar length are in the same batch. In contrast to
+    `dataset.batch_dynamic_time_series_bucket`, the lengths are known in
+    advance, hence all batches respect `max_padding_rate` and no
+    incomplete buckets remain at the end.
+
+    Use it on the dataset before the expensive maps (e.g. the audio
+    reading), because the lengths are read from the examples, when they
+    are not given.
+
+    Args:
+        dataset: An indexable `lazy_dataset.Dataset`.
+        len_key: The key of the length in the examples or a callable that
+            returns the length of an example.
+        lengths: Precomputed lengths, overwrites `len_key`.
+        batch_size: see `BucketBatchSampler`
+        max_total_size: see `BucketBatchSampler`
+        max_padding_rate: see `BucketBatchSampler`
+        shuffle: see `BucketBatchSampler`
+        seed: see `BucketBatchSampler`
+        jitter: see `BucketBatchSampler`
+
+    Returns:
+        `BucketBatchDataset`, the sampler is the attribute `sampler`.
+
+    >>> ds = lazy_dataset.new({
+    ...     'a': {'num_samples': 4}, 'b': {'num_samples': 10},
+    ...     'c': {'num_samples': 5}, 'd': {'num_samples': 9},
+    ... })
+    >>> ds = bucket_batch(ds, batch_size=2, max_padding_rate=0.2, shuffle=False)
+    >>> ds
+        DictDataset(len=4)
+      MapDataset(_pickle.loads)
+    BucketBatchDataset(len=2, padding_rate=0.067)
+    >>> for batch in ds.map(lambda batch: [ex['num_samples'] for ex in batch]):
+    ...     print(batch)
+    [5, 4]
+    [10, 9]
+    """
+    if lengths is None:
+        if not callable(len_key):
+            len_key = functools.partial(_getitem, key=len_key)
+        lengths = [len_key(example) for example in dataset]
+    sampler = BucketBatchSampler(
+        lengths,
+        batch_size=batch_size,
+        max_total_size=max_total_size,
+        max_padding_rate=max_padding_rate,
+        shuffle=shuffle,
+        seed=seed,
+        jitter=jitter,
+    )
+    return BucketBatchDataset(dataset, sampler)
+
+
+def _getitem(example, key):
+    return example[key]
@@ -0,0 +1,354 @@
+"""
+Persistent on-disk cache for the features of a (deterministic) transform,
+e.g. the audio reading, the STFT and the mel transform. The first epoch
+computes the features and writes them to the cache, the following epochs
+(and trainings) map them from the disk.
+
+The cache is a directory (one per transform config, see `config_hash`)
+with pairs of files:
+ - `<shard>.bin`: The concatenated (aligned) bytes of the arrays.
+ - `<shard>.index.jsonl`: One line per example with the offsets, shapes
+   and dtypes of the arrays and the other (json) values of the example.
+
+Each thread of each process writes to its own shard (e.g. each prefetch
+worker, both for the threaded and the multiprocessing backends), hence
+concurrent writers don't share a file. An index line is written after the
+data, i.e. readers only see complete examples.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+import torch
+from paderbox.utils.nested import flatten, deflatten
+
+
+__all__ = [
+    'FeatureCache',
+    'config_hash',
+]
+
+
+_ALIGNMENT = 64
+
+
+def _describe_const(const):
+    if inspect.iscode(const):
+        return _describe_code(const)
+    elif isinstance(const, tuple):
+        return [_describe_const(c) for c in const]
+    elif isinstance(const, frozenset):
+        return sorted(repr(c) for c in const)
+    else:
+        return repr(const)
+
+
+def _describe_code(code):
+    """
+    A deterministic description of a code object. The repr of nested code
+    objects (comprehensions, lambdas, inner functions) contains their
+    memory address, hence they are described recursively.
+    """
+    return hashlib.sha1(json.dumps([
+        code.co_code.hex(),
+        _describe_const(code.co_consts),
+        list(code.co_names),
+    ]).encode()).hexdigest()
+
+
+def _describe(obj):
+    """
+    A json serializable and deterministic description of `obj`, that
+    contains all parameters of `obj`.
+    """
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    elif isinstance(obj, dict):
+        return {str(k): _describe(v) for k, v in sorted(obj.items())}
+    elif isinstance(obj, (list, tuple)):
+        return [_describe(v) for v in obj]
+    elif torch.is_tensor(obj):
+        return _describe(obj.detach().cpu().numpy())
+    elif isinstance(obj, np.ndarray):
+        return {
+            'shape': list(obj.shape), 'dtype': str(obj.dtype),
+            'sha1': hashlib.sha1(np.ascontiguousarray(obj).tobytes()).hexdigest()
+        }
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    elif isinstance(obj, functools.partial):
+        return {
+            'partial': _describe(obj.func),
+            'args': _describe(obj.args),
+            'kwargs': _describe(obj.keywords),
+        }
+    elif inspect.isfunction(obj):
+        # The code is part of the description, i.e. a changed function
+        # invalidates the cache.
+        return {
+            'function': f'{obj.__module__}.{obj.__qualname__}',
+            'code': _describe_code(obj.__code__),
+            'defaults': _describe(obj.__defaults__),
+            'kwdefaults': _describe(obj.__kwdefaults__),
+            'closure': _describe([
+                cell.cell_contents for cell in obj.__closure__ or ()
+            ]),
+        }
+    elif inspect.ismethod(obj):
+        return {
+            'method': _describe(obj.__func__),
+            'self': _describe(obj.__self__),
+        }
+    elif inspect.isclass(obj) or inspect.isbuiltin(obj):
+        return f'{obj.__module__}.{obj.__qualname__}'
+    elif hasattr(obj, '__dict__'):
+        return {
+            'class': _describe(type(obj)),
+            'attributes': _describe(vars(obj)),
+        }
+    else:
+        return repr(obj)
+
+
+def config_hash(config):
+    """
+    A hash of the config of a transform. `config` can be a (nested) dict,
+    e.g. the config of a `padertorch.Configurable`, or the transform itself,
+    in which case the attributes are used (recursively).
+
+    >>> config_hash({'size': 512, 'shift': 128})
+    '0936b0ab4c13e631'
+    >>> config_hash({'size': 512, 'shift': 128}) == config_hash({'size': 512, 'shift': 160})
+    False
+    """
+    return hashlib.sha1(
+        json.dumps(_describe(config), sort_keys=True).encode()
+    ).hexdigest()[:16]
+
+
+class FeatureCache:
+    """
+    Wraps a deterministic transform of an example and caches the output in
+    a directory. The examples are identified by `example_id_key` and the
+    directory by a hash of the transform config, i.e. a changed config
+    invalidates the cache.
+
+    The cached arrays are memory mapped (copy on write), i.e. reading them
+    is near I/O bound and an in-place modification does not change the
+    cache.
+
+    >>> import tempfile
+    >>> def stft(example):
+    ...     example['stft'] = np.fft.rfft(example['audio'])
+    ...     return example
+    >>> cache_dir = tempfile.mkdtemp()
+    >>> cache = FeatureCache(stft, cache_dir, keys=['stft'])
+    >>> example = {'example_id': 'a', 'audio': np.ones(4)}
+    >>> cache(example)['stft']
+    array([4.+0.j, 0.+0.j, 0.+0.j])
+    >>> len(cache)
+    1
+    >>> cache({'example_id': 'a', 'audio': np.ones(4)})['stft']
+    array([4.+0.j, 0.+0.j, 0.+0.j])
+    >>> cache.clear()
+
+    Usage with `lazy_dataset`:
+        >>> dataset = dataset.map(FeatureCache(
+        ...     compose(audio_reader, stft, mel_transform),
+        ...     cache_dir, keys=['mel_transform'],
+        ... )).prefetch(...)  # doctest: +SKIP
+    """
+    def __init__(
+            self,
+            transform,
+            cache_dir,
+            keys=None,
+            config=None,
+            example_id_key='example_id',
+            read_only=False,
+    ):
+        """
+        Args:
+            transform: A deterministic function, that takes an example and
+                returns the transformed example.
+            cache_dir: The directory of the cache. The features are stored
+                in the subdirectory `config_hash(config)`.
+            keys: The (flat, i.e. `a.b` for nested dicts) keys of the
+                transformed example, that are cached. The other values are
+                taken from the input example, when the cache is used.
+                If None, the complete transformed example is cached.
+            config: The config of the transform, that identifies the cache.
+                Defaults to the transform, i.e. its attributes.
+            example_id_key: The key of the unique id of an example.
+            read_only: If True, a missing example is computed, but not
+                written to the cache.
+        """
+        self.transform = transform
+        self.keys = keys
+        self.example_id_key = example_id_key
+        self.read_only = read_only
+        if config is None:
+            config = transform
+        self.config_hash = config_hash(config)
+        self.cache_dir = Path(cache_dir) / self.config_hash
+        self._reset()
+
+    def _reset(self):
+        self._index = {}
+        self._index_positions = {}
+        self._index_lock = threading.Lock()
+        self._writers = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ['_index', '_index_positions', '_index_lock', '_writers']:
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    def __len__(self):
+        self._update_index()
+        return len(self._index)
+
+    def __contains__(self, example_id):
+        if example_id not in self._index:
+            self._update_index()
+        return example_id in self._index
+
+    def _update_index(self):
+        """
+        Reads the new lines of the index files (also from other processes).
+        """
+        if not self.cache_dir.exists():
+            return
+        with self._index_lock:
+            self._read_index_files()
+
+    def _read_index_files(self):
+        for file in self.cache_dir.glob('*.index.jsonl'):
+            position = self._index_positions.get(file.name, 0)
+            with open(file, 'rb') as fd:
+                fd.seek(position)
+                for line in fd:
+                    if not line.endswith(b'\n'):
+                        # Incomplete line from a writer
+                        break
+                    position += len(line)
+                    entry = json.loads(line)
+                    self._index.setdefault(entry['example_id'], entry)
+            self._index_positions[file.name] = position
+
+    def _load(self, entry):
+        flat = {}
+        for key, value in entry['values'].items():
+            if 'offset' in value:
+                shape = tuple(value['shape'])
+                if np.prod(shape) > 0:
+                    # Each load is a new (copy on write) mapping, so an
+                    # in-place modification is private to the loaded array.
+                    flat[key] = np.memmap(
+                        self.cache_dir / f'{entry["shard"]}.bin',
+                        dtype=value['dtype'], mode='c',
+                        offset=value['offset'], shape=shape,
+                    ).view(np.ndarray)
+                else:
+                    flat[key] = np.empty(shape, dtype=value['dtype'])
+            else:
+                flat[key] = value['value']
+        return flat
+
+    def _open_writer(self):
+        """
+        Returns the shard and the files of the current thread. Threads
+        (e.g. of `prefetch(..., backend='t')`) share the process, hence the
+        shard is per process and thread.
+        """
+        key = (os.getpid(), threading.get_ident())
+        if key not in self._writers:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            shard = f'{key[0]}_{uuid.uuid4().hex}'
+            self._writers[key] = (
+                shard,
+                open(self.cache_dir / f'{shard}.bin', 'ab'),
+                open(self.cache_dir / f'{shard}.index.jsonl', 'ab'),
+            )
+        return self._writers[key]
+
+    def _write(self, example_id, flat):
+        shard, data_fd, index_fd = self._open_writer()
+        values = {}
+        for key, value in flat.items():
+            if isinstance(value, np.ndarray):
+                if value.dtype.kind not in 'biufc':
+                    raise TypeError(
+                        f'Only numeric arrays can be cached, got {key!r} '
+                        f'with dtype {value.dtype}.'
+                    )
+                offset = data_fd.tell()
+                padding = -offset % _ALIGNMENT
+                data_fd.write(b'\0' * padding)
+                data_fd.write(np.ascontiguousarray(value).tobytes())
+                values[key] = {
+                    'offset': offset + padding,
+                    'shape': list(value.shape),
+                    'dtype': value.dtype.str,
+                }
+            else:
+                if isinstance(value, np.generic):
+                    value = value.item()
+                try:
+                    json.dumps(value)
+                except TypeError:
+                    raise TypeError(
+                        f'Only arrays and json serializable values can be '
+                        f'cached, got {key!r} with type {type(value)}.'
+                    )
+                values[key] = {'value': value}
+        data_fd.flush()
+        entry = {'example_id': example_id, 'shard': shard, 'values': values}
+        # Write the index line after the data, so readers (e.g. other
+        # workers) only see complete examples.
+        index_fd.write(json.dumps(entry).encode() + b'\n')
+        index_fd.flush()
+        with self._index_lock:
+            self._index.setdefault(example_id, entry)
+
+    def __call__(self, example):
+        example_id = example[self.example_id_key]
+        if example_id in self:
+            cached = self._load(self._index[example_id])
+            if self.keys is None:
+                return deflatten(cached)
+            flat = flatten(example)
+            flat.update(cached)
+            return deflatten(flat)
+
+        example = self.transform(example)
+        if not self.read_only:
+            flat = flatten(example)
+            if self.keys is not None:
+                flat = {key: flat[key] for key in self.keys}
+            self._write(example_id, flat)
+        return example
+
+    def clear(self):
+        """
+        Deletes the cached features of this config.
+        """
+        for _, data_fd, index_fd in self._writers.values():
+            data_fd.close()
+            index_fd.close()
+        if self.cache_dir.exists():
+            for file in self.cache_dir.iterdir():
+                file.unlink()
+            self.cache_dir.rmdir()
+        self._reset()
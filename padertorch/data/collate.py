@@ -0,0 +1,173 @@
+import numpy as np
+import torch
+
+
+__all__ = [
+    'pad_batch',
+]
+
+
+def _torch_dtype(dtype):
+    return torch.from_numpy(np.empty(0, dtype=dtype)).dtype
+
+
+def _empty(shape, dtype, device=None, pin_memory=False, share_memory=False):
+    """
+    `torch.empty` with an optional allocation in shared memory.
+    `torch.empty(...).share_memory_()` would copy the (uninitialized) data
+    to the shared memory.
+    """
+    if not share_memory:
+        return torch.empty(
+            shape, dtype=dtype, device=device, pin_memory=pin_memory)
+    assert not pin_memory, 'pin_memory and share_memory are exclusive'
+    numel = int(np.prod(shape))
+    element_size = torch.empty(0, dtype=dtype).element_size()
+    try:
+        storage = torch.TypedStorage(
+            wrap_storage=torch.UntypedStorage._new_shared(
+                numel * element_size),
+            dtype=dtype,
+        )
+    except AttributeError:
+        # Older torch versions
+        return torch.empty(shape, dtype=dtype).share_memory_()
+    return torch.empty(0, dtype=dtype).set_(storage, 0, shape)
+
+
+def pad_batch(
+        arrays,
+        pad_value=0,
+        cut_end=False,
+        to_tensor=False,
+        pin_memory=False,
+        share_memory=False,
+        return_lengths=False,
+        return_mask=False,
+):
+    """
+    Stacks arrays (numpy arrays or tensors), that differ in at most one axis,
+    to a batch (new first axis), where the shorter arrays are padded with
+    `pad_value` at the end (or the longer arrays are cut with `cut_end`).
+
+    The shape of the batch is computed once, the batch is allocated once and
+    each array is copied once into its slice. Only the padded part is filled
+    with `pad_value`. The dtype of the batch is the dtype of the first
+    array, i.e. it is not upcasted as with `np.concatenate` and `np.zeros`.
+
+    Args:
+        arrays: A list of numpy arrays or a list of tensors with the same
+            number of dimensions.
+        pad_value: The value of the padded entries.
+        cut_end: If True, the arrays are cut to the shortest array instead
+            of padded to the longest array.
+        to_tensor: If True, numpy arrays with a numeric dtype are stacked to
+            a tensor (e.g. strings stay numpy arrays).
+        pin_memory: If True, the batch is a tensor in pinned memory, i.e.
+            the transfer to the GPU can be asynchronous (requires CUDA).
+        share_memory: If True, the batch is a tensor in shared memory, i.e.
+            it is not copied, when it is sent to another process (e.g. from
+            a data worker process). Only for tensors on the CPU.
+        return_lengths: If True, return additionally the lengths of the
+            arrays along the axis, in which they differ (the first axis,
+            when all shapes are equal).
+        return_mask: If True, return additionally a boolean mask with the
+            shape (batch size, length), that is True for the entries, that
+            are not padded.
+
+    Returns:
+        The batch and, when requested, the lengths and the mask. The lengths
+        and the mask are tensors, when the batch is a tensor.
+
+    >>> batch, lengths, mask = pad_batch(
+    ...     [np.ones((3, 2), dtype=np.int32), np.ones((1, 2), dtype=np.int32)],
+    ...     return_lengths=True, return_mask=True)
+    >>> batch
+    array([[[1, 1],
+            [1, 1],
+            [1, 1]],
+    <BLANKLINE>
+           [[1, 1],
+            [0, 0],
+            [0, 0]]], dtype=int32)
+    >>> lengths
+    array([3, 1])
+    >>> mask
+    array([[ True,  True,  True],
+           [ True, False, False]])
+    >>> pad_batch([torch.ones(3), torch.ones(2)], pad_value=-1, cut_end=True)
+    tensor([[1., 1.],
+            [1., 1.]])
+    >>> pad_batch([np.arange(3), np.arange(2)], to_tensor=True)
+    tensor([[0, 1, 2],
+            [0, 1, 0]])
+    """
+    assert len(arrays) > 0, arrays
+    is_tensor = torch.is_tensor(arrays[0])
+    shapes = np.array([array.shape for array in arrays], dtype=np.int64)
+    assert shapes.ndim == 2, (
+        'The arrays must have the same number of dimensions',
+        [array.shape for array in arrays]
+    )
+    if shapes.shape[1] > 0:
+        axes = np.flatnonzero(np.any(shapes != shapes[0], axis=0))
+    else:
+        axes = np.zeros(0, dtype=np.int64)
+    assert len(axes) <= 1, (
+        'arrays are only allowed to differ in one dim',
+        [array.shape for array in arrays]
+    )
+    if cut_end:
+        target_shape = shapes.min(axis=0)
+    else:
+        target_shape = shapes.max(axis=0)
+    axis = int(axes[0]) if len(axes) == 1 else 0
+    batch_shape = (len(arrays), *target_shape)
+
+    dtype = arrays[0].dtype
+    if not is_tensor and (
+            to_tensor or pin_memory or share_memory
+    ) and dtype.kind in 'biufc':
+        out = _empty(
+            batch_shape, _torch_dtype(dtype),
+            pin_memory=pin_memory, share_memory=share_memory,
+        )
+        # Copy the numpy arrays into the numpy view of the tensor.
+        out_view = out.numpy()
+    elif is_tensor:
+        out = out_view = _empty(
+            batch_shape, dtype, device=arrays[0].device,
+            pin_memory=pin_memory, share_memory=share_memory,
+        )
+    else:
+        out = out_view = np.empty(batch_shape, dtype=dtype)
+
+    for i, array in enumerate(arrays):
+        if len(axes) == 0:
+            out_view[i] = array
+            continue
+        length = min(array.shape[axis], target_shape[axis])
+        index = (slice(None),) * axis
+        out_view[(i, *index, slice(length))] = array[(*index, slice(length))]
+        if length < target_shape[axis]:
+            out_view[(i, *index, slice(length, None))] = pad_value
+
+    if not (return_lengths or return_mask):
+        return out
+
+    if shapes.shape[1] > 0:
+        lengths = np.minimum(shapes[:, axis], target_shape[axis])
+        max_length = target_shape[axis]
+    else:
+        lengths = np.ones(len(arrays), dtype=np.int64)
+        max_length = 1
+    mask = np.arange(max_length) < lengths[:, None]
+    if torch.is_tensor(out):
+        lengths = torch.from_numpy(lengths)
+        mask = torch.from_numpy(mask)
+    ret = (out,)
+    if return_lengths:
+        ret += (lengths,)
+    if return_mask:
+        ret += (mask,)
+    return ret
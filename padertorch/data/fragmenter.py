@@ -1,8 +1,56 @@
-from copy import deepcopy
 import numpy as np
 from paderbox.utils.nested import nested_op, flatten, deflatten
 
 
+def fragment_axis(x, length, step, axis=-1, copy=False):
+    """
+    Returns all complete fragments of `x` along `axis` as one strided view
+    with a new first axis for the fragments, i.e. the fragments are not
+    copied. Incomplete fragments at the end are dropped.
+
+    The view is read only, because the fragments may overlap.
+    Use `copy=True` to get a writeable array.
+
+    Args:
+        x: numpy array
+        length: length of the fragments along `axis`
+        step: distance between the starts of two fragments
+        axis: the axis to fragment
+        copy: If True, return a (contiguous) copy instead of the view.
+
+    Returns:
+        array with the shape (num_fragments, *x.shape), where the length of
+        `axis` is replaced by `length`.
+
+    >>> x = np.arange(10).reshape(2, 5)
+    >>> fragment_axis(x, 3, 2)
+    array([[[0, 1, 2],
+            [5, 6, 7]],
+    <BLANKLINE>
+           [[2, 3, 4],
+            [7, 8, 9]]])
+    >>> fragment_axis(x, 1, 1, axis=0).shape
+    (2, 1, 5)
+    >>> np.shares_memory(fragment_axis(x, 3, 2), x)
+    True
+    """
+    assert length > 0 and step > 0, (length, step)
+    x = np.asarray(x)
+    axis = axis % x.ndim
+    num_fragments = max((x.shape[axis] - length) // step + 1, 0)
+    shape = list(x.shape)
+    shape[axis] = length
+    fragments = np.lib.stride_tricks.as_strided(
+        x,
+        shape=(num_fragments, *shape),
+        strides=(x.strides[axis] * step, *x.strides),
+        writeable=False,
+    )
+    if copy:
+        fragments = np.array(fragments)
+    return fragments
+
+
 class Fragmenter(object):
     """
     Build fragments of the values corresponding to fragment_keys 
@@ -39,10 +87,31 @@ class Fragmenter(object):
     >>> pprint(channel_fragmenter(example))
     [{'a': array([0, 1, 2, 3]), 'b': array([1, 2, 3, 4])},
      {'a': array([4, 5, 6, 7]), 'b': array([1, 2, 3, 4])}]
+
+    The complete fragments are read only views of the input (see
+    `fragment_axis`), use `copy=True` to get writeable copies.
+    The values of the `copy_keys` are shared between the fragments, i.e.
+    they are not copied.
+
+    With `stack=True` a single example is returned, where each fragmented
+    value has a new first axis for the fragments, i.e. the fragments are
+    already a batch. The values of the `copy_keys` are not repeated.
+    >>> time_fragmenter = Fragmenter(\
+            {'a':2, 'b':1}, axis=-1, stack=True, drop_last=True)
+    >>> example = {'a': np.arange(8).reshape((2, 4)), 'b': np.array([1,2])}
+    >>> pprint(time_fragmenter(example))
+    {'a': array([[[0, 1],
+            [4, 5]],
+    <BLANKLINE>
+           [[2, 3],
+            [6, 7]]]),
+     'b': array([[1],
+           [2]])}
     """
     def __init__(
             self, fragment_steps, fragment_lengths=None, axis=-1,
-            squeeze=False, drop_last=False, copy_keys=None
+            squeeze=False, drop_last=False, copy_keys=None,
+            copy=False, stack=False,
     ):
         self.fragment_steps = fragment_steps
         self.fragment_lengths = fragment_lengths \
@@ -51,6 +120,12 @@ class Fragmenter(object):
         self.squeeze = squeeze
         self.drop_last = drop_last
         self.copy_keys = copy_keys
+        self.copy = copy
+        self.stack = stack
+        assert drop_last or not stack, (
+            'Incomplete fragments cannot be stacked, use drop_last=True',
+            drop_last, stack
+        )
 
     def __call__(self, example, random_onset=False):
         copies = flatten(
@@ -74,21 +149,32 @@ class Fragmenter(object):
                 slc[self.axis] = slice(
                     int(start_idx), x.shape[self.axis]
                 )
-                x = x[slc]
-
-            end_index = x.shape[self.axis]
-            if self.drop_last:
-                end_index -= (fragment_length - 1)
-            fragments = list()
-            for start_idx in np.arange(0, end_index, fragment_step):
-                if fragment_length == 1 and self.squeeze:
-                    fragments.append(x.take(start_idx, axis=self.axis))
-                else:
+                x = x[tuple(slc)]
+
+            fragments = fragment_axis(
+                x, fragment_length, fragment_step, axis=self.axis,
+                copy=self.copy,
+            )
+            if fragment_length == 1 and self.squeeze:
+                fragments = np.squeeze(
+                    fragments, axis=self.axis % x.ndim + 1)
+            if self.stack:
+                return fragments
+            fragments = list(fragments)
+            if not self.drop_last:
+                # Incomplete fragments at the end
+                for start_idx in range(
+                        len(fragments) * fragment_step,
+                        x.shape[self.axis], fragment_step
+                ):
                     slc = [slice(None)] * len(x.shape)
                     slc[self.axis] = slice(
-                        int(start_idx), int(start_idx) + int(fragment_length)
+                        start_idx, start_idx + fragment_length
                     )
-                    fragments.append(x[tuple(slc)])
+                    fragment = x[tuple(slc)]
+                    if self.copy:
+                        fragment = fragment.copy()
+                    fragments.append(fragment)
             return fragments
 
         features = flatten({
@@ -99,9 +185,12 @@ class Fragmenter(object):
             [len(features[key]) for key in list(features.keys())]
         )
         assert all(num_fragments == num_fragments[0]), (list(features.keys()), num_fragments)
+        if self.stack:
+            return deflatten({**copies, **features})
         fragments = list()
         for i in range(int(num_fragments[0])):
-            fragment = deepcopy(copies)
+            # The copied values are shared, only the (nested) dicts are new.
+            fragment = dict(copies)
             for key in features.keys():
                 fragment[key] = features[key][i]
             fragment = deflatten(fragment)
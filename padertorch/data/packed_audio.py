@@ -0,0 +1,226 @@
+"""
+Packed audio: The audio files of a database are converted to a few large
+containers with a fixed sample rate and dtype and an index with the offset
+of each file. The containers are memory mapped, i.e. reading an example
+(or a segment of it) doesn't open a file and doesn't copy the data.
+
+Layout of the storage directory:
+ - `index.json`: The sample rate, the dtype and for each audio path the
+   container, the offset, the number of channels and samples and the
+   sample rate of the file.
+ - `audio_<i>.bin`: The raw audio data. Each file is stored as array with
+   the shape (channels, samples), so a segment is a strided view.
+
+>>> import tempfile, soundfile
+>>> audio_dir = Path(tempfile.mkdtemp())
+>>> soundfile.write(audio_dir / 'a.wav', np.linspace(-0.5, 0.5, 8), 16000)
+>>> storage_dir = pack_audio([audio_dir / 'a.wav'], audio_dir / 'packed')
+>>> reader = PackedAudioReader(storage_dir)
+>>> reader.read(audio_dir / 'a.wav', 2, 6)
+array([[-0.21429443, -0.07144165,  0.07141113,  0.21426392]])
+>>> reader({'audio_path': audio_dir / 'a.wav'})['audio_data'].shape
+(1, 8)
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+__all__ = [
+    'pack_audio',
+    'PackedAudioReader',
+]
+
+
+_INT16_SCALE = 2 ** 15
+
+
+def _to_dtype(audio, dtype):
+    """
+    Converts float audio in [-1, 1) to dtype (int16 is scaled by 2**15).
+    """
+    if dtype == np.int16:
+        return np.clip(
+            np.round(audio * _INT16_SCALE), -_INT16_SCALE, _INT16_SCALE - 1
+        ).astype(np.int16)
+    else:
+        return audio.astype(dtype)
+
+
+def _read(path, sample_rate):
+    import soundfile
+    audio, sr = soundfile.read(str(path), always_2d=True)
+    audio = audio.T
+    if sr != sample_rate:
+        import samplerate
+        audio = samplerate.resample(
+            audio.T, sample_rate / sr, 'sinc_fastest').T
+    return audio, sr
+
+
+def pack_audio(
+        audio_paths,
+        storage_dir,
+        sample_rate=16000,
+        dtype='int16',
+        max_container_bytes=2 ** 32,
+        read_fn=None,
+):
+    """
+    Packs the audio files into containers in `storage_dir`. Already packed
+    paths are skipped, i.e. a storage can be extended.
+
+    Args:
+        audio_paths: The paths of the audio files. For a database, e.g.
+            `{ex['audio_path'] for ex in dataset}`.
+        storage_dir: The output directory.
+        sample_rate: The sample rate of the containers. Files with another
+            sample rate are resampled (requires `samplerate`).
+        dtype: 'int16' or 'float32'.
+        max_container_bytes: A new container is started, when a container
+            would exceed this size.
+        read_fn: A function that takes a path and the sample rate and
+            returns the audio as float array with the shape
+            (channels, samples) and the sample rate of the file. Defaults
+            to reading with `soundfile`.
+
+    Returns:
+        storage_dir
+    """
+    dtype = np.dtype(dtype)
+    assert dtype in (np.int16, np.float32), dtype
+    if read_fn is None:
+        read_fn = _read
+    storage_dir = Path(storage_dir)
+    storage_dir.mkdir(parents=True, exist_ok=True)
+    index_file = storage_dir / 'index.json'
+    if index_file.exists():
+        index = json.loads(index_file.read_text())
+        assert index['sample_rate'] == sample_rate, (index['sample_rate'], sample_rate)
+        assert index['dtype'] == dtype.str, (index['dtype'], dtype.str)
+    else:
+        index = {'sample_rate': sample_rate, 'dtype': dtype.str, 'files': {}}
+
+    # Continue with a new container, existing containers are not changed.
+    container = len(list(storage_dir.glob('audio_*.bin')))
+    fd = None
+    try:
+        for path in audio_paths:
+            path = str(path)
+            if path in index['files']:
+                continue
+            audio, source_sample_rate = read_fn(path, sample_rate)
+            audio = _to_dtype(np.asarray(audio), dtype)
+            assert audio.ndim == 2, (audio.shape, path)
+            if fd is not None and fd.tell() + audio.nbytes > max_container_bytes:
+                fd.close()
+                fd = None
+                container += 1
+            if fd is None:
+                fd = open(storage_dir / f'audio_{container}.bin', 'wb')
+            index['files'][path] = {
+                'container': container,
+                'offset': fd.tell(),
+                'num_channels': audio.shape[0],
+                'num_samples': audio.shape[1],
+                'source_sample_rate': source_sample_rate,
+            }
+            fd.write(np.ascontiguousarray(audio).tobytes())
+    finally:
+        if fd is not None:
+            fd.close()
+        # The index is written at the end (atomically), hence an interrupted
+        # conversion can be continued.
+        tmp_file = storage_dir / 'index.json.tmp'
+        tmp_file.write_text(json.dumps(index))
+        os.replace(tmp_file, index_file)
+    return storage_dir
+
+
+class PackedAudioReader:
+    """
+    Reads audio from a storage of `pack_audio`. A drop-in replacement for
+    `padertorch.contrib.je.data.transforms.AudioReader`: `__call__` reads
+    `audio_path` (optionally with `audio_start_samples` and
+    `audio_stop_samples`) and writes the audio to `audio_data`.
+
+    With `dtype=None` the audio is returned in the dtype of the storage as
+    read only view of the memory mapped container (zero-copy). Otherwise
+    it is converted to the dtype (int16 is scaled to [-1, 1)).
+    """
+    def __init__(self, storage_dir, dtype=np.float64):
+        self.storage_dir = Path(storage_dir)
+        index = json.loads((self.storage_dir / 'index.json').read_text())
+        self.sample_rate = index['sample_rate']
+        self.storage_dtype = np.dtype(index['dtype'])
+        self.files = index['files']
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self._containers = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_containers'] = {}
+        return state
+
+    def __contains__(self, path):
+        return str(path) in self.files
+
+    def _get_container(self, container):
+        if container not in self._containers:
+            self._containers[container] = np.memmap(
+                self.storage_dir / f'audio_{container}.bin',
+                dtype=self.storage_dtype, mode='r',
+            ).view(np.ndarray)
+        return self._containers[container]
+
+    def read(self, path, start_sample=0, stop_sample=None):
+        """
+        Returns the audio (channels, samples) of `path` from `start_sample`
+        to `stop_sample`. Lists of paths are concatenated along the time
+        axis (like `AudioReader.read_file`).
+
+        Like in `AudioReader`, `start_sample` and `stop_sample` are at the
+        sample rate of the file, i.e. they are scaled, when the file was
+        resampled.
+        """
+        if isinstance(path, (list, tuple)):
+            start_sample = start_sample \
+                if isinstance(start_sample, (list, tuple)) \
+                else len(path) * [start_sample]
+            stop_sample = stop_sample \
+                if isinstance(stop_sample, (list, tuple)) \
+                else len(path) * [stop_sample]
+            return np.concatenate([
+                self.read(path_, start_, stop_)
+                for path_, start_, stop_ in zip(path, start_sample, stop_sample)
+            ], axis=-1)
+
+        entry = self.files[str(path)]
+        itemsize = self.storage_dtype.itemsize
+        start = entry['offset'] // itemsize
+        size = entry['num_channels'] * entry['num_samples']
+        audio = self._get_container(entry['container'])[start:start + size]
+        audio = audio.reshape(entry['num_channels'], entry['num_samples'])
+        source_sample_rate = entry.get('source_sample_rate', self.sample_rate)
+        if source_sample_rate != self.sample_rate:
+            factor = self.sample_rate / source_sample_rate
+            start_sample = int(round(start_sample * factor))
+            if stop_sample is not None:
+                stop_sample = int(round(stop_sample * factor))
+        audio = audio[:, start_sample:stop_sample]
+        if self.dtype is None:
+            return audio
+        elif self.storage_dtype == np.int16:
+            return np.multiply(audio, 1 / _INT16_SCALE, dtype=self.dtype)
+        else:
+            return audio.astype(self.dtype)
+
+    def __call__(self, example):
+        example['audio_data'] = self.read(
+            example['audio_path'],
+            example.get('audio_start_samples', 0),
+            example.get('audio_stop_samples', None),
+        )
+        return example
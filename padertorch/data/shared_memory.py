@@ -0,0 +1,267 @@
+"""
+Transport of batches from worker processes (e.g.
+`dataset.prefetch(..., backend='mp')`) to the training process without
+pickling the data of large arrays.
+
+In the worker, `to_shared_memory` writes each large numpy array into a file
+in shared memory (`/dev/shm`) and replaces the array by a `SharedArray`,
+i.e. a small handle that contains only the file name, the shape and the
+dtype. Only the handle is pickled. In the training process,
+`example_to_device` (or `from_shared_memory`) maps the file and the array
+is used without a copy.
+
+The file is deleted, when the handle is resolved. The memory itself is
+released, when the last array that uses it is deleted, i.e. after the step
+that consumed the batch.
+
+A handle, that is pickled in a worker, but never unpickled (e.g. the
+prefetched batches, when the training stops early), has no owner. Hence,
+the file name contains the pid of the consuming process (the parent of the
+worker) and the consuming process deletes its remaining files at exit.
+
+>>> import lazy_dataset
+>>> ds = lazy_dataset.new([{'stft': np.ones((2, 3)), 'id': 'a'}])
+>>> ds = ds.map(functools.partial(to_shared_memory, min_bytes=0))
+>>> example, = ds.prefetch(1, 1, backend='concurrent_mp')
+>>> example
+{'stft': SharedArray(shape=(2, 3), dtype=float64), 'id': 'a'}
+>>> from padertorch.data.batch import example_to_device
+>>> example_to_device(example)
+{'stft': tensor([[1., 1., 1.],
+        [1., 1., 1.]], dtype=torch.float64), 'id': 'a'}
+"""
+import atexit
+import functools
+import glob
+import multiprocessing
+import os
+import tempfile
+import uuid
+import weakref
+
+import numpy as np
+
+
+__all__ = [
+    'SharedArray',
+    'to_shared_memory',
+    'from_shared_memory',
+]
+
+
+def _default_directory():
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    else:
+        return tempfile.gettempdir()
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _owner_pid():
+    """
+    The pid of the process, that consumes the handles: The parent of a
+    worker process (e.g. of `prefetch(..., backend='mp')`) or the process
+    itself.
+    """
+    if multiprocessing.current_process().name == 'MainProcess':
+        return os.getpid()
+    else:
+        return os.getppid()
+
+
+def _remove_files_of_process(directory, pid):
+    if os.getpid() != pid:
+        # A forked child inherited the atexit function.
+        return
+    for path in glob.glob(os.path.join(directory, f'padertorch_{pid}_*')):
+        _unlink(path)
+
+
+# (directory, pid) pairs, that are cleaned at exit.
+_cleanup_registry = set()
+
+
+def _register_cleanup(directory):
+    """
+    Deletes the files of this process in `directory` at exit, i.e. also the
+    files of handles, that were never unpickled.
+    """
+    key = (directory, os.getpid())
+    if key not in _cleanup_registry:
+        _cleanup_registry.add(key)
+        atexit.register(_remove_files_of_process, *key)
+
+
+if _owner_pid() == os.getpid():
+    # The handles of the workers may not reach this process.
+    _register_cleanup(_default_directory())
+
+
+class SharedArray:
+    """
+    Handle of a numpy array in a file in shared memory.
+
+    The handle owns the file: When the handle is deleted or resolved with
+    `numpy`, the file is deleted. When the handle is pickled (i.e. send to
+    another process), the ownership moves to the unpickled handle. The
+    files of handles, that are pickled but never unpickled, are deleted,
+    when the consuming process exits (see `_owner_pid`). A copy of a handle
+    is the handle itself.
+
+    >>> handle = SharedArray(np.arange(4, dtype=np.int32))
+    >>> handle
+    SharedArray(shape=(4,), dtype=int32)
+    >>> os.path.exists(handle.path)
+    True
+    >>> handle.numpy()
+    array([0, 1, 2, 3], dtype=int32)
+    >>> os.path.exists(handle.path)
+    False
+    """
+    def __init__(self, array, directory=None):
+        array = np.asarray(array)
+        assert array.dtype.kind in 'biufc', (
+            'Only numeric arrays can be stored in shared memory', array.dtype)
+        if directory is None:
+            directory = _default_directory()
+        directory = str(directory)
+        owner_pid = _owner_pid()
+        if owner_pid == os.getpid():
+            _register_cleanup(directory)
+        self.path = os.path.join(
+            directory, f'padertorch_{owner_pid}_{uuid.uuid4().hex}')
+        self.shape = array.shape
+        self.dtype = array.dtype
+        if array.size > 0:
+            shared = np.memmap(
+                self.path, dtype=self.dtype, mode='w+', shape=self.shape)
+            shared[...] = array
+            del shared
+        else:
+            open(self.path, 'wb').close()
+        self._finalizer = weakref.finalize(self, _unlink, self.path)
+        self._array = None
+
+    def __getstate__(self):
+        assert self._array is None, (
+            'A resolved SharedArray cannot be pickled', self)
+        # The unpickled handle owns the file.
+        self._finalizer.detach()
+        return {'path': self.path, 'shape': self.shape, 'dtype': self.dtype}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._finalizer = weakref.finalize(self, _unlink, self.path)
+        self._array = None
+        _register_cleanup(os.path.dirname(self.path))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(shape={self.shape}, ' \
+               f'dtype={self.dtype})'
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def numpy(self):
+        """
+        Maps the shared memory and returns it as numpy array (without a
+        copy). The file is deleted, the memory stays valid as long as the
+        returned array exists.
+        """
+        if self._array is None:
+            if self.nbytes > 0:
+                self._array = np.memmap(
+                    self.path, dtype=self.dtype, mode='r+', shape=self.shape
+                ).view(np.ndarray)
+            else:
+                self._array = np.empty(self.shape, dtype=self.dtype)
+            self.release()
+        return self._array
+
+    def release(self):
+        """
+        Deletes the file. Already mapped arrays stay valid.
+        """
+        self._finalizer()
+
+
+def to_shared_memory(example, min_bytes=2**16, directory=None):
+    """
+    Replaces the numeric numpy arrays in a nested structure with
+    `SharedArray` handles. Use it as last map before
+    `prefetch(..., backend='mp')`, i.e. in the worker process.
+
+    Args:
+        example: A nested structure (dict, list, tuple, dataclass).
+        min_bytes: Smaller arrays are kept and pickled, because for them
+            a file is more expensive than the copy.
+        directory: The directory for the files, default `/dev/shm`.
+
+    Returns:
+        The nested structure with handles instead of arrays.
+
+    >>> to_shared_memory({'a': np.zeros(10), 'b': [np.zeros(2)]}, min_bytes=32)
+    {'a': SharedArray(shape=(10,), dtype=float64), 'b': [array([0., 0.])]}
+    """
+    recursive = functools.partial(
+        to_shared_memory, min_bytes=min_bytes, directory=directory)
+    if isinstance(example, dict):
+        return example.__class__({
+            key: recursive(value) for key, value in example.items()
+        })
+    elif isinstance(example, (tuple, list)):
+        return example.__class__([recursive(element) for element in example])
+    elif isinstance(example, np.ndarray):
+        if example.dtype.kind in 'biufc' and example.nbytes >= min_bytes:
+            return SharedArray(example, directory=directory)
+        else:
+            return example
+    elif hasattr(example, '__dataclass_fields__'):
+        return example.__class__(**{
+            f: recursive(getattr(example, f))
+            for f in example.__dataclass_fields__
+        })
+    else:
+        return example
+
+
+def from_shared_memory(example):
+    """
+    Replaces the `SharedArray` handles in a nested structure with numpy
+    arrays. Opposite of `to_shared_memory`.
+    `padertorch.data.example_to_device` resolves the handles automatically.
+
+    >>> example = to_shared_memory({'a': np.ones(3)}, min_bytes=0)
+    >>> from_shared_memory(example)
+    {'a': array([1., 1., 1.])}
+    """
+    if isinstance(example, dict):
+        return example.__class__({
+            key: from_shared_memory(value) for key, value in example.items()
+        })
+    elif isinstance(example, (tuple, list)):
+        return example.__class__([
+            from_shared_memory(element) for element in example
+        ])
+    elif isinstance(example, SharedArray):
+        return example.numpy()
+    elif hasattr(example, '__dataclass_fields__'):
+        return example.__class__(**{
+            f: from_shared_memory(getattr(example, f))
+            for f in example.__dataclass_fields__
+        })
+    else:
+        return example
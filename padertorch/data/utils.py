@@ -15,7 +15,7 @@ def pad_tensor(vec, pad, axis):
 
     pad_size = list(vec.shape)
     pad_size[axis] = pad - vec.shape[axis]
-    return np.concatenate([vec, np.zeros(pad_size)], axis=axis)
+    return np.concatenate([vec, np.zeros(pad_size, dtype=vec.dtype)], axis=axis)
 
 
 def collate_fn(batch):
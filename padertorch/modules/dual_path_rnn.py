@@ -19,6 +19,7 @@ from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence, \
     PackedSequence, pad_sequence
 
 import paderbox as pb
+from padertorch.utils import checkpoint_activations, checkpoint_indices
 
 
 def segment(
@@ -561,6 +562,7 @@ class DPRNN(torch.nn.Module):
             num_blocks: int,
             inter_chunk_type: 'str' = 'blstm',
             intra_chunk_type='blstm',
+            checkpoint=False,
     ):
         """
 
@@ -572,10 +574,18 @@ class DPRNN(torch.nn.Module):
             num_blocks: Number of DPRNN blocks in this DPRNN
             inter_chunk_type: NN type for the inter-chunk RNN
             intra_chunk_type: NN type for the inter-chunk RNN
+            checkpoint: If True, the activations inside of each DPRNN block
+                are recomputed in the backward instead of stored
+                (see `padertorch.utils.checkpoint_activations`), i.e. only
+                the inputs of the blocks are stored. An int or a list of
+                block indices selects the blocks
+                (see `padertorch.utils.checkpoint_indices`).
         """
         super().__init__()
         self.window_size = window_length
         self.hop_size = hop_size
+        self.checkpoint = checkpoint
+        self._checkpoint_indices = checkpoint_indices(checkpoint, num_blocks)
 
         self.dprnn_blocks = torch.nn.Sequential(*[
             DPRNNBlock(
@@ -653,8 +663,11 @@ class DPRNN(torch.nn.Module):
         # Call DPRNN blocks. It is not possible to use torch.nn.Sequential here
         # because each iteration needs the sequence lengths if provided
         h = segmented
-        for block in self.dprnn_blocks:
-            h = block(h, sequence_lengths)
+        for i, block in enumerate(self.dprnn_blocks):
+            if i in self._checkpoint_indices:
+                h = checkpoint_activations(block, h, sequence_lengths)
+            else:
+                h = block(h, sequence_lengths)
 
         # Overlap add
         out = overlap_add(h, hop_size=hop_size, unpad=True)
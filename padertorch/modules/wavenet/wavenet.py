@@ -30,6 +30,7 @@ from cached_property import cached_property
 
 from padertorch.base import Module
 from padertorch.ops import mu_law_encode, mu_law_decode
+from padertorch.utils import checkpoint_activations, checkpoint_indices
 
 
 __all__ = [
@@ -70,7 +71,7 @@ class WaveNet(Module):
             self, n_cond_channels, upsamp_window, upsamp_stride,
             n_in_channels=256, n_layers=16, max_dilation=128,
             n_residual_channels=64, n_skip_channels=256, n_out_channels=256,
-            fading='full'
+            fading='full', checkpoint=False,
     ):
         """
         WaveNet implementation based on https://github.com/NVIDIA/nv-wavenet
@@ -84,8 +85,16 @@ class WaveNet(Module):
         :param n_residual_channels:
         :param n_skip_channels:
         :param n_out_channels:
+        :param checkpoint: If True, the activations inside of each layer
+            (dilated convolution, gated activation, residual and skip
+            convolution) are recomputed in the backward instead of stored
+            (see `padertorch.utils.checkpoint_activations`). An int or a
+            list of layer indices selects the layers
+            (see `padertorch.utils.checkpoint_indices`).
         """
         super().__init__()
+        self.checkpoint = checkpoint
+        self._checkpoint_indices = checkpoint_indices(checkpoint, n_layers)
 
         self.n_layers = n_layers
         self.max_dilation = max_dilation
@@ -160,19 +169,17 @@ class WaveNet(Module):
         cond_acts = cond_acts.view(
             cond_acts.size(0), self.n_layers, -1, cond_acts.size(2))
         for i in range(self.n_layers):
-            in_act = self.dilate_layers[i](forward_input)
-            in_act = in_act + cond_acts[:, i, :, :]
-            t_act = torch.tanh(in_act[:, :self.n_residual_channels, :])
-            s_act = torch.sigmoid(in_act[:, self.n_residual_channels:, :])
-            acts = t_act * s_act
-            if i < len(self.res_layers):
-                res_acts = self.res_layers[i](acts)
-            forward_input = res_acts + forward_input
+            if i in self._checkpoint_indices:
+                forward_input, skip = checkpoint_activations(
+                    self._layer, i, forward_input, cond_acts[:, i, :, :])
+            else:
+                forward_input, skip = self._layer(
+                    i, forward_input, cond_acts[:, i, :, :])
 
             if i == 0:
-                output = self.skip_layers[i](acts)
+                output = skip
             else:
-                output = self.skip_layers[i](acts) + output
+                output = skip + output
 
         output = torch.nn.functional.relu(output, True)
         output = self.conv_out(output)
@@ -190,6 +197,17 @@ class WaveNet(Module):
 
         return output, quantized
 
+    def _layer(self, i, forward_input, cond_act):
+        in_act = self.dilate_layers[i](forward_input)
+        in_act = in_act + cond_act
+        t_act = torch.tanh(in_act[:, :self.n_residual_channels, :])
+        s_act = torch.sigmoid(in_act[:, self.n_residual_channels:, :])
+        acts = t_act * s_act
+        if i < len(self.res_layers):
+            forward_input = self.res_layers[i](acts) + forward_input
+        # The residual output of the last layer is not used.
+        return forward_input, self.skip_layers[i](acts)
+
     def export_weights(self):
         """
         Returns a dictionary with tensors ready for nv_wavenet wrapper
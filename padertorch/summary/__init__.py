@@ -1,2 +1,4 @@
 from .tbx_utils import *
 from . import tfevents
+from . import streaming
+from . import background_writer
@@ -0,0 +1,135 @@
+"""
+A wrapper for `tensorboardX.SummaryWriter`, that writes in a background
+thread.
+"""
+import queue
+import threading
+
+__all__ = [
+    'BackgroundSummaryWriter',
+]
+
+
+class BackgroundSummaryWriter:
+    """
+    Forwards the `add_*` calls (e.g. `add_scalar`, `add_image`,
+    `add_audio`) through a queue to a background thread, that calls the
+    wrapped writer. Hence, the encoding of images (PNG), audios (WAV) and
+    histograms (bucketing) does not block the caller. Matplotlib is not
+    thread safe, hence `add_figure` rasterizes the figure in the calling
+    thread and only the encoding of the image is done in the background.
+
+    The queue has at most `max_queue_size` entries. When the queue is full,
+    an `add_*` call blocks until the background thread has processed an entry
+    (backpressure), so the memory is bounded when the writer is slower than
+    the training.
+
+    An exception in the background thread is raised in the next call of an
+    `add_*` method, `flush` or `close`.
+
+    Note: The arguments are not copied. Do not modify them inplace after the
+        `add_*` call (e.g. a numpy array).
+
+    >>> class PrintWriter:
+    ...     def add_scalar(self, tag, scalar_value, global_step=None):
+    ...         print(tag, scalar_value, global_step)
+    ...     def flush(self):
+    ...         pass
+    ...     def close(self):
+    ...         print('close')
+    >>> writer = BackgroundSummaryWriter(PrintWriter())
+    >>> writer.add_scalar('loss', 1.5, global_step=2)
+    >>> writer.add_scalar('loss', 1.2, global_step=3)
+    >>> writer.close()
+    loss 1.5 2
+    loss 1.2 3
+    close
+    >>> writer = BackgroundSummaryWriter(PrintWriter())
+    >>> writer.add_scalar('loss', 1.5, step=2)
+    >>> try:
+    ...     writer.close()
+    ... except TypeError as e:
+    ...     print('TypeError:', e)  # doctest: +ELLIPSIS
+    close
+    TypeError: ...add_scalar() got an unexpected keyword argument 'step'
+    """
+    def __init__(self, writer, max_queue_size=64):
+        self.writer = writer
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._exception = None
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name='BackgroundSummaryWriter'
+        )
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                name, args, kwargs = item
+                if self._exception is None:
+                    getattr(self.writer, name)(*args, **kwargs)
+            except BaseException as e:
+                # Keep consuming the queue, so the caller does not block.
+                self._exception = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_exception(self):
+        if self._exception is not None:
+            exception, self._exception = self._exception, None
+            raise exception
+
+    def __getattr__(self, item):
+        if item.startswith('add_'):
+            # Raise an AttributeError now, when the writer has no such
+            # method.
+            getattr(self.writer, item)
+
+            def add(*args, **kwargs):
+                assert not self._closed, f'{self} is closed.'
+                self._raise_exception()
+                self._queue.put((item, args, kwargs))
+            return add
+        if item in ['writer', '_queue', '_thread']:
+            # Prevent an infinite recursion, when __init__ failed.
+            raise AttributeError(item)
+        return getattr(self.writer, item)
+
+    def add_figure(
+            self, tag, figure, global_step=None, close=True, walltime=None
+    ):
+        """
+        Like `tensorboardX.SummaryWriter.add_figure`, but the figure (or the
+        list of figures) is rasterized in the calling thread.
+        """
+        from tensorboardX.utils import figure_to_image
+        self.add_image(
+            tag, figure_to_image(figure, close), global_step, walltime,
+            dataformats='NCHW' if isinstance(figure, list) else 'CHW',
+        )
+
+    def flush(self):
+        """Blocks until all queued entries are written."""
+        self._queue.join()
+        self._raise_exception()
+        self.writer.flush()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+            try:
+                self._raise_exception()
+            finally:
+                self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
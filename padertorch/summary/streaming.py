@@ -0,0 +1,313 @@
+"""
+Statistics with a bounded memory, that are updated with a stream of values.
+
+Used by the `padertorch.train.hooks.SummaryHook` with
+`streaming_statistics=True`, where the summary interval can contain millions
+of steps.
+"""
+import numpy as np
+
+__all__ = [
+    'StreamingMean',
+    'StreamingHistogram',
+    'ReservoirSample',
+    'tensorflow_bins',
+]
+
+
+def _to_numpy(values):
+    if hasattr(values, 'detach'):  # torch.Tensor
+        values = values.detach().cpu().numpy()
+    return np.asarray(values, dtype=np.float64).reshape(-1)
+
+
+class StreamingMean:
+    """
+    Mean and variance of a stream of values (Welford's algorithm, with the
+    parallel update from Chan et al. for a batch of values).
+
+    `numpy.mean`, `numpy.sum`, `numpy.var` and `numpy.std` call the
+    corresponding methods of this object, i.e. they work as with a list of
+    all values. Other functions (e.g. `numpy.median`) fail.
+
+    >>> stats = StreamingMean()
+    >>> stats.update([1, 2, 3])
+    >>> stats.update(4)
+    >>> stats.count, np.mean(stats), np.sum(stats), np.var(stats)
+    (4, 2.5, 10.0, 1.25)
+    >>> other = StreamingMean()
+    >>> other.update([5, 6])
+    >>> merged = stats.merge(other)
+    >>> merged.count, np.mean(merged), np.var(merged) == np.var([1, 2, 3, 4, 5, 6])
+    (6, 3.5, True)
+    """
+    __slots__ = ['count', '_mean', '_m2']
+
+    def __init__(self, count=0, mean=0., m2=0.):
+        self.count = count
+        self._mean = mean
+        self._m2 = m2
+
+    @classmethod
+    def from_sums(cls, count, total, total_squares):
+        """
+        From the sum and the sum of squares, e.g. accumulated on a device.
+        """
+        if count == 0:
+            return cls()
+        mean = total / count
+        return cls(count, mean, max(total_squares - total * mean, 0.))
+
+    def _combine(self, count, mean, m2):
+        if count == 0:
+            return self.count, self._mean, self._m2
+        total_count = self.count + count
+        delta = mean - self._mean
+        return (
+            total_count,
+            self._mean + delta * count / total_count,
+            self._m2 + m2 + delta ** 2 * self.count * count / total_count,
+        )
+
+    def update(self, values):
+        values = _to_numpy(values)
+        if values.size == 0:
+            return
+        mean = values.mean()
+        m2 = np.sum((values - mean) ** 2)
+        self.count, self._mean, self._m2 = self._combine(
+            values.size, mean, m2)
+
+    def merge(self, other: 'StreamingMean'):
+        return self.__class__(*self._combine(
+            other.count, other._mean, other._m2))
+
+    def _check_empty(self):
+        if self.count == 0:
+            raise ValueError(f'{self.__class__.__name__} is empty.')
+
+    # The signatures of the following methods are compatible with the
+    # calls from numpy.mean, numpy.sum, numpy.var and numpy.std.
+    def mean(self, axis=None, dtype=None, out=None, **kwargs):
+        self._check_empty()
+        return float(self._mean)
+
+    def sum(self, axis=None, dtype=None, out=None, **kwargs):
+        return float(self._mean * self.count)
+
+    def var(self, axis=None, dtype=None, out=None, ddof=0, **kwargs):
+        self._check_empty()
+        return float(self._m2 / (self.count - ddof))
+
+    def std(self, axis=None, dtype=None, out=None, ddof=0, **kwargs):
+        return float(np.sqrt(self.var(ddof=ddof)))
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        if self.count == 0:
+            return f'{self.__class__.__name__}(count=0)'
+        return (
+            f'{self.__class__.__name__}(count={self.count}, '
+            f'mean={self.mean()}, var={self.var()})'
+        )
+
+
+def tensorflow_bins():
+    """
+    The default bin edges of `tensorboardX.SummaryWriter.add_histogram`
+    (bins='tensorflow').
+    """
+    v = 1E-12
+    buckets = []
+    neg_buckets = []
+    while v < 1E20:
+        buckets.append(v)
+        neg_buckets.append(-v)
+        v *= 1.1
+    return neg_buckets[::-1] + [0] + buckets
+
+
+class StreamingHistogram:
+    """
+    Histogram with fixed bin edges of a stream of values.
+
+    With the default edges (`tensorflow_bins`), `as_histogram_raw` produces
+    the same tensorboard histogram as
+    `SummaryWriter.add_histogram(tag, all_values)`, without keeping all values.
+
+    >>> hist = StreamingHistogram()
+    >>> hist.update([1, 2, 3])
+    >>> hist.update(np.array([4., 4.]))
+    >>> raw = hist.as_histogram_raw()
+    >>> raw['min'], raw['max'], raw['num'], raw['sum'], raw['sum_squares']
+    (1.0, 4.0, 5, 14.0, 46.0)
+    >>> sum(raw['bucket_counts'])
+    5
+    """
+    _default_bins = None
+
+    def __init__(self, bins=None):
+        if bins is None:
+            if StreamingHistogram._default_bins is None:
+                StreamingHistogram._default_bins = np.array(tensorflow_bins())
+            bins = StreamingHistogram._default_bins
+        self.bins = np.asarray(bins)
+        self.counts = np.zeros(len(self.bins) - 1, dtype=np.int64)
+        self.min = np.inf
+        self.max = -np.inf
+        self.num = 0
+        self.sum = 0.
+        self.sum_squares = 0.
+
+    def update(self, values):
+        values = _to_numpy(values)
+        # Like `SummaryHook.dump_summary`, the non finite values are ignored.
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return
+        counts, _ = np.histogram(values, bins=self.bins)
+        self.counts += counts
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.num += values.size
+        self.sum += values.sum()
+        self.sum_squares += values.dot(values)
+
+    def merge(self, other: 'StreamingHistogram'):
+        assert np.array_equal(self.bins, other.bins), (self.bins, other.bins)
+        new = self.__class__(self.bins)
+        new.counts = self.counts + other.counts
+        new.min = min(self.min, other.min)
+        new.max = max(self.max, other.max)
+        new.num = self.num + other.num
+        new.sum = self.sum + other.sum
+        new.sum_squares = self.sum_squares + other.sum_squares
+        return new
+
+    def __len__(self):
+        return self.num
+
+    def as_histogram_raw(self):
+        """
+        Returns the keyword arguments for
+        `tensorboardX.SummaryWriter.add_histogram_raw`.
+        Follows `tensorboardX.summary.make_histogram`, i.e. the empty bins
+        at the borders are removed.
+        """
+        if self.num == 0:
+            raise ValueError(f'{self.__class__.__name__} is empty.')
+        counts = self.counts
+        limits = self.bins
+        cum_counts = np.cumsum(np.greater(counts, 0))
+        start, end = np.searchsorted(
+            cum_counts, [0, cum_counts[-1] - 1], side="right")
+        start = int(start)
+        end = int(end) + 1
+        # TensorBoard only includes the right bin limits. Add an empty bin on
+        # the left to include the leftmost limit.
+        counts = (
+            counts[start - 1:end] if start > 0
+            else np.concatenate([[0], counts[:end]])
+        )
+        limits = limits[start:end + 1]
+        return dict(
+            min=float(self.min),
+            max=float(self.max),
+            num=int(self.num),
+            sum=float(self.sum),
+            sum_squares=float(self.sum_squares),
+            bucket_limits=limits.tolist(),
+            bucket_counts=counts.tolist(),
+        )
+
+
+class ReservoirSample:
+    """
+    Uniform random sample (without replacement) of at most `size` values of
+    a stream of values (reservoir sampling, Algorithm R).
+
+    >>> sample = ReservoirSample(5, seed=0)
+    >>> for i in range(10):
+    ...     sample.update(np.arange(10 * i, 10 * i + 10))
+    >>> sample.count, len(sample.values)
+    (100, 5)
+    >>> set(sample.values) <= set(range(100))
+    True
+    >>> other = ReservoirSample(5, seed=1)
+    >>> other.update([-1, -2])
+    >>> merged = sample.merge(other)
+    >>> merged.count, len(merged)
+    (102, 5)
+    """
+    def __init__(self, size, seed=None):
+        self.size = size
+        self.values = np.zeros(0)
+        self.count = 0
+        self._random_state = np.random.RandomState(seed)
+
+    @classmethod
+    def from_sample(cls, values, count, size, seed=None):
+        """
+        From a uniform sample of a stream with `count` values, e.g. sampled
+        on a device.
+        """
+        sample = cls(size, seed=seed)
+        sample.values = _to_numpy(values)[:size]
+        sample.count = count
+        assert len(sample.values) == min(count, size), (
+            len(sample.values), count, size)
+        return sample
+
+    def merge(self, other: 'ReservoirSample'):
+        """
+        Uniform sample of both streams. The number of values from each
+        sample is hypergeometric distributed, as if the values of both
+        streams were sampled together.
+        """
+        assert self.size == other.size, (self.size, other.size)
+        new = self.__class__(self.size)
+        new._random_state = self._random_state
+        new.count = self.count + other.count
+        if self.count == 0 or other.count == 0:
+            new.values = np.concatenate([self.values, other.values])
+            return new
+        num_values = min(self.size, new.count)
+        num_self = self._random_state.hypergeometric(
+            self.count, other.count, num_values)
+        new.values = np.concatenate([
+            self._random_state.choice(self.values, num_self, replace=False),
+            self._random_state.choice(
+                other.values, num_values - num_self, replace=False),
+        ])
+        return new
+
+    def update(self, values):
+        values = _to_numpy(values)
+        n_fill = min(max(self.size - len(self.values), 0), values.size)
+        if n_fill > 0:
+            self.values = np.concatenate([self.values, values[:n_fill]])
+        rest = values[n_fill:]
+        if rest.size > 0:
+            # The i-th value (0 based) replaces a random entry with the
+            # probability size / (i + 1).
+            index = np.arange(
+                self.count + n_fill, self.count + values.size)
+            random_index = np.floor(
+                self._random_state.uniform(size=rest.size) * (index + 1)
+            ).astype(np.int64)
+            mask = random_index < self.size
+            # For duplicate indices the last value wins, as in the
+            # sequential algorithm.
+            self.values[random_index[mask]] = rest[mask]
+        self.count += values.size
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __array__(self, dtype=None):
+        return np.asarray(self.values, dtype=dtype)
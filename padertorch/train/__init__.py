@@ -1,5 +1,8 @@
 from . import optimizer
 from . import trigger
 from . import hooks
+from . import checkpoint
+from . import cache
 from . import trainer
 from . import runtime_tests
+from . import autotune
@@ -0,0 +1,398 @@
+"""
+Tuning of the batch size and the learning rate before a training.
+
+Both searches train the model for a few steps in a temporary storage_dir
+(like `padertorch.train.runtime_tests.test_run`) and restore the state of
+the trainer afterwards:
+ - `batch_size_sweep`: Measures the throughput (examples per second) for
+   increasing batch sizes until the memory is exhausted.
+ - `lr_range_test`: Increases the learning rate exponentially in each step
+   and suggests the learning rate, where the loss decreases the fastest.
+
+`autotune` runs both and writes a report with a config patch for
+`Trainer.from_config`. From the command line:
+
+    python -m padertorch.train.autotune <storage_dir>/config.json \\
+        my_experiment.data.get_train_iterator
+
+where `get_train_iterator(batch_size)` returns the train iterator with the
+given batch size.
+"""
+import argparse
+import contextlib
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import torch
+
+import paderbox as pb
+import padertorch as pt
+from padertorch.train.hooks import Hook, Priority, StopTraining
+from padertorch.train.runtime_tests import backup_state_dict
+
+__all__ = [
+    'batch_size_sweep',
+    'lr_range_test',
+    'autotune',
+]
+
+
+class _StepRecorderHook(Hook):
+    """
+    Records the loss, the batch size and the end time of each step. Sets the
+    learning rate `lrs[iteration]` before each step, when `lrs` is given.
+    """
+    def __init__(self, num_steps, lrs=None, divergence_factor=None,
+                 smoothing=0.98):
+        self.num_steps = num_steps
+        self.lrs = lrs
+        self.divergence_factor = divergence_factor
+        self.smoothing = smoothing
+        self.losses = []
+        self.smoothed_losses = []
+        self._average = 0.
+        self.batch_sizes = []
+        self.timestamps = []
+
+    @property
+    def priority(self):
+        return Priority.END
+
+    def pre_step(self, trainer: 'pt.Trainer'):
+        if trainer.iteration >= self.num_steps:
+            raise StopTraining
+        if trainer.iteration == 0:
+            self.timestamps.append(time.perf_counter())
+        if self.lrs is not None:
+            for optimizer in _get_optimizers(trainer):
+                for param_group in optimizer.optimizer.param_groups:
+                    param_group['lr'] = self.lrs[trainer.iteration]
+
+    def post_step(self, trainer: 'pt.Trainer', example, model_output,
+                  review):
+        # item synchronizes with the device, i.e. the timestamp is the end
+        # of the step.
+        loss = review['loss'].item()
+        self.timestamps.append(time.perf_counter())
+        self.batch_sizes.append(pt.data.get_batch_size(example))
+        self.losses.append(loss)
+
+        # Exponential moving average with bias correction.
+        beta = self.smoothing
+        self._average = beta * self._average + (1 - beta) * loss
+        smoothed = self._average / (1 - beta ** len(self.losses))
+        self.smoothed_losses.append(smoothed)
+        if self.divergence_factor is not None and (
+                not np.isfinite(loss)
+                or smoothed > self.divergence_factor * min(
+                    self.smoothed_losses)
+        ):
+            raise StopTraining
+
+
+def _get_optimizers(trainer: 'pt.Trainer'):
+    if isinstance(trainer.optimizer, dict):
+        return list(trainer.optimizer.values())
+    return [trainer.optimizer]
+
+
+def _trial(trainer: 'pt.Trainer', train_iterator, recorder, device=None):
+    """
+    Trains with the `recorder` as only hook in a temporary storage_dir and
+    restores the state of the trainer afterwards.
+    """
+    with contextlib.ExitStack() as exit_stack:
+        storage_dir = Path(
+            exit_stack.enter_context(tempfile.TemporaryDirectory())
+        )
+        exit_stack.enter_context(mock.patch.object(
+            trainer, 'storage_dir', new=storage_dir))
+        exit_stack.enter_context(mock.patch.object(
+            trainer, 'hooks', new=[recorder]))
+        exit_stack.enter_context(backup_state_dict(trainer))
+        trainer.train(train_iterator, progress_bar=False, device=device)
+
+
+def _get_cuda_device(device):
+    """
+    Returns the GPU, that `Trainer.train(device=device)` uses, or None.
+    """
+    if not torch.cuda.is_available():
+        return None
+    if device is None:
+        return 0
+    if device == 'cpu':
+        return None
+    return device
+
+
+def batch_size_sweep(
+        trainer: 'pt.Trainer',
+        get_train_iterator,
+        batch_sizes=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+        num_steps=10,
+        warmup_steps=3,
+        device=None,
+):
+    """
+    Trains `num_steps` steps for each batch size and measures the throughput
+    of the last `num_steps - warmup_steps` steps (including the data
+    loading). The sweep stops at the first batch size, that runs out of
+    memory.
+
+    Args:
+        trainer:
+        get_train_iterator: Callable, that returns the train iterator for a
+            batch size.
+        batch_sizes: The increasing batch sizes.
+        num_steps: The number of training steps for each batch size.
+        warmup_steps: The number of steps, that are not measured (e.g.
+            cudnn benchmark and the start of the data loading).
+        device: See `Trainer.train`.
+
+    Returns:
+        A list of dicts with the `batch_size`, the `examples_per_second`, the
+        peak memory on a GPU (`max_memory_allocated`) and `out_of_memory`.
+
+    """
+    assert num_steps > warmup_steps, (num_steps, warmup_steps)
+    cuda_device = _get_cuda_device(device)
+    results = []
+    for batch_size in batch_sizes:
+        recorder = _StepRecorderHook(num_steps)
+        if cuda_device is not None:
+            torch.cuda.empty_cache()
+            torch.cuda.reset_peak_memory_stats(cuda_device)
+        try:
+            _trial(trainer, get_train_iterator(batch_size), recorder, device)
+        except RuntimeError as e:
+            if not pt.train.trainer._is_out_of_memory_error(e):
+                raise
+            print(f'Batch size {batch_size}: out of memory')
+            results.append(dict(batch_size=batch_size, out_of_memory=True))
+            break
+        finally:
+            if cuda_device is not None:
+                torch.cuda.empty_cache()
+
+        result = dict(
+            batch_size=batch_size,
+            examples_per_second=(
+                sum(recorder.batch_sizes[warmup_steps:])
+                / (recorder.timestamps[-1]
+                   - recorder.timestamps[warmup_steps])
+            ),
+            out_of_memory=False,
+        )
+        if cuda_device is not None:
+            result['max_memory_allocated'] = \
+                torch.cuda.max_memory_allocated(cuda_device)
+        print(
+            f'Batch size {batch_size}: '
+            f'{result["examples_per_second"]:.1f} examples/s'
+        )
+        results.append(result)
+    return results
+
+
+def lr_range_test(
+        trainer: 'pt.Trainer',
+        train_iterator,
+        min_lr=1e-7,
+        max_lr=10.,
+        num_steps=100,
+        smoothing=0.98,
+        divergence_factor=4.,
+        device=None,
+):
+    """
+    Learning rate range test (Smith, "Cyclical Learning Rates for Training
+    Neural Networks", 2017): Trains with an exponentially increasing learning
+    rate from `min_lr` to `max_lr` and stops, when the smoothed loss is
+    larger than `divergence_factor` times the minimum.
+
+    The suggested learning rate is the learning rate with the steepest
+    descent of the smoothed loss (w.r.t. the log learning rate) before the
+    minimum of the smoothed loss. When the trainer has multiple optimizers,
+    all use the same learning rate.
+
+    Args:
+        trainer:
+        train_iterator:
+        min_lr: The learning rate of the first step.
+        max_lr: The learning rate of the last step.
+        num_steps: The maximum number of steps.
+        smoothing: The factor of the exponential moving average of the loss.
+        divergence_factor: See above.
+        device: See `Trainer.train`.
+
+    Returns:
+        A dict with the `lrs`, the `losses`, the `smoothed_losses`, the
+        `min_loss_lr` (the learning rate of the minimum of the smoothed loss)
+        and the `suggested_lr`.
+
+    """
+    lrs = np.geomspace(min_lr, max_lr, num_steps)
+    recorder = _StepRecorderHook(
+        num_steps, lrs=lrs, divergence_factor=divergence_factor,
+        smoothing=smoothing,
+    )
+    _trial(trainer, train_iterator, recorder, device)
+
+    smoothed = np.array(recorder.smoothed_losses)
+    lrs = lrs[:len(smoothed)]
+    best = int(np.nanargmin(smoothed))
+    if best < 2:
+        suggested_lr = lrs[best]
+    else:
+        slope = np.gradient(smoothed[:best + 1], np.log(lrs[:best + 1]))
+        suggested_lr = lrs[int(np.argmin(slope))]
+    return dict(
+        lrs=lrs.tolist(),
+        losses=recorder.losses,
+        smoothed_losses=smoothed.tolist(),
+        min_loss_lr=float(lrs[best]),
+        suggested_lr=float(suggested_lr),
+    )
+
+
+def autotune(
+        trainer: 'pt.Trainer',
+        get_train_iterator,
+        storage_dir=None,
+        batch_sizes=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+        batch_size_steps=10,
+        min_lr=1e-7,
+        max_lr=10.,
+        lr_steps=100,
+        device=None,
+):
+    """
+    Runs the `batch_size_sweep`, selects the batch size with the largest
+    throughput and runs the `lr_range_test` with this batch size.
+
+    Args:
+        trainer:
+        get_train_iterator: Callable, that returns the train iterator for a
+            batch size.
+        storage_dir: When given, the report is written to
+            `storage_dir/autotune.json`.
+        batch_sizes: See `batch_size_sweep`. None to skip the sweep, then
+            `get_train_iterator(None)` is used for the `lr_range_test`.
+        batch_size_steps: The `num_steps` of the `batch_size_sweep`.
+        min_lr: See `lr_range_test`.
+        max_lr: See `lr_range_test`.
+        lr_steps: The `num_steps` of the `lr_range_test`.
+        device: See `Trainer.train`.
+
+    Returns:
+        The report, a dict with the results of both searches, the selected
+        `batch_size` and the `config_patch` for the trainer config (i.e. the
+        suggested learning rate of the optimizer).
+
+    """
+    report = {}
+    batch_size = None
+    if batch_sizes is not None:
+        report['batch_size_sweep'] = batch_size_sweep(
+            trainer, get_train_iterator, batch_sizes,
+            num_steps=batch_size_steps, device=device,
+        )
+        fitting = [
+            result for result in report['batch_size_sweep']
+            if not result['out_of_memory']
+        ]
+        if len(fitting) == 0:
+            raise RuntimeError(
+                f'Even the batch size {batch_sizes[0]} does not fit into the '
+                f'memory.'
+            )
+        batch_size = max(
+            fitting, key=lambda result: result['examples_per_second']
+        )['batch_size']
+        report['batch_size'] = batch_size
+
+    report['lr_range_test'] = lr_range_test(
+        trainer, get_train_iterator(batch_size), min_lr=min_lr,
+        max_lr=max_lr, num_steps=lr_steps, device=device,
+    )
+    lr = report['lr_range_test']['suggested_lr']
+    if isinstance(trainer.optimizer, dict):
+        report['config_patch'] = {'optimizer': {
+            key: {'lr': lr} for key in trainer.optimizer.keys()
+        }}
+    else:
+        report['config_patch'] = {'optimizer': {'lr': lr}}
+
+    print(f'Suggested batch size: {batch_size}, suggested lr: {lr:.3g}')
+    if storage_dir is not None:
+        pb.io.dump_json(report, Path(storage_dir) / 'autotune.json')
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Tunes the batch size and the learning rate of a '
+                    'training. See the module docstring of '
+                    'padertorch.train.autotune.'
+    )
+    parser.add_argument(
+        'config', help='The json file with the config of the experiment.')
+    parser.add_argument(
+        'get_train_iterator',
+        help='The import path of a function, that returns the train '
+             'iterator for a batch size, e.g. my_experiment.data.get_train',
+    )
+    parser.add_argument(
+        '--config_key', default='trainer',
+        help='The key of the trainer config in the config file '
+             '(empty for a trainer config).',
+    )
+    parser.add_argument(
+        '--storage_dir', default=None,
+        help='Where the report is written. Defaults to the directory of '
+             'the config.',
+    )
+    parser.add_argument('--batch_sizes', default=None, type=int, nargs='+')
+    parser.add_argument('--min_lr', default=1e-7, type=float)
+    parser.add_argument('--max_lr', default=10., type=float)
+    parser.add_argument('--lr_steps', default=100, type=int)
+    parser.add_argument('--device', default=None)
+    args = parser.parse_args()
+
+    config = pb.io.load_json(args.config)
+    trainer_config = config
+    if args.config_key:
+        for key in args.config_key.split('.'):
+            trainer_config = trainer_config[key]
+    trainer = pt.Trainer.from_config(trainer_config)
+    get_train_iterator = pt.configurable.import_class(args.get_train_iterator)
+
+    device = args.device
+    if device is not None and device != 'cpu':
+        device = int(device)
+    storage_dir = args.storage_dir
+    if storage_dir is None:
+        storage_dir = Path(args.config).parent
+
+    kwargs = {}
+    if args.batch_sizes is not None:
+        kwargs['batch_sizes'] = args.batch_sizes
+    report = autotune(
+        trainer, get_train_iterator, storage_dir=storage_dir,
+        min_lr=args.min_lr, max_lr=args.max_lr, lr_steps=args.lr_steps,
+        device=device, **kwargs,
+    )
+    config_patch = report['config_patch']
+    if args.config_key:
+        for key in reversed(args.config_key.split('.')):
+            config_patch = {key: config_patch}
+    print('Config patch:')
+    print(pb.io.dumps_json(config_patch))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+A cache on the disk for results (e.g. validation summaries or evaluation
+metrics), that depend only on the model state and the data, i.e. that are
+the same, when the same weights are evaluated on the same data again.
+"""
+import hashlib
+import re
+from pathlib import Path
+
+from padertorch.train.checkpoint import torch_load, write_checkpoint
+
+__all__ = [
+    'ResultCache',
+    'iterator_fingerprint',
+]
+
+
+class ResultCache:
+    """
+    Stores each result in a file in `cache_dir`. The file name is the hash of
+    the key, where the key is a tuple of strings, e.g. the digest of the
+    model state (see `padertorch.train.checkpoint.state_dict_digest`) and a
+    fingerprint of the data (see `iterator_fingerprint`).
+
+    The results are written with `torch.save`, i.e. they can contain
+    tensors, arrays and other pickleable objects.
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as tmp_dir:
+    ...     cache = ResultCache(tmp_dir)
+    ...     key = ('model_digest', 'dataset', 'example_1')
+    ...     print(key in cache, cache.get(key))
+    ...     cache[key] = {'sdr': 10.}
+    ...     print(key in cache, cache.get(key))
+    False None
+    True {'sdr': 10.0}
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+
+    def path(self, key):
+        assert isinstance(key, tuple), (type(key), key)
+        assert all([isinstance(k, str) for k in key]), key
+        h = hashlib.blake2b(digest_size=20)
+        for k in key:
+            h.update(k.encode())
+            h.update(b'\0')
+        return self.cache_dir / f'{h.hexdigest()}.pth'
+
+    def __contains__(self, key):
+        return self.path(key).exists()
+
+    def get(self, key, default=None):
+        path = self.path(key)
+        if not path.exists():
+            return default
+        return torch_load(path)
+
+    def __setitem__(self, key, value):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # The result is written to a temporary file and renamed afterwards,
+        # hence concurrent readers (e.g. other MPI processes) never see a
+        # partially written result.
+        write_checkpoint(value, self.path(key))
+
+
+def iterator_fingerprint(iterator):
+    """
+    A fingerprint of an iterator, that does not iterate over the iterator.
+    The fingerprint contains the representation (e.g. for a lazy_dataset
+    the names of the datasets and the names of the mapped functions), the
+    length and the keys of the iterator, when the iterator has them.
+    Memory addresses in the representation (e.g. of a `functools.partial`)
+    are ignored, so the fingerprint is the same in each run.
+
+    Note: The fingerprint does not contain the state of the mapped functions,
+        e.g. the arguments of a function that is used in a `.map`.
+        Use a manual fingerprint, when such a state changes.
+
+    >>> print(iterator_fingerprint([1, 2, 3]))
+    [1, 2, 3]
+    len=3
+    >>> class Dataset:
+    ...     def __repr__(self):
+    ...         return f'Dataset({object.__repr__(self)})'
+    ...     def keys(self):
+    ...         return ('a', 'b')
+    >>> print(iterator_fingerprint(Dataset()))
+    Dataset(<padertorch.train.cache.Dataset object>)
+    keys=('a', 'b')
+    """
+    fingerprint = re.sub(r' at 0x[0-9a-fA-F]+', '', repr(iterator))
+    try:
+        fingerprint += f'\nlen={len(iterator)}'
+    except Exception:
+        pass
+    try:
+        fingerprint += f'\nkeys={tuple(iterator.keys())}'
+    except Exception:
+        pass
+    return fingerprint
@@ -0,0 +1,449 @@
+"""
+Helpers to write and read the checkpoints of the `padertorch.Trainer`.
+"""
+import copy
+import hashlib
+import inspect
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import torch
+
+__all__ = [
+    'snapshot_state_dict',
+    'write_checkpoint',
+    'CheckpointWriter',
+    'read_checkpoint',
+    'torch_load',
+    'TensorBlobStore',
+    'tensor_digest',
+    'state_dict_digest',
+    'tensor_blob_digests',
+    'resolve_tensor_blobs',
+]
+
+
+def _map_tensors(fn, state_dict, leaf_fn=None):
+    """
+    Applies fn to all tensors in the nested state_dict. The containers are
+    copied, everything else is passed to leaf_fn (default: identity).
+    """
+    if torch.is_tensor(state_dict):
+        return fn(state_dict)
+    elif isinstance(state_dict, dict):
+        if _is_tensor_blob_reference(state_dict):
+            return fn(state_dict)
+        new = state_dict.__class__(
+            (k, _map_tensors(fn, v, leaf_fn)) for k, v in state_dict.items()
+        )
+        if hasattr(state_dict, '_metadata'):
+            # torch.nn.Module.state_dict stores version information in the
+            # attribute _metadata.
+            new._metadata = copy.deepcopy(state_dict._metadata)
+        return new
+    elif isinstance(state_dict, (tuple, list)):
+        return state_dict.__class__([
+            _map_tensors(fn, v, leaf_fn) for v in state_dict
+        ])
+    elif leaf_fn is None:
+        return state_dict
+    else:
+        return leaf_fn(state_dict)
+
+
+def snapshot_state_dict(state_dict):
+    """
+    Copies a (nested) state dict, such that the copy is independent of the
+    training, i.e. all tensors are copied to the CPU and the containers are
+    copied. Used to write a checkpoint in the background, while the training
+    continues and changes the parameters inplace.
+
+    >>> t = torch.zeros(2)
+    >>> state_dict = {'model': {'t': t}, 'ranking': [('ckpt_0.pth', 1)]}
+    >>> snapshot = snapshot_state_dict(state_dict)
+    >>> t += 1
+    >>> state_dict['ranking'].append(('ckpt_1.pth', 2))
+    >>> snapshot
+    {'model': {'t': tensor([0., 0.])}, 'ranking': [('ckpt_0.pth', 1)]}
+    """
+    return _map_tensors(
+        lambda t: t.detach().to('cpu', copy=True),
+        state_dict,
+        leaf_fn=copy.deepcopy,
+    )
+
+
+def write_checkpoint(state_dict, checkpoint_path, fsync=False):
+    """
+    Writes the state_dict with `torch.save` to a temporary file and renames it
+    afterwards to checkpoint_path. Hence, checkpoint_path is never a
+    partially written file (e.g. when the training is killed during the
+    write).
+
+    Args:
+        state_dict:
+        checkpoint_path:
+        fsync: If True, wait until the file is written to the disk, before
+            the file is renamed.
+    """
+    checkpoint_path = Path(checkpoint_path)
+    tmp_path = checkpoint_path.with_name(f'.{checkpoint_path.name}.tmp')
+    try:
+        with open(str(tmp_path), 'wb') as fd:
+            torch.save(state_dict, fd)
+            if fsync:
+                fd.flush()
+                os.fsync(fd.fileno())
+        os.replace(str(tmp_path), str(checkpoint_path))
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    if fsync:
+        # Persist the rename.
+        dir_fd = os.open(str(checkpoint_path.parent), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class CheckpointWriter:
+    """
+    Executes the submitted functions (e.g. the write of a checkpoint, the
+    update of symlinks and the deletion of stale checkpoints) in a background
+    thread in the order of the submission.
+
+    An exception in the background thread is raised in the training thread
+    with the next call of `submit`, `wait` or `close`.
+
+    >>> writer = CheckpointWriter()
+    >>> log = []
+    >>> writer.submit(log.append, 'write ckpt_2.pth')
+    >>> writer.submit(log.append, 'delete ckpt_1.pth')
+    >>> writer.wait()
+    >>> log
+    ['write ckpt_2.pth', 'delete ckpt_1.pth']
+    >>> writer.submit(lambda: 1 / 0)
+    >>> writer.close()
+    Traceback (most recent call last):
+    ...
+    ZeroDivisionError: division by zero
+    """
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._futures = []
+
+    def _raise_exceptions(self, wait):
+        futures = self._futures
+        self._futures = []
+        for i, future in enumerate(futures):
+            if wait or future.done():
+                try:
+                    future.result()
+                except BaseException:
+                    self._futures = [
+                        f for f in futures[i + 1:] if not f.done()
+                    ]
+                    raise
+            else:
+                self._futures.append(future)
+
+    def submit(self, fn, *args, **kwargs):
+        self._raise_exceptions(wait=False)
+        self._futures.append(self._executor.submit(fn, *args, **kwargs))
+
+    def wait(self):
+        """Blocks until all submitted functions are finished."""
+        self._raise_exceptions(wait=True)
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown(wait=True)
+
+
+_TORCH_LOAD_SUPPORTS_MMAP = 'mmap' in inspect.signature(torch.load).parameters
+
+
+def torch_load(path, map_location='cpu', mmap=False):
+    """
+    `torch.load` with an optional memory mapping of the file.
+
+    With `mmap=True` the tensors are not read, when the file is loaded.
+    Instead, the pages of the file are read, when a tensor is accessed for
+    the first time (e.g. in `load_state_dict`), i.e. the tensors that are
+    never used (e.g. the optimizer state for an evaluation) are never read.
+    The pages are cached by the operating system and shared between all
+    processes on the same host, that map the same file.
+
+    Memory mapping requires torch >= 2.1. For older versions, the file is
+    read completely and a warning is emitted.
+    """
+    if mmap:
+        if _TORCH_LOAD_SUPPORTS_MMAP:
+            return torch.load(str(path), map_location=map_location, mmap=True)
+        warnings.warn(
+            f'torch {torch.__version__} does not support torch.load(..., '
+            f'mmap=True) (requires torch >= 2.1).\n'
+            f'Fall back to reading {path} completely.'
+        )
+    return torch.load(str(path), map_location=map_location)
+
+
+def read_checkpoint(checkpoint_path, map_location='cpu', mmap=False):
+    """
+    Loads a checkpoint that was written with `write_checkpoint`.
+    When the checkpoint was written with a `TensorBlobStore`
+    (see `Trainer(deduplicate_checkpoints=True)`), the references are
+    replaced with the tensors from the blob directory next to the checkpoint.
+    See `torch_load` for `mmap`.
+    """
+    checkpoint_path = Path(checkpoint_path)
+    state_dict = torch_load(
+        checkpoint_path, map_location=map_location, mmap=mmap
+    )
+    if tensor_blob_digests(state_dict):
+        state_dict = TensorBlobStore(checkpoint_path.parent).resolve(
+            state_dict, map_location=map_location, mmap=mmap
+        )
+    return state_dict
+
+
+_TENSOR_BLOB_KEY = '__tensor_blob__'
+
+
+def _is_tensor_blob_reference(obj):
+    return isinstance(obj, dict) and obj.keys() == {_TENSOR_BLOB_KEY}
+
+
+def tensor_digest(tensor):
+    """
+    Hash of the content of a tensor, i.e. of dtype, shape and data.
+
+    >>> tensor_digest(torch.zeros(2))
+    '3b547aaee6c37e10bbd502f5331cd2fae554b7ce'
+    >>> tensor_digest(torch.zeros(2)) == tensor_digest(torch.zeros(1, 2))
+    False
+    >>> tensor_digest(torch.zeros(2)) == tensor_digest(torch.zeros(2).long())
+    False
+    """
+    tensor = tensor.detach().to('cpu').contiguous()
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f'{tensor.dtype}{tuple(tensor.shape)}'.encode())
+    h.update(tensor.reshape(-1).view(torch.uint8).numpy().tobytes())
+    return h.hexdigest()
+
+
+def state_dict_digest(state_dict):
+    """
+    Hash of the names and the contents of all tensors in a (nested)
+    state_dict, e.g. of `model.state_dict()`. The order of the keys does not
+    matter.
+
+    >>> state_dict = {'weight': torch.zeros(2), 'bias': torch.ones(1)}
+    >>> state_dict_digest(state_dict)
+    'ae45fa0e1e1dc7e1f33c31ed1561fa51565239e1'
+    >>> state_dict_digest(state_dict) == state_dict_digest(
+    ...     {'bias': torch.ones(1), 'weight': torch.zeros(2)})
+    True
+    >>> state_dict_digest(state_dict) == state_dict_digest(
+    ...     {'weight': torch.zeros(2), 'bias': torch.zeros(1)})
+    False
+    """
+    h = hashlib.blake2b(digest_size=20)
+
+    def update(obj):
+        if isinstance(obj, torch.Tensor):
+            h.update(tensor_digest(obj).encode())
+        elif isinstance(obj, dict):
+            h.update(b'{')
+            for k in sorted(obj.keys(), key=repr):
+                h.update(f'{k!r}:'.encode())
+                update(obj[k])
+            h.update(b'}')
+        elif isinstance(obj, (tuple, list)):
+            h.update(b'[')
+            for v in obj:
+                update(v)
+            h.update(b']')
+        else:
+            h.update(repr(obj).encode())
+        h.update(b',')
+
+    update(state_dict)
+    return h.hexdigest()
+
+
+def tensor_blob_digests(state_dict):
+    """
+    Returns the set of blob digests that are referenced in the state_dict.
+
+    >>> tensor_blob_digests({'a': torch.ones(2), 'b': [{'__tensor_blob__': 'ab12'}]})
+    {'ab12'}
+    """
+    digests = set()
+
+    def collect(obj):
+        if _is_tensor_blob_reference(obj):
+            digests.add(obj[_TENSOR_BLOB_KEY])
+        return obj
+
+    _map_tensors(collect, state_dict)
+    return digests
+
+
+def resolve_tensor_blobs(state_dict, load_blob):
+    """
+    Replaces all blob references in state_dict with `load_blob(digest)`.
+    Each blob is loaded only once, i.e. tensors that were shared in the
+    original state_dict (e.g. tied weights) are shared again.
+    """
+    cache = {}
+
+    def resolve(obj):
+        if _is_tensor_blob_reference(obj):
+            digest = obj[_TENSOR_BLOB_KEY]
+            if digest not in cache:
+                cache[digest] = load_blob(digest)
+            return cache[digest]
+        return obj
+
+    return _map_tensors(resolve, state_dict)
+
+
+class TensorBlobStore:
+    """
+    Content-addressed storage of tensors in `<checkpoint_dir>/blobs`.
+
+    `deduplicate` writes each tensor of a state dict as an individual file
+    named after the hash of its content and replaces the tensor with a
+    reference. A tensor that does not change between two checkpoints
+    (e.g. a frozen submodule) is hence written only once and the
+    checkpoint files themselves contain only the references and the small
+    tensors (fewer than `min_bytes` bytes).
+
+    The checkpoints reference the blobs relative to their own directory, so
+    the checkpoint directory can be moved, but a checkpoint cannot be copied
+    without the blobs.
+
+    >>> import tempfile
+    >>> tmp_dir = tempfile.TemporaryDirectory()
+    >>> store = TensorBlobStore(tmp_dir.name, min_bytes=16)
+    >>> frozen, trained = torch.ones(10), torch.zeros(10)
+    >>> write_checkpoint(store.deduplicate({'w': frozen, 'v': trained, 'i': torch.tensor(1)}), Path(tmp_dir.name) / 'ckpt_1.pth')
+    >>> trained += 2
+    >>> write_checkpoint(store.deduplicate({'w': frozen, 'v': trained, 'i': torch.tensor(2)}), Path(tmp_dir.name) / 'ckpt_2.pth')
+    >>> len(list(store.blob_dir.iterdir()))  # frozen is stored once
+    3
+    >>> read_checkpoint(Path(tmp_dir.name) / 'ckpt_2.pth')
+    {'w': tensor([1., 1., 1., 1., 1., 1., 1., 1., 1., 1.]), 'v': tensor([2., 2., 2., 2., 2., 2., 2., 2., 2., 2.]), 'i': tensor(2)}
+    >>> (Path(tmp_dir.name) / 'ckpt_1.pth').unlink()
+    >>> store.collect_garbage()
+    []
+    >>> len(list(store.blob_dir.iterdir()))
+    2
+    >>> tmp_dir.cleanup()
+    """
+    blob_dir_name = 'blobs'
+
+    def __init__(self, checkpoint_dir, min_bytes=1024, fsync=False):
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.min_bytes = min_bytes
+        self.fsync = fsync
+
+    @property
+    def blob_dir(self):
+        return self.checkpoint_dir / self.blob_dir_name
+
+    def blob_path(self, digest):
+        return self.blob_dir / f'{digest}.pth'
+
+    def add(self, tensor):
+        """
+        Writes the tensor to the blob directory, if no blob with the same
+        content exists, and returns the reference to the blob.
+        """
+        tensor = tensor.detach()
+        digest = tensor_digest(tensor)
+        blob_path = self.blob_path(digest)
+        if not blob_path.exists():
+            self.blob_dir.mkdir(exist_ok=True)
+            # clone: torch.save writes the whole storage of a view.
+            write_checkpoint(
+                tensor.to('cpu').clone(), blob_path, fsync=self.fsync
+            )
+        return {_TENSOR_BLOB_KEY: digest}
+
+    def get(self, digest, map_location='cpu', mmap=False):
+        return torch_load(
+            self.blob_path(digest), map_location=map_location, mmap=mmap
+        )
+
+    def _should_deduplicate(self, tensor):
+        return (
+            tensor.layout == torch.strided
+            and not tensor.is_quantized
+            and tensor.numel() * tensor.element_size() >= self.min_bytes
+        )
+
+    def deduplicate(self, state_dict):
+        """
+        Returns a copy of the state_dict, where the tensors are replaced by
+        references to blobs.
+        """
+        return _map_tensors(
+            lambda t: self.add(t) if self._should_deduplicate(t) else t,
+            state_dict,
+        )
+
+    def resolve(self, state_dict, map_location='cpu', mmap=False):
+        """
+        Inverse of `deduplicate`.
+        """
+        return resolve_tensor_blobs(
+            state_dict,
+            lambda digest: self.get(
+                digest, map_location=map_location, mmap=mmap
+            ),
+        )
+
+    def collect_garbage(self):
+        """
+        Deletes all blobs that are not referenced by any checkpoint
+        (`*.pth` file, symlinks are ignored) in the checkpoint directory.
+
+        Must not be called during the write of a checkpoint, because the blobs
+        of that checkpoint are written before the checkpoint file.
+
+        Returns:
+            The checkpoints that could not be read. Their blobs are kept.
+        """
+        if not self.blob_dir.exists():
+            return []
+        referenced = set()
+        unreadable = []
+        for checkpoint_path in self.checkpoint_dir.glob('*.pth'):
+            if checkpoint_path.is_symlink():
+                continue
+            try:
+                state_dict = torch.load(
+                    str(checkpoint_path), map_location='cpu'
+                )
+            except Exception:
+                unreadable.append(checkpoint_path)
+                continue
+            referenced |= tensor_blob_digests(state_dict)
+
+        if unreadable:
+            # Do not delete blobs, that may be referenced by an unreadable
+            # checkpoint.
+            return unreadable
+
+        for blob_path in self.blob_dir.glob('*.pth'):
+            if blob_path.name[:-len('.pth')] not in referenced:
+                blob_path.unlink()
+        return unreadable
@@ -8,16 +8,25 @@ E.g., adding a learning rate schedule without adding further conditions to the
 trainer.
 
 """
+import contextlib
+import copy
+import multiprocessing
 import types
 from collections import defaultdict
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from enum import IntEnum
 from pathlib import Path
 
+import lazy_dataset
 import numpy as np
 import padertorch as pt
 import torch
 from distutils.version import LooseVersion
 from natsort import natsorted
+from padertorch.summary.streaming import (
+    ReservoirSample, StreamingHistogram, StreamingMean
+)
 from padertorch.train.trigger import IntervalTrigger, EndTrigger
 from tqdm import tqdm
 
@@ -35,6 +44,9 @@ __all__ = [
     'LossWeightAnnealingHook',
     'ModelAttributeAnnealingHook',
     'LRAnnealingHook',
+    'TorchProfilerHook',
+    'WeightAveragingHook',
+    'DataStatisticsHook',
 ]
 
 
@@ -102,7 +114,9 @@ class Hook:
         Args:
             trainer:
             example:
-            model_output:
+            model_output: The output of the model. When the trainer split
+                the batch (`Trainer(split_batch_on_oom=True)`), the list
+                of the outputs of the parts.
             review:
 
         Returns:
@@ -112,6 +126,21 @@ class Hook:
     def close(self, trainer: 'pt.Trainer'):
         pass
 
+    @contextlib.contextmanager
+    def validation_context(self, trainer: 'pt.Trainer'):
+        """
+        Returns a context manager, that the ValidationHook enters for the
+        validation of the model, e.g. to replace the weights of the model
+        with averaged weights (see `WeightAveragingHook`).
+
+        Args:
+            trainer:
+
+        Returns:
+            A context manager.
+        """
+        yield
+
     def set_last(self, iteration, epoch):
         pass
 
@@ -144,14 +173,40 @@ class SummaryHook(TriggeredHook):
     the checkpoints.
 
     To save results of the validation refer to ValidationHook.
+
+    With `accumulate_on_device=True`, the tensors of the review for
+    `loss`, `losses` and `scalars` are not transferred to the host in each
+    step. Instead, their sum and count are accumulated on the device and the
+    `histograms` are accumulated in a reservoir sample of
+    `max_histogram_size` values on the device. They are transferred once in
+    `finalize_summary` (see `transfer_accumulators`), which avoids a device
+    synchronization per step. Note: A scalar is then represented by a
+    `StreamingMean` (see `streaming_statistics`), i.e. `modify_summary` can
+    compute the mean, the sum and the variance of a scalar, but not e.g.
+    the median.
+
+    With `streaming_statistics=True`, the memory of the summary does not grow
+    with the number of steps. A scalar is a `StreamingMean` (mean and
+    variance, `np.mean`, `np.sum`, `np.var` and `np.std` work in
+    `modify_summary`) and a histogram a `StreamingHistogram` with the
+    default bins of tensorboard, so the tfevents file shows the same
+    histogram as with all values.
+    Otherwise, a histogram is a `ReservoirSample`, i.e. a uniform random
+    sample of at most `max_histogram_size` values.
     """
 
     def __init__(
             self,
             trigger,
             summary_prefix='training',
+            accumulate_on_device=False,
+            max_histogram_size=1000000,
+            streaming_statistics=False,
     ):
         super().__init__(trigger)
+        self.accumulate_on_device = accumulate_on_device
+        self.streaming_statistics = streaming_statistics
+        self.max_histogram_size = max_histogram_size
         self.reset_summary()
         self.summary_prefix = summary_prefix
 
@@ -179,6 +234,48 @@ class SummaryHook(TriggeredHook):
     def reset_summary(self):
         # Todo: add figures
         self.summary = self.empty_summary_dict()
+        # key -> [sum, sum of squares, count] and
+        # key -> [reservoir, count] or dict of the binned histogram.
+        self._scalar_accumulators = {}
+        self._histogram_accumulators = {}
+
+    @classmethod
+    def merge_summaries(cls, summaries):
+        """
+        Merges summaries that are not finalized (e.g. the summaries of
+        multiple processes). The values of the lists (scalars, histograms and
+        buffers) are concatenated in the order of `summaries`, so the mean
+        of a scalar is the mean over all values. For the snapshots (audios,
+        images, ...) the value of the first summary that contains the key is
+        used.
+
+        >>> s1 = {'scalars': {'loss': [1, 2]}, 'images': {'a': 1}}
+        >>> s2 = {'scalars': {'loss': [3]}, 'images': {'a': 2, 'b': 3}}
+        >>> summary = SummaryHook.merge_summaries([s1, s2])
+        >>> dict(summary['scalars']), summary['images']
+        ({'loss': [1, 2, 3]}, {'a': 1, 'b': 3})
+        """
+        merged = cls.empty_summary_dict()
+        for summary in summaries:
+            for key, values in summary.items():
+                if key in ['scalars', 'histograms']:
+                    for k, v in values.items():
+                        if isinstance(v, (
+                                StreamingMean, StreamingHistogram,
+                                ReservoirSample
+                        )):
+                            if k in merged[key]:
+                                v = merged[key][k].merge(v)
+                            merged[key][k] = v
+                        else:
+                            merged[key][k].extend(v)
+                elif key == 'buffers':
+                    for k, v in values.items():
+                        merged[key].setdefault(k, []).extend(v)
+                else:
+                    for k, v in values.items():
+                        merged[key].setdefault(k, v)
+        return merged
 
     def update_summary(self, review):
         allowed_keys = {
@@ -198,17 +295,23 @@ class SummaryHook(TriggeredHook):
 
         popped_review = {**review}  # copy for "pop"
 
-        # note item is the pytorch function to get the value of a tensor
-        self.summary['scalars']['loss'].append(popped_review.pop('loss').item())
-        for key, loss in popped_review.pop('losses', dict()).items():
-            self.summary['scalars'][key].append(loss.item())
-        for key, scalars in popped_review.pop('scalars', dict()).items():
-            self.summary['scalars'][key].extend(self._to_list(scalars))
-        for key, histogram in popped_review.pop('histograms', dict()).items():
-            self.summary['histograms'][key].extend(self._to_list(histogram))
-            # do not hold more than 1M values in memory
-            self.summary['histograms'][key] = \
-                self.summary['histograms'][key][-1000000:]
+        if self.accumulate_on_device:
+            self._accumulate_scalar('loss', popped_review.pop('loss'))
+            for key, loss in popped_review.pop('losses', dict()).items():
+                self._accumulate_scalar(key, loss)
+            for key, scalars in popped_review.pop('scalars', dict()).items():
+                self._accumulate_scalar(key, scalars)
+            for key, histogram in popped_review.pop('histograms', dict()).items():
+                self._accumulate_histogram(key, histogram)
+        else:
+            # note item is the pytorch function to get the value of a tensor
+            self._add_scalars('loss', popped_review.pop('loss').item())
+            for key, loss in popped_review.pop('losses', dict()).items():
+                self._add_scalars(key, loss.item())
+            for key, scalars in popped_review.pop('scalars', dict()).items():
+                self._add_scalars(key, scalars)
+            for key, histogram in popped_review.pop('histograms', dict()).items():
+                self._add_histogram(key, histogram)
         for key, buffer in popped_review.pop('buffers', dict()).items():
             self.summary['buffers'][key].extend(self._detach(buffer))
         for key, snapshot in popped_review.pop('snapshots', dict()).items():
@@ -225,6 +328,167 @@ class SummaryHook(TriggeredHook):
 
         assert len(popped_review) == 0, (popped_review, review)
 
+    def _add_scalars(self, key, values):
+        if self.streaming_statistics:
+            if key not in self.summary['scalars']:
+                self.summary['scalars'][key] = StreamingMean()
+            self.summary['scalars'][key].update(values)
+        else:
+            self.summary['scalars'][key].extend(self._to_list(values))
+
+    def _add_histogram(self, key, values):
+        if self.streaming_statistics:
+            if key not in self.summary['histograms']:
+                self.summary['histograms'][key] = StreamingHistogram()
+            self.summary['histograms'][key].update(values)
+        else:
+            if key not in self.summary['histograms']:
+                self.summary['histograms'][key] = ReservoirSample(
+                    self.max_histogram_size)
+            self.summary['histograms'][key].update(values)
+
+    def _accumulate_scalar(self, key, value):
+        if not torch.is_tensor(value):
+            self._add_scalars(key, value)
+            return
+        value = value.detach()
+        total = value.sum(dtype=torch.float64)
+        total_squares = (value.to(torch.float64) ** 2).sum()
+        if key in self._scalar_accumulators:
+            accumulator = self._scalar_accumulators[key]
+            accumulator[0] += total
+            accumulator[1] += total_squares
+            accumulator[2] += value.numel()
+        else:
+            self._scalar_accumulators[key] = [
+                total, total_squares, value.numel()
+            ]
+
+    def _accumulate_histogram(self, key, values):
+        if not torch.is_tensor(values):
+            self._add_histogram(key, values)
+            return
+        if self.streaming_statistics:
+            self._accumulate_binned_histogram(key, values)
+            return
+        # Reservoir sampling (Algorithm R) on the device: The first
+        # `max_histogram_size` values fill the reservoir, the i-th value
+        # replaces a random entry with the probability
+        # max_histogram_size / i. Rejected values are written to an
+        # additional last entry, so the update is a single scatter without
+        # a synchronization.
+        values = values.detach().reshape(-1).float()
+        size = self.max_histogram_size
+        if key not in self._histogram_accumulators:
+            self._histogram_accumulators[key] = [
+                values.new_zeros(size + 1), 0
+            ]
+        reservoir, count = self._histogram_accumulators[key]
+        index = torch.arange(
+            count, count + values.numel(), device=values.device
+        )
+        if count + values.numel() > size:
+            random_index = (
+                torch.rand(values.numel(), device=values.device, dtype=torch.float64)
+                * (index + 1)
+            ).long()
+            index = torch.where(
+                index < size, index, random_index.clamp(max=size)
+            )
+        reservoir.scatter_(0, index, values)
+        self._histogram_accumulators[key][1] = count + values.numel()
+
+    def _accumulate_binned_histogram(self, key, values):
+        """
+        Device version of `StreamingHistogram.update`. The values outside of
+        the bins are counted in an additional last bin, that is dropped in
+        `transfer_accumulators`.
+        """
+        values = values.detach().reshape(-1).to(torch.float64)
+        if values.numel() == 0:
+            return
+        # Like StreamingHistogram.update, the non finite values are ignored.
+        # They are counted in the last bin and masked for the statistics,
+        # because a selection would synchronize the device.
+        finite = torch.isfinite(values)
+        if key not in self._histogram_accumulators:
+            bins = torch.tensor(
+                StreamingHistogram().bins, dtype=torch.float64,
+                device=values.device,
+            )
+            self._histogram_accumulators[key] = dict(
+                bins=bins,
+                counts=torch.zeros(
+                    len(bins), dtype=torch.int64, device=values.device),
+                min=values.new_tensor(np.inf),
+                max=values.new_tensor(-np.inf),
+                num=torch.zeros((), dtype=torch.int64, device=values.device),
+                sum=values.new_zeros(()),
+                sum_squares=values.new_zeros(()),
+            )
+        accumulator = self._histogram_accumulators[key]
+        bins = accumulator['bins']
+        num_bins = len(bins) - 1
+        # np.histogram: bin i is [bins[i], bins[i+1]), the last bin includes
+        # the right edge.
+        index = torch.bucketize(values, bins, right=True) - 1
+        index = torch.where(values == bins[-1], index.new_tensor(num_bins - 1), index)
+        index = torch.where(
+            (index < 0) | (index >= num_bins) | ~finite,
+            index.new_tensor(num_bins), index
+        )
+        accumulator['counts'].scatter_add_(0, index, torch.ones_like(index))
+        accumulator['min'] = torch.minimum(
+            accumulator['min'],
+            torch.where(finite, values, values.new_tensor(np.inf)).min())
+        accumulator['max'] = torch.maximum(
+            accumulator['max'],
+            torch.where(finite, values, values.new_tensor(-np.inf)).max())
+        accumulator['num'] += finite.sum()
+        values = torch.where(finite, values, values.new_zeros(()))
+        accumulator['sum'] += values.sum()
+        accumulator['sum_squares'] += values.dot(values)
+
+    def transfer_accumulators(self):
+        """
+        Moves the values that are accumulated on the device (see
+        `accumulate_on_device`) to `self.summary`.
+        """
+        for key, (total, total_squares, count) in self._scalar_accumulators.items():
+            stats = StreamingMean.from_sums(
+                count, total.item(), total_squares.item())
+            if key in self.summary['scalars']:
+                previous = self.summary['scalars'][key]
+                if not isinstance(previous, StreamingMean):
+                    # The values of the steps with non tensor values.
+                    previous = StreamingMean()
+                    previous.update(self.summary['scalars'][key])
+                stats = previous.merge(stats)
+            self.summary['scalars'][key] = stats
+        for key, accumulator in self._histogram_accumulators.items():
+            if self.streaming_statistics:
+                histogram = StreamingHistogram(accumulator['bins'].cpu().numpy())
+                histogram.counts = accumulator['counts'][:-1].cpu().numpy()
+                histogram.min = accumulator['min'].item()
+                histogram.max = accumulator['max'].item()
+                histogram.num = accumulator['num'].item()
+                histogram.sum = accumulator['sum'].item()
+                histogram.sum_squares = accumulator['sum_squares'].item()
+                if key in self.summary['histograms']:
+                    histogram = self.summary['histograms'][key].merge(histogram)
+                self.summary['histograms'][key] = histogram
+            else:
+                reservoir, count = accumulator
+                sample = ReservoirSample.from_sample(
+                    reservoir[:min(count, self.max_histogram_size)],
+                    count, self.max_histogram_size,
+                )
+                if key in self.summary['histograms']:
+                    sample = self.summary['histograms'][key].merge(sample)
+                self.summary['histograms'][key] = sample
+        self._scalar_accumulators = {}
+        self._histogram_accumulators = {}
+
     @staticmethod
     def _to_list(scalars):
         if torch.is_tensor(scalars):
@@ -309,9 +573,24 @@ class SummaryHook(TriggeredHook):
                 self.summary['scalars'][f'lr/param_group_{i}'] = param_group['lr']
         return self.summary
 
+    def check_finite_loss(self, trainer):
+        """
+        Raises an AssertionError, when a loss since the last summary was not
+        finite (inf or NaN). The mean of the accumulated losses is not
+        finite, when a single loss is not finite, hence the trainer does
+        not need to synchronize the device in each step for this check.
+        """
+        if 'loss' in self.summary['scalars']:
+            assert np.isfinite(np.mean(self.summary['scalars']['loss'])), (
+                f'A loss before iteration {trainer.iteration} was not finite '
+                f'(inf or NaN).'
+            )
+
     def finalize_summary(self, trainer):
         assert len(self.summary['timings']) == 0, self.summary['timings']
 
+        self.transfer_accumulators()
+        self.check_finite_loss(trainer)
         for key, timing in self.compute_timings(trainer.train_timer).items():
             self.summary['timings'][key] = timing
         self.maybe_add_lr_to_summary(trainer)
@@ -346,13 +625,26 @@ class SummaryHook(TriggeredHook):
 
         for key, scalar in self.summary['scalars'].items():
             tag = check_tag(f'{prefix}/{key}')
+            if isinstance(scalar, StreamingMean):
+                scalar = scalar.mean()
             trainer.writer.add_scalar(tag, scalar, iteration)
         for key, scalar in self.summary['timings'].items():
             tag = check_tag(f'{time_prefix}/{key}')
             trainer.writer.add_scalar(tag, scalar.mean(), iteration)
         for key, histogram in self.summary['histograms'].items():
             tag = check_tag(f'{prefix}/{key}')
-            trainer.writer.add_histogram(tag, np.array(histogram), iteration)
+            if isinstance(histogram, StreamingHistogram):
+                if len(histogram) > 0:
+                    trainer.writer.add_histogram_raw(
+                        tag, global_step=iteration,
+                        **histogram.as_histogram_raw(),
+                    )
+            else:
+                histogram = np.asarray(histogram)
+                # e.g. the grad_norm of a step, that the GradScaler skipped.
+                histogram = histogram[np.isfinite(histogram)]
+                if histogram.size > 0:
+                    trainer.writer.add_histogram(tag, histogram, iteration)
         for key, audio in self.summary['audios'].items():
             tag = check_tag(f'{prefix}/{key}')
             if isinstance(audio, (tuple, list)):
@@ -438,7 +730,10 @@ class ValidationHook(SummaryHook):
 
     def __init__(
             self, trigger, iterator, metric='loss', maximize=False,
-            max_checkpoints=1, early_stopping_patience=None
+            max_checkpoints=1, early_stopping_patience=None,
+            accumulate_on_device=False, streaming_statistics=False,
+            asynchronous=False, validation_device=None, num_workers=0,
+            cache=False, cache_fingerprint=None,
     ):
         """
 
@@ -453,8 +748,56 @@ class ValidationHook(SummaryHook):
                 When max_checkpoints is None, keep all checkpoints.
             early_stopping_patience: the number of allowed degradations before
                 stopping training. Should be larger than back_off_patience.
+            accumulate_on_device: See SummaryHook.
+            streaming_statistics: See SummaryHook.
+            asynchronous: If True, the validation runs in a background
+                thread on a copy of the model, while the training continues.
+                The result is used (summary, ranking of the checkpoints,
+                best symlink, deletion of stale checkpoints, early stopping
+                and back off) in the first `pre_step` after the validation
+                finished, at the latest at the next trigger or in `close`.
+                Note: A validation that is still running, when the training
+                    crashes, is not part of the ranking, i.e. its
+                    checkpoint is not deleted after a resume.
+                Note: On the same GPU, the validation competes with the
+                    training. Use `validation_device` for an idle device.
+            validation_device: The device of the model copy for the
+                asynchronous validation. Defaults to the training device.
+            num_workers: If larger than 0, the iterator is split into
+                `num_workers` shards (every `num_workers`-th example), that
+                are validated in parallel by forked worker processes on the
+                CPU. The summaries of the workers are merged in the order of
+                the shards (see `SummaryHook.merge_summaries`), hence the
+                result does not depend on the timing of the workers.
+                The workers share the CPU threads of the training process
+                and validate without mixed precision.
+                The iterator has to be indexable (e.g. a list or an
+                indexable lazy_dataset), so that each worker loads only its
+                shard, i.e. pass the dataset before `.prefetch(...)`: The
+                workers replace the prefetching.
+                Requires the `fork` start method, i.e. the iterator does not
+                need to be pickleable. A fork while other threads hold a lock
+                can deadlock the workers, hence the trainer options that
+                start background threads (`prefetch_to_device`,
+                `background_summary_writer` and `async_checkpoint`) are not
+                supported together with `num_workers`.
+            cache: If True or a directory, the validation summaries are
+                stored in that directory (True: `storage_dir/validation_cache`)
+                with the hash of the model state and `cache_fingerprint` as
+                key. A validation of the same weights on the same data
+                loads the summary from the cache, e.g. when a training is
+                restarted with the same seed or when multiple trainings
+                share a cache directory and the same initialization.
+            cache_fingerprint: A string that identifies the validation data.
+                Defaults to `pt.train.cache.iterator_fingerprint(iterator)`,
+                which does not detect changes of the mapped functions (e.g.
+                a different feature extraction).
         """
-        super().__init__(trigger, summary_prefix='validation')
+        super().__init__(
+            trigger, summary_prefix='validation',
+            accumulate_on_device=accumulate_on_device,
+            streaming_statistics=streaming_statistics,
+        )
         self.iterator = iterator
         self.metric = metric
         self.maximize = maximize
@@ -463,6 +806,33 @@ class ValidationHook(SummaryHook):
         self.ckpt_ranking = []
         self.n_degradations = 0
         self.last_validation = -1
+        self._stale_checkpoints = []
+        self.asynchronous = asynchronous
+        self.validation_device = validation_device
+        if asynchronous and num_workers > 0:
+            raise ValueError(
+                'The asynchronous validation does not support worker '
+                'processes, because the workers would be forked from a '
+                'background thread.'
+            )
+        if num_workers > 0 and not (
+                iterator.indexable
+                if isinstance(iterator, lazy_dataset.Dataset)
+                else isinstance(iterator, Sequence)
+        ):
+            raise ValueError(
+                f'The validation workers need an indexable iterator (e.g. a '
+                f'list or an indexable lazy_dataset), so that each worker '
+                f'loads only its shard. Use the dataset before the '
+                f'operations that are not indexable (e.g. .prefetch(...)), '
+                f'the workers replace the prefetching.\nGot: {iterator!r}'
+            )
+        self.num_workers = num_workers
+        self.cache = cache
+        self.cache_fingerprint = cache_fingerprint
+        self._validation_trainer = None
+        self._executor = None
+        self._pending_validation = None
 
     @property
     def priority(self):
@@ -487,14 +857,28 @@ class ValidationHook(SummaryHook):
         # This function replaces `trainer.train_timer` with
         # `trainer.validate_timer` from the super function.
         assert len(self.summary['timings']) == 0, self.summary['timings']
+        self.transfer_accumulators()
+        self.check_finite_loss(trainer)
         for key, timing in self.compute_timings(trainer.validate_timer).items():
             self.summary['timings'][key] = timing
         self.maybe_add_lr_to_summary(trainer)
         self.summary = trainer.model.modify_summary(self.summary)
 
     def pre_step(self, trainer: 'pt.Trainer'):
+        if self._pending_validation is not None \
+                and self._pending_validation[0].done():
+            self._finish_async_validation(trainer)
         if self.trigger(iteration=trainer.iteration, epoch=trainer.epoch):
-            self.run_validation(trainer)
+            if self.asynchronous:
+                iteration = trainer.iteration
+                # Wait for the previous validation.
+                self._finish_async_validation(trainer)
+                if trainer.iteration == iteration:
+                    # Else the BackOffValidationHook loaded the best
+                    # checkpoint, that is already validated.
+                    self._start_async_validation(trainer)
+            else:
+                self.run_validation(trainer)
             self.last_validation = trainer.iteration
         if (
             self.early_stopping_patience is not None
@@ -505,16 +889,81 @@ class ValidationHook(SummaryHook):
             raise StopTraining
 
     def run_validation(self, trainer: 'pt.Trainer'):
-        ckpt_dir = trainer.checkpoint_dir
         ckpt_path: Path = trainer.default_checkpoint_path()
         # note that ckpt_path does not exist at this moment but will be written
         # after validation such that the state of this hook, which will be
         # saved in the checkpoint, includes the latest validation result.
         # post_step asserts that checkpoint is written and sets symlink to the
         # current best checkpoint.
+        with self._validation_context(trainer):
+            self._collect_summary(trainer)
+        self._finish_validation(trainer, ckpt_path.name)
+
+    @contextlib.contextmanager
+    def _validation_context(self, trainer: 'pt.Trainer'):
+        """
+        Enters the `Hook.validation_context` of all hooks of the trainer.
+        """
+        with contextlib.ExitStack() as stack:
+            for hook in trainer.hooks:
+                stack.enter_context(hook.validation_context(trainer))
+            yield
+
+    def _collect_summary(self, trainer: 'pt.Trainer'):
         assert all([len(value) == 0 for value in self.summary.values()]), self.summary
         assert len(trainer.validate_timer.timings) == 0, trainer.validate_timer
+        cache_key = None
+        if self.cache:
+            cache_key = self._cache_key(trainer)
+            summary = self._get_cache(trainer).get(cache_key)
+            if summary is not None:
+                print('Loaded the validation summary from the cache')
+                self.summary = self.merge_summaries([summary])
+                return
         print('Starting Validation')
+        if self.num_workers > 0:
+            self._collect_summary_in_workers(trainer)
+        else:
+            self._collect_summary_in_process(trainer)
+        if cache_key is not None:
+            self._get_cache(trainer)[cache_key] = {
+                k: dict(v) for k, v in self.summary.items()
+            }
+
+    def _get_cache(self, trainer: 'pt.Trainer'):
+        if self.cache is True:
+            return pt.train.cache.ResultCache(
+                trainer.storage_dir / 'validation_cache')
+        return pt.train.cache.ResultCache(self.cache)
+
+    def _cache_key(self, trainer: 'pt.Trainer'):
+        """
+        The validation summary depends on the model state, the validation
+        data and the settings, that change the review or the format of the
+        summary.
+        """
+        if self.cache_fingerprint is None:
+            self.cache_fingerprint = pt.train.cache.iterator_fingerprint(
+                self.iterator)
+        settings = dict(
+            loss_weights=trainer.loss_weights,
+            # The workers validate without mixed precision.
+            mixed_precision=(
+                trainer.mixed_precision if self.num_workers == 0 else None),
+            accumulate_on_device=self.accumulate_on_device,
+            streaming_statistics=self.streaming_statistics,
+            max_histogram_size=self.max_histogram_size,
+            # Each process of a DistributedTrainer validates a shard.
+            rank=getattr(trainer, 'rank', 0),
+            world_size=getattr(trainer, 'world_size', 1),
+        )
+        return (
+            pt.train.checkpoint.state_dict_digest(trainer.model.state_dict()),
+            self.cache_fingerprint,
+            repr(settings),
+        )
+
+    def _collect_summary_in_process(self, trainer: 'pt.Trainer'):
         at_least_one_value = False
         for model_out, review in trainer.validate(self.iterator):
             at_least_one_value = True
@@ -523,15 +972,86 @@ class ValidationHook(SummaryHook):
             raise Exception(
                 f'Got an empty validation iterator: {self.iterator}'
             )
-        self.finalize_summary(trainer)
+        self.transfer_accumulators()
+
+    def _collect_summary_in_workers(self, trainer: 'pt.Trainer'):
+        global _validation_worker_state
+
+        threaded_options = [
+            name for name in [
+                'prefetch_to_device', 'background_summary_writer',
+                'async_checkpoint',
+            ]
+            if getattr(trainer, name, None)
+        ]
+        if threaded_options:
+            raise ValueError(
+                f'The validation workers are forked from the training '
+                f'process, which can deadlock when other threads are '
+                f'running. Disable the trainer options {threaded_options}, '
+                f'that start background threads, or use num_workers=0.'
+            )
+
+        worker_trainer = copy.copy(trainer)
+        if trainer.device not in [None, 'cpu']:
+            worker_trainer.model = copy.deepcopy(trainer.model).to('cpu')
+        worker_trainer.device = 'cpu'
+        worker_trainer.mixed_precision = None
+        worker_trainer.validate_timer = pt.train.trainer.ContextTimerDict()
+        worker_trainer._non_validation_start_time = None
+        worker_trainer.writer = None
+
+        ctx = multiprocessing.get_context('fork')
+        _validation_worker_state = (
+            self, worker_trainer,
+            max(1, torch.get_num_threads() // self.num_workers),
+        )
+        try:
+            with trainer._time_validation(), \
+                    ctx.Pool(self.num_workers) as pool:
+                results = pool.map(
+                    _validate_shard, range(self.num_workers), chunksize=1)
+        finally:
+            _validation_worker_state = None
+
+        summaries = [summary for summary, _ in results if summary is not None]
+        if len(summaries) == 0:
+            raise Exception(
+                f'Got an empty validation iterator: {self.iterator}'
+            )
+        self.summary = self.merge_summaries(summaries)
+        for _, timings in results:
+            for key, values in timings.items():
+                if key not in ['validation_time', 'non_validation_time']:
+                    trainer.validate_timer.timings[key].extend(values)
+
+    def _finish_validation(
+            self, trainer: 'pt.Trainer', ckpt_name, validation_trainer=None
+    ):
+        """
+        Writes the summary of the validation of the checkpoint `ckpt_name`
+        and updates the ranking of the checkpoints.
+
+        Args:
+            trainer: The trainer of the training.
+            ckpt_name: The name of the validated checkpoint.
+            validation_trainer: The trainer that did the validation, when
+                the validation was asynchronous (see
+                `_get_validation_trainer`).
+        """
+        if validation_trainer is None:
+            validation_trainer = trainer
+        self.summary = trainer.reduce_summary(self.summary)
+        self.finalize_summary(validation_trainer)
         score = self.summary['scalars'][self.metric]
-        self.dump_summary(trainer)
-        assert len(trainer.validate_timer.timings) == 0, trainer.validate_timer
+        self.dump_summary(validation_trainer)
+        assert len(validation_trainer.validate_timer.timings) == 0, \
+            validation_trainer.validate_timer
         print(f'Finished Validation. Mean {self.metric}: {score}')
 
         # Only save the relative checkpoint path, so the folder can be
         # moved.
-        self.ckpt_ranking.append((ckpt_path.name, score))
+        self.ckpt_ranking.append((ckpt_name, score))
         # Sort the ckpt_ranking according to the score. The first entry
         # will then be the best checkpoint. When two scores are identical
         # the older checkpoint wins.
@@ -543,49 +1063,182 @@ class ValidationHook(SummaryHook):
             for i in range(
                 len(self.ckpt_ranking) - 1, self.max_checkpoints - 1, -1
             ):
-                ckpt_name = self.ckpt_ranking[i][0]
-                if ckpt_name == ckpt_path.name:
+                stale_ckpt_name = self.ckpt_ranking[i][0]
+                if stale_ckpt_name == ckpt_name:
                     continue
-                ckpt = ckpt_dir / ckpt_name
-                if ckpt.exists():  # may not exist anymore after backoff
-                    ckpt.unlink()
+                # The stale checkpoints are deleted, after the current
+                # checkpoint is written (see _update_checkpoint_dir).
+                self._stale_checkpoints.append(stale_ckpt_name)
                 self.ckpt_ranking.pop(i)
-        if self.ckpt_ranking[0][0] != ckpt_path.name:
+        if self.ckpt_ranking[0][0] != ckpt_name:
             self.n_degradations += 1
         else:
             self.n_degradations = 0
 
+    def _get_validation_trainer(self, trainer: 'pt.Trainer'):
+        """
+        Returns a shallow copy of the trainer with a copy of the model, that
+        can validate in a background thread, while the trainer continues
+        the training. The copy is reused for the next validation.
+        """
+        device = (
+            trainer.device if self.validation_device is None
+            else self.validation_device
+        )
+        validation_trainer = self._validation_trainer
+        if validation_trainer is None or validation_trainer.device != device:
+            validation_trainer = copy.copy(trainer)
+            model = copy.deepcopy(trainer.model)
+            for parameter in model.parameters():
+                parameter.grad = None
+            model.requires_grad_(False)
+            if device is not None:
+                model.to(device)
+            validation_trainer.model = model
+            validation_trainer.device = device
+            validation_trainer.validate_timer = \
+                pt.train.trainer.ContextTimerDict()
+            self._validation_trainer = validation_trainer
+        else:
+            validation_trainer.model.load_state_dict(
+                trainer.model.state_dict())
+        validation_trainer.iteration = trainer.iteration
+        validation_trainer.epoch = trainer.epoch
+        return validation_trainer
+
+    def _start_async_validation(self, trainer: 'pt.Trainer'):
+        if isinstance(trainer, pt.train.trainer.DistributedTrainer):
+            raise NotImplementedError(
+                'The asynchronous validation does not support the '
+                'DistributedTrainer, because the summaries of all processes '
+                'have to be merged at the same time.'
+            )
+        assert self._pending_validation is None, self._pending_validation
+        # The model copy gets the weights of the validation context.
+        with self._validation_context(trainer):
+            validation_trainer = self._get_validation_trainer(trainer)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending_validation = (
+            self._executor.submit(self._collect_summary, validation_trainer),
+            validation_trainer,
+            trainer.default_checkpoint_path().name,
+        )
+
+    def _finish_async_validation(self, trainer: 'pt.Trainer'):
+        """
+        Waits for the asynchronous validation and uses the result.
+        """
+        if self._pending_validation is None:
+            return
+        future, validation_trainer, ckpt_name = self._pending_validation
+        self._pending_validation = None
+        future.result()
+        validation_trainer.writer = trainer.writer
+        self._finish_validation(
+            trainer, ckpt_name, validation_trainer=validation_trainer)
+        # The checkpoint ckpt_name is written, when the validation is
+        # finished.
+        self._update_checkpoint_dir(trainer)
+
     def post_step(self, trainer: 'pt.Trainer', example, model_out, review):
         if trainer.iteration == self.last_validation:
             # As CheckpointHook.pre_step is called after ValidationHook.pre_step
             # (which is necessary to save ValidationHook state),
             # a symlink to the latest checkpoint can not be set during ValidationHook.pre_step
-            ckpt_dir = trainer.checkpoint_dir
-            ckpt_path: Path = trainer.default_checkpoint_path()
-            if not ckpt_path.exists():
-                raise RuntimeError(
-                    'Before each validation the CheckpointHook has to write '
-                    f'a checkpoint.\n'
-                    f'Could not find {ckpt_path}.\n'
-                    f'Found only:\n'
-                    f'{[str(file) for file in ckpt_dir.iterdir()]}'
-                )
-            self.set_best_symlink(ckpt_dir)
+            self._update_checkpoint_dir(
+                trainer, latest_ckpt_path=trainer.default_checkpoint_path()
+            )
+
+    def _update_checkpoint_dir(self, trainer: 'pt.Trainer',
+                               latest_ckpt_path=None):
+        """
+        Sets the symlink to the best checkpoint and deletes the stale
+        checkpoints, after all checkpoints are written
+        (see `Trainer.after_checkpoint_write`).
+        """
+        stale_checkpoints = self._stale_checkpoints
+        self._stale_checkpoints = []
+        if trainer.is_master:
+            trainer.after_checkpoint_write(
+                self._update_checkpoint_files,
+                trainer.checkpoint_dir,
+                # The ranking is empty, while the first asynchronous
+                # validation is running.
+                self.ckpt_ranking[0][0] if self.ckpt_ranking else None,
+                stale_checkpoints,
+                latest_ckpt_path,
+            )
 
-    def set_best_symlink(self, ckpt_dir):
+    def _update_checkpoint_files(
+            self, ckpt_dir, best_ckpt_name, stale_checkpoints,
+            latest_ckpt_path=None,
+    ):
+        if latest_ckpt_path is not None and not latest_ckpt_path.exists():
+            raise RuntimeError(
+                'Before each validation the CheckpointHook has to write '
+                f'a checkpoint.\n'
+                f'Could not find {latest_ckpt_path}.\n'
+                f'Found only:\n'
+                f'{[str(file) for file in ckpt_dir.iterdir()]}'
+            )
+        if best_ckpt_name is not None:
+            self.set_best_symlink(ckpt_dir, best_ckpt_name)
+        for ckpt_name in stale_checkpoints:
+            ckpt = ckpt_dir / ckpt_name
+            if ckpt.exists():  # may not exist anymore after backoff
+                ckpt.unlink()
+        if stale_checkpoints:
+            # Delete the tensors that were only used by the stale
+            # checkpoints (Trainer(deduplicate_checkpoints=True)).
+            pt.train.checkpoint.TensorBlobStore(ckpt_dir).collect_garbage()
+
+    def set_best_symlink(self, ckpt_dir, best_ckpt_name=None):
+        if best_ckpt_name is None:
+            best_ckpt_name = self.ckpt_ranking[0][0]
         best_ckpt_path = ckpt_dir / self._best_ckpt_name
         if best_ckpt_path.is_symlink():
             best_ckpt_path.unlink()
-        best_ckpt_path.symlink_to(self.ckpt_ranking[0][0])
+        best_ckpt_path.symlink_to(best_ckpt_name)
 
     def close(self, trainer: 'pt.Trainer'):
-        self.set_best_symlink(trainer.checkpoint_dir)
+        try:
+            self._finish_async_validation(trainer)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        self._update_checkpoint_dir(trainer)
         ckpt_name = trainer.default_checkpoint_path().name
         if ckpt_name not in [ckpt[0] for ckpt in self.ckpt_ranking]:
             # add to ranking to make sure it is deleted after resume
             self.ckpt_ranking.append((ckpt_name, -np.inf if self.maximize else np.inf))
 
 
+# The ValidationHook and the trainer for the worker processes of
+# ValidationHook(num_workers=...). The workers are forked, hence they inherit
+# this variable and nothing has to be pickled. The iterator of the hook is
+# indexable (see ValidationHook.__init__), i.e. each worker loads only its
+# shard and no prefetch threads are inherited.
+_validation_worker_state = None
+
+
+def _validate_shard(index):
+    hook, trainer, num_threads = _validation_worker_state
+    torch.set_num_threads(num_threads)
+    hook.reset_summary()
+    at_least_one_value = False
+    for model_out, review in trainer.validate(pt.train.trainer._shard_iterator(
+            hook.iterator, index, hook.num_workers)):
+        at_least_one_value = True
+        hook.update_summary(review)
+    hook.transfer_accumulators()
+    summary = None
+    if at_least_one_value:
+        summary = {k: dict(v) for k, v in hook.summary.items()}
+    return summary, dict(trainer.validate_timer.timings)
+
+
 class BackOffValidationHook(ValidationHook):
     """ Performs model validation and deletes stale checkpoints
     (checkpoints that are not among the max_checkpoints best checkpoints).
@@ -601,7 +1254,10 @@ class BackOffValidationHook(ValidationHook):
     def __init__(
             self, trigger, iterator, metric='loss', maximize=False,
             max_checkpoints=1, early_stopping_patience=None, n_back_off=0,
-            lr_update_factor=1 / 10, back_off_patience=None
+            lr_update_factor=1 / 10, back_off_patience=None,
+            accumulate_on_device=False, streaming_statistics=False,
+            asynchronous=False, validation_device=None, num_workers=0,
+            cache=False, cache_fingerprint=None,
     ):
         """
 
@@ -622,11 +1278,25 @@ class BackOffValidationHook(ValidationHook):
                 of back off. Should be smaller than 1.
             back_off_patience: the number of allowed degradations before
                 backing off
+            accumulate_on_device: See SummaryHook.
+            streaming_statistics: See SummaryHook.
+            asynchronous: See ValidationHook.
+            validation_device: See ValidationHook.
+            num_workers: See ValidationHook.
+            cache: See ValidationHook.
+            cache_fingerprint: See ValidationHook.
         """
         super().__init__(
             trigger, iterator,
             metric=metric, maximize=maximize, max_checkpoints=max_checkpoints,
-            early_stopping_patience=early_stopping_patience
+            early_stopping_patience=early_stopping_patience,
+            accumulate_on_device=accumulate_on_device,
+            streaming_statistics=streaming_statistics,
+            asynchronous=asynchronous,
+            validation_device=validation_device,
+            num_workers=num_workers,
+            cache=cache,
+            cache_fingerprint=cache_fingerprint,
         )
 
         self.remaining_back_offs = n_back_off
@@ -652,8 +1322,11 @@ class BackOffValidationHook(ValidationHook):
         assert state_dict['remaining_back_offs'] <= self.remaining_back_offs, (state_dict['remaining_back_offs'], self.remaining_back_offs)
         self.remaining_back_offs = state_dict['remaining_back_offs']
 
-    def run_validation(self, trainer: 'pt.Trainer'):
-        super().run_validation(trainer)
+    def _finish_validation(
+            self, trainer: 'pt.Trainer', ckpt_name, validation_trainer=None
+    ):
+        super()._finish_validation(
+            trainer, ckpt_name, validation_trainer=validation_trainer)
         if (
             self.remaining_back_offs > 0
             and self.n_degradations > self.back_off_patience
@@ -664,20 +1337,31 @@ class BackOffValidationHook(ValidationHook):
         best_ckpt = self.ckpt_ranking[0][0]
         print(f'Back off to {best_ckpt}.')
 
+        trainer.wait_for_checkpoint_writes()
         ckpt_dir = trainer.checkpoint_dir
-        latest_symlink_path = (ckpt_dir / f'ckpt_latest.pth').absolute()
-        if latest_symlink_path.is_symlink():  # CB: Change to assert?
-            latest_symlink_path.unlink()
-        latest_symlink_path.symlink_to(best_ckpt)
+        if trainer.is_master:
+            latest_symlink_path = (ckpt_dir / f'ckpt_latest.pth').absolute()
+            if latest_symlink_path.is_symlink():  # CB: Change to assert?
+                latest_symlink_path.unlink()
+            latest_symlink_path.symlink_to(best_ckpt)
 
         best_iter = int(best_ckpt[len('ckpt_'): -len('.pth')])
-        for j in range(1, len(self.ckpt_ranking)):
-            ckpt = self.ckpt_ranking[-j][0]
-            if int(ckpt[len('ckpt_'): -len('.pth')]) > best_iter:
+        # latest checkpoint does not exist because it is written after
+        # validation
+        latest_ckpt = trainer.default_checkpoint_path().name
+
+        def is_removed(ckpt):
+            return int(ckpt[len('ckpt_'): -len('.pth')]) > best_iter \
+                and ckpt != latest_ckpt
+
+        if trainer.is_master:
+            for ckpt, _ in self.ckpt_ranking:
                 ckpt_path = ckpt_dir / ckpt
-                if ckpt_path.exists():  # latest checkpoint does not exist because it is written after validation
+                if is_removed(ckpt) and ckpt_path.exists():
                     ckpt_path.unlink()
-                    self.ckpt_ranking.pop(-j)
+        self.ckpt_ranking = [
+            entry for entry in self.ckpt_ranking if not is_removed(entry[0])
+        ]
 
         remaining_back_offs = self.remaining_back_offs
         trainer.load_checkpoint()
@@ -695,6 +1379,260 @@ class BackOffValidationHook(ValidationHook):
             update_lr(optimizer)
 
 
+class WeightAveragingHook(TriggeredHook):
+    """
+    Maintains an average of the model weights, i.e. of the parameters and
+    the floating point buffers (e.g. the running statistics of a BatchNorm):
+     - `decay=None`: Stochastic weight averaging (SWA), i.e. the mean of the
+       weights at all triggers after `start_iteration`.
+     - `decay=0.999`: An exponential moving average (EMA), i.e.
+       `average = decay * average + (1 - decay) * weights`.
+
+    The averages are stored in flat buffers (one per device and dtype), that
+    are allocated once and updated in-place with multi-tensor
+    (`torch._foreach_*`) operations. With `device='cpu'`, the buffers are in
+    the host memory and the weights are copied with one transfer per buffer.
+
+    The ValidationHook validates the averaged weights, when
+    `validate_averaged` is True (see `Hook.validation_context`). The best
+    checkpoint symlink still points to the trainer checkpoint, i.e. to the
+    weights of the training.
+
+    The averaged weights are not part of the trainer checkpoint. They are
+    written to `checkpoint_dir/filename` at each `checkpoint_trigger` (use
+    the checkpoint_trigger of the trainer) and at the end of the training.
+    The file contains the averaged `model` state dict, i.e. it can be loaded
+    with `pt.Model.from_storage_dir(..., checkpoint_name=filename)`.
+    When the training is resumed from a checkpoint, that does not belong to
+    this file (e.g. after a back off), the averaging restarts.
+
+    >>> model = torch.nn.Linear(2, 1, bias=False)
+    >>> class Trainer:  # Minimal replacement of pt.Trainer
+    ...     iteration, epoch, model, hooks = 0, 0, model, []
+    ...     virtual_minibatch_size = 1
+    >>> trainer = Trainer()
+    >>> hook = WeightAveragingHook(decay=None)
+    >>> for value in [1., 2., 6.]:
+    ...     _ = model.weight.data.fill_(value)
+    ...     hook.post_step(trainer, None, None, None)
+    ...     trainer.iteration += 1
+    >>> with hook.validation_context(trainer):
+    ...     print(model.weight)
+    Parameter containing:
+    tensor([[3., 3.]], requires_grad=True)
+    >>> model.weight
+    Parameter containing:
+    tensor([[6., 6.]], requires_grad=True)
+    """
+    def __init__(
+            self,
+            decay=None,
+            trigger=(1, 'iteration'),
+            start_iteration=0,
+            device=None,
+            validate_averaged=True,
+            checkpoint_trigger=(1, 'epoch'),
+            filename='ckpt_averaged.pth',
+    ):
+        """
+
+        Args:
+            decay: The decay of the EMA. None for SWA.
+            trigger: tuple or Trigger. When the average is updated (after the
+                optimizer step), e.g. (1, 'iteration') for an EMA or
+                (1, 'epoch') for SWA. With a `virtual_minibatch_size` of the
+                trainer, a trigger in an iteration without an optimizer step
+                updates the average after the next optimizer step.
+            start_iteration: The first iteration, that is averaged.
+            device: The device of the averaged weights. None for the device
+                of the weights, 'cpu' to save device memory.
+            validate_averaged: If True, the ValidationHook validates the
+                averaged weights.
+            checkpoint_trigger: tuple or Trigger. When the averaged weights
+                are written to `checkpoint_dir/filename`.
+            filename: The file name of the averaged weights.
+        """
+        super().__init__(trigger)
+        assert decay is None or 0 <= decay < 1, decay
+        self.decay = decay
+        self.start_iteration = start_iteration
+        self.device = device
+        self.validate_averaged = validate_averaged
+        self.checkpoint_trigger = IntervalTrigger.new(checkpoint_trigger)
+        self.filename = filename
+        self.count = 0
+        # The iteration of the averaged weights in the last written file.
+        self.iteration = None
+        self._groups = None
+        # The trigger fired, but the optimizer didn't update the weights yet.
+        self._update_pending = False
+
+    def state_dict(self):
+        return {
+            'count': self.count,
+            'iteration': self.iteration,
+        }
+
+    def load_state_dict(self, state_dict):
+        self.count = state_dict['count']
+        self.iteration = state_dict['iteration']
+        # The averaged weights are loaded from the file in `_get_groups`.
+        self._groups = None
+
+    def set_last(self, iteration, epoch):
+        super().set_last(iteration, epoch)
+        self.checkpoint_trigger.set_last(iteration, epoch)
+
+    @staticmethod
+    def _averaged_tensors(trainer: 'pt.Trainer'):
+        # The tensors are collected in each call, because `model.to` replaces
+        # the buffers.
+        return {
+            name: tensor.detach()
+            for name, tensor in trainer.model.state_dict(keep_vars=True).items()
+            if tensor.is_floating_point()
+        }
+
+    def _get_groups(self, trainer: 'pt.Trainer'):
+        """
+        Returns a list of `(names, buffer, views)`, where `buffer` is the
+        flat buffer for the tensors `names` of the model with the same device
+        and dtype and `views` are the views of the tensors in the buffer.
+        """
+        if self._groups is not None:
+            return self._groups
+
+        tensors = self._averaged_tensors(trainer)
+        names = defaultdict(list)
+        for name, tensor in tensors.items():
+            names[(tensor.device, tensor.dtype)].append(name)
+        self._groups = []
+        for (device, dtype), group_names in names.items():
+            buffer = torch.zeros(
+                sum([tensors[name].numel() for name in group_names]),
+                device=device if self.device is None else self.device,
+                dtype=dtype,
+            )
+            views = list(torch.split(
+                buffer, [tensors[name].numel() for name in group_names]))
+            views = [
+                view.view_as(tensors[name])
+                for view, name in zip(views, group_names)
+            ]
+            self._groups.append((group_names, buffer, views))
+
+        if self.count > 0:
+            self._load_averaged_weights(trainer)
+        return self._groups
+
+    def _load_averaged_weights(self, trainer: 'pt.Trainer'):
+        """
+        Loads the averaged weights of a resumed training from the file.
+        """
+        path = trainer.checkpoint_dir / self.filename
+        state_dict = None
+        if path.exists():
+            state_dict = pt.train.checkpoint.torch_load(path)
+        if state_dict is None or state_dict['iteration'] != self.iteration:
+            print(
+                f'Could not find the averaged weights of iteration '
+                f'{self.iteration} in {path}. Restart the weight averaging.'
+            )
+            self.count = 0
+            return
+        for names, _, views in self._groups:
+            for name, view in zip(names, views):
+                view.copy_(state_dict['model'][name])
+
+    def post_step(self, trainer: 'pt.Trainer', example, model_output,
+                  review):
+        if trainer.iteration < self.start_iteration:
+            return
+        if self.trigger(iteration=trainer.iteration, epoch=trainer.epoch):
+            self._update_pending = True
+        # Same condition as the `optimize` argument of `trainer.train_step`
+        optimizer_step = (
+            (trainer.iteration + 1) % trainer.virtual_minibatch_size == 0
+        )
+        if not self._update_pending or not optimizer_step:
+            return
+        self._update_pending = False
+        # SWA is an EMA with the decay count / (count + 1). The first update
+        # copies the weights (decay 0).
+        if self.count == 0:
+            decay = 0.
+        elif self.decay is None:
+            decay = self.count / (self.count + 1)
+        else:
+            decay = self.decay
+        tensors = self._averaged_tensors(trainer)
+        with torch.no_grad():
+            for names, buffer, views in self._get_groups(trainer):
+                group = [tensors[name] for name in names]
+                if group[0].device == buffer.device:
+                    torch._foreach_mul_(views, decay)
+                    torch._foreach_add_(views, group, alpha=1 - decay)
+                else:
+                    flat = torch.cat([t.reshape(-1) for t in group])
+                    buffer.mul_(decay).add_(
+                        flat.to(buffer.device), alpha=1 - decay)
+        self.count += 1
+
+    def averaged_state_dict(self, trainer: 'pt.Trainer'):
+        """
+        Returns a copy of the state dict of the model (on the CPU), where the
+        floating point tensors are replaced by the averaged tensors.
+        """
+        state_dict = trainer.model.state_dict()
+        for names, _, views in self._get_groups(trainer):
+            for name, view in zip(names, views):
+                state_dict[name] = view
+        return pt.train.checkpoint.snapshot_state_dict(state_dict)
+
+    @contextlib.contextmanager
+    def validation_context(self, trainer: 'pt.Trainer'):
+        if not self.validate_averaged or self.count == 0:
+            yield
+            return
+        tensors = self._averaged_tensors(trainer)
+        backup = {name: tensor.clone() for name, tensor in tensors.items()}
+        try:
+            for names, _, views in self._get_groups(trainer):
+                for name, view in zip(names, views):
+                    tensors[name].copy_(view)
+            yield
+        finally:
+            for name, tensor in tensors.items():
+                tensor.copy_(backup[name])
+
+    def _write(self, trainer: 'pt.Trainer'):
+        if self.count == 0:
+            return
+        self.iteration = trainer.iteration
+        if trainer.is_master:
+            state_dict = {
+                'model': self.averaged_state_dict(trainer),
+                'iteration': trainer.iteration,
+                'count': self.count,
+            }
+            path = trainer.checkpoint_dir / self.filename
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # After the trainer checkpoints, so the file is written in the
+            # background with `Trainer(async_checkpoint=True)`.
+            trainer.after_checkpoint_write(
+                pt.train.checkpoint.write_checkpoint, state_dict, path)
+
+    def pre_step(self, trainer: 'pt.Trainer'):
+        # The priority is higher than the priority of the CheckpointHook,
+        # i.e. the file belongs to the checkpoint of this iteration.
+        if self.checkpoint_trigger(
+                iteration=trainer.iteration, epoch=trainer.epoch):
+            self._write(trainer)
+
+    def close(self, trainer: 'pt.Trainer'):
+        self._write(trainer)
+
+
 class LRSchedulerHook(TriggeredHook):
     """
     A hook that applies a learning rate scheduler from `torch.optim.lr_scheduler`
@@ -800,6 +1738,98 @@ class ProgressBarHook(TriggeredHook):
         self.pbar.close()
 
 
+class TorchProfilerHook(Hook):
+    """
+    Records `num_steps` iterations of the training, starting with the
+    iteration `start_iteration`, with `torch.profiler` and writes a chrome
+    trace to `<storage_dir>/profiler_trace_<start_iteration>.json`
+    (open it with chrome://tracing or https://ui.perfetto.dev).
+
+    Usage:
+        trainer.register_hook(TorchProfilerHook(start_iteration=100))
+
+    Use `Trainer(detailed_timings=True)` to get the time of each hook in the
+    tensorboard.
+    """
+    def __init__(
+            self,
+            start_iteration=10,
+            num_steps=5,
+            record_shapes=False,
+            profile_memory=False,
+            with_stack=False,
+    ):
+        assert num_steps > 0, num_steps
+        self.start_iteration = start_iteration
+        self.num_steps = num_steps
+        self.record_shapes = record_shapes
+        self.profile_memory = profile_memory
+        self.with_stack = with_stack
+        self._profiler = None
+
+    def pre_step(self, trainer: 'pt.Trainer'):
+        if self._profiler is None and trainer.iteration == self.start_iteration:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self._profiler = torch.profiler.profile(
+                activities=activities,
+                record_shapes=self.record_shapes,
+                profile_memory=self.profile_memory,
+                with_stack=self.with_stack,
+            )
+            self._profiler.start()
+
+    def post_step(self, trainer: 'pt.Trainer', example, model_output,
+                  review):
+        if self._profiler is not None and trainer.iteration >= (
+                self.start_iteration + self.num_steps - 1):
+            self._stop(trainer)
+
+    def _stop(self, trainer: 'pt.Trainer'):
+        profiler, self._profiler = self._profiler, None
+        profiler.stop()
+        if trainer.is_master:
+            trace_path = (
+                trainer.storage_dir
+                / f'profiler_trace_{self.start_iteration}.json'
+            )
+            profiler.export_chrome_trace(str(trace_path))
+            print(f'Wrote profiler trace to {trace_path}')
+
+    def close(self, trainer: 'pt.Trainer'):
+        if self._profiler is not None:
+            self._stop(trainer)
+
+
+class DataStatisticsHook(TriggeredHook):
+    """
+    Writes the statistics of the training data (e.g. the padding rate of a
+    `padertorch.data.BucketBatchSampler`) to the summary.
+
+    Examples:
+        >>> ds = pt.data.bucket_batch(ds, max_total_size=16000 * 60)  # doctest: +SKIP
+        >>> trainer.register_hook(DataStatisticsHook(ds.sampler))  # doctest: +SKIP
+    """
+    def __init__(self, source, trigger=(1, 'epoch'), prefix='training_data'):
+        """
+        Args:
+            source: An object with a `statistics` method, that returns a
+                dict of scalars.
+            trigger: When to write the statistics.
+            prefix: The prefix of the tags in the summary.
+        """
+        super().__init__(trigger)
+        self.source = source
+        self.prefix = prefix
+
+    def pre_step(self, trainer: 'pt.Trainer'):
+        if self.trigger(iteration=trainer.iteration, epoch=trainer.epoch):
+            for key, value in self.source.statistics().items():
+                trainer.writer.add_scalar(
+                    f'{self.prefix}/{key}', value, trainer.iteration)
+
+
 class StopTrainingHook(TriggeredHook):
     """ Raises a StopTraining exception if triggered. """
     def __init__(self, trigger):
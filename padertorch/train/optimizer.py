@@ -1,17 +1,65 @@
+import collections
+import inspect
+
 import torch
 from torch import optim
 
 
+# `foreach` (multi-tensor kernels) is supported since torch 2.0
+_CLIP_GRAD_NORM_HAS_FOREACH = 'foreach' in inspect.signature(
+    torch.nn.utils.clip_grad_norm_).parameters
+
+
+def _clip_grad_norm(parameters, max_norm, foreach=False):
+    """
+    `torch.nn.utils.clip_grad_norm_`, that uses the multi-tensor kernels
+    with `foreach`, when the torch version supports them.
+
+    >>> p = torch.nn.Parameter(torch.zeros(3, 4))
+    >>> p.grad = torch.ones(3, 4)
+    >>> _clip_grad_norm([p], 1., foreach=True)
+    tensor(3.4641)
+    >>> torch.norm(p.grad)
+    tensor(1.0000)
+    """
+    if foreach and _CLIP_GRAD_NORM_HAS_FOREACH:
+        return torch.nn.utils.clip_grad_norm_(
+            parameters, max_norm, foreach=True)
+    return torch.nn.utils.clip_grad_norm_(parameters, max_norm)
+
+
 class Optimizer:
+    """
+    Args:
+        gradient_clipping: The maximum norm of the gradients.
+        contiguous_grads: If True, the gradients of all parameters with the
+            same device and dtype are views of one contiguous buffer, i.e.
+            the zero_grad is one kernel per buffer and the gradient
+            clipping uses multi-tensor kernels (`foreach`, if the torch
+            version supports it). The buffer is allocated in the first call of
+            `zero_grad` or `clip_grad` and reallocated, when a gradient is
+            replaced (e.g. by `model.to(device)`).
+            Note: Parameters, that do not get a gradient in a step, have a
+                zero gradient instead of None, hence an optimizer with a state
+                (e.g. Adam) updates them. Use it only, when all parameters
+                are used in each step.
+        **kwargs: The kwargs for the `optimizer_cls`. When `foreach` is True,
+            the gradient clipping uses multi-tensor kernels, if the torch
+            version supports them
+            (`torch.nn.utils.clip_grad_norm_(..., foreach=True)`).
+    """
     optimizer_cls = None
     optimizer = None
     parameters = None
 
     def __init__(
-            self, gradient_clipping, **kwargs
+            self, gradient_clipping, contiguous_grads=False, **kwargs
     ):
         self.gradient_clipping = gradient_clipping
+        self.contiguous_grads = contiguous_grads
         self.optimizer_kwargs = kwargs
+        self._grad_buffers = None
+        self._grad_views = None
 
     def set_parameters(self, parameters):
         self.parameters = tuple(parameters)
@@ -24,21 +72,80 @@ class Optimizer:
             'The optimizer is not initialized, call set_parameter before' \
             ' using any of the optimizer functions'
 
+    def _get_grad_buffers(self):
+        """
+        Returns the contiguous gradient buffers (see `contiguous_grads`) and
+        (re)allocates them, when the gradient of a parameter is not a view
+        of the buffer, e.g. in the first step or after `model.to(device)`.
+        The existing gradients are copied to the new buffers.
+        """
+        # `model.to(...)` replaces the `.data` of the gradients, hence the
+        # data_ptr is checked additionally to the identity.
+        if self._grad_views is None or any([
+                p.grad is not view or view.data_ptr() != data_ptr
+                for p, view, data_ptr in self._grad_views
+        ]):
+            groups = collections.defaultdict(list)
+            for p in self.parameters:
+                if p.requires_grad:
+                    groups[(p.device, p.dtype)].append(p)
+            self._grad_buffers = []
+            self._grad_views = []
+            for (device, dtype), parameters in groups.items():
+                buffer = torch.zeros(
+                    sum([p.numel() for p in parameters]),
+                    device=device, dtype=dtype,
+                )
+                offset = 0
+                for p in parameters:
+                    view = buffer[offset:offset + p.numel()].view_as(p)
+                    if p.grad is not None:
+                        view.copy_(p.grad)
+                    p.grad = view
+                    self._grad_views.append((p, view, view.data_ptr()))
+                    offset += p.numel()
+                self._grad_buffers.append(buffer)
+        return self._grad_buffers
+
     def zero_grad(self):
         self.check_if_set()
+        if self.contiguous_grads:
+            for buffer in self._get_grad_buffers():
+                buffer.zero_()
+            return
         return self.optimizer.zero_grad()
 
-    def step(self):
+    def step(self, grad_scaler=None):
+        """
+        Args:
+            grad_scaler: Optional `torch.cuda.amp.GradScaler`. When given,
+                the step is done with the grad_scaler, i.e. the step is
+                skipped, when the gradients contain infs or NaNs.
+        """
         self.check_if_set()
+        if grad_scaler is not None:
+            return grad_scaler.step(self.optimizer)
         return self.optimizer.step()
 
-    def clip_grad(self):
+    def clip_grad(self, grad_scaler=None):
+        """
+        Args:
+            grad_scaler: Optional `torch.cuda.amp.GradScaler`. When given,
+                the gradients are unscaled before they are clipped.
+        """
         self.check_if_set()
+        if grad_scaler is not None:
+            grad_scaler.unscale_(self.optimizer)
         # Todo: report clipped and unclipped
         # Todo: allow clip=None but still report grad_norm
         grad_clips = self.gradient_clipping
-        return torch.nn.utils.clip_grad_norm_(
-            self.parameters, grad_clips
+        if self.contiguous_grads:
+            # Allocates the buffers, when the gradients were replaced
+            self._get_grad_buffers()
+        return _clip_grad_norm(
+            self.parameters, grad_clips,
+            foreach=(self.contiguous_grads
+                     or self.optimizer_kwargs.get('foreach', False)),
         )
 
     def to(self, device):
@@ -69,6 +176,17 @@ class Optimizer:
 
 
 class Adam(Optimizer):
+    """
+    Args:
+        foreach: If True, the step uses the multi-tensor (foreach)
+            implementation of `torch.optim.Adam` and the gradient clipping
+            uses multi-tensor kernels. None is the torch default.
+        fused: If True, the step uses the fused implementation of
+            `torch.optim.Adam` (only CUDA parameters).
+        contiguous_grads: See `Optimizer`.
+
+    For the other arguments see `torch.optim.Adam`.
+    """
     optimizer_cls = optim.Adam
 
     def __init__(
@@ -78,19 +196,40 @@ class Adam(Optimizer):
             betas=(0.9, 0.999),
             eps=1e-8,
             weight_decay=0,
-            amsgrad=False
+            amsgrad=False,
+            foreach=None,
+            fused=False,
+            contiguous_grads=False,
     ):
+        # foreach and fused are only forwarded, when they are used, so the
+        # defaults work with torch versions, that do not support them.
+        kwargs = {}
+        if foreach is not None:
+            kwargs['foreach'] = foreach
+        if fused:
+            kwargs['fused'] = fused
         super().__init__(
             gradient_clipping,
+            contiguous_grads=contiguous_grads,
             lr=lr,
             betas=betas,
             eps=eps,
             weight_decay=weight_decay,
-            amsgrad=amsgrad
+            amsgrad=amsgrad,
+            **kwargs
         )
 
 
 class SGD(Optimizer):
+    """
+    Args:
+        foreach: If True, the step uses the multi-tensor (foreach)
+            implementation of `torch.optim.SGD` and the gradient clipping
+            uses multi-tensor kernels. None is the torch default.
+        contiguous_grads: See `Optimizer`.
+
+    For the other arguments see `torch.optim.SGD`.
+    """
     optimizer_cls = optim.SGD
 
     def __init__(
@@ -100,13 +239,20 @@ class SGD(Optimizer):
             momentum=0,
             dampening=0,
             weight_decay=0,
-            nesterov=False
+            nesterov=False,
+            foreach=None,
+            contiguous_grads=False,
     ):
+        kwargs = {}
+        if foreach is not None:
+            kwargs['foreach'] = foreach
         super().__init__(
             gradient_clipping,
+            contiguous_grads=contiguous_grads,
             lr=lr,
             momentum=momentum,
             dampening=dampening,
             weight_decay=weight_decay,
-            nesterov=nesterov
+            nesterov=nesterov,
+            **kwargs
         )
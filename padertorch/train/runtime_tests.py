@@ -72,6 +72,19 @@ def nested_test_assert_allclose(struct1, struct2, rtol=1e-5, atol=1e-5):
     )
 
 
+@contextlib.contextmanager
+def backup_state_dict(trainer: 'pt.Trainer'):
+    """
+    Restores the state of the trainer (model, optimizer, iteration, epoch
+    and hooks) at the end of the context, e.g. after a test training.
+    """
+    state_dict = copy.deepcopy(trainer.state_dict())
+    try:
+        yield
+    finally:
+        trainer.load_state_dict(state_dict)
+
+
 def test_run(
         trainer: 'pt.Trainer',
         train_iterator,
@@ -92,15 +105,6 @@ def test_run(
     """
     print('Start test run')
 
-    @contextlib.contextmanager
-    def backup_state_dict(trainer: pt.Trainer):
-        state_dict = copy.deepcopy(trainer.state_dict())
-        try:
-            yield
-        finally:
-            # pass
-            trainer.load_state_dict(state_dict)
-
     with contextlib.ExitStack() as exit_stack:
         storage_dir = Path(
             exit_stack.enter_context(tempfile.TemporaryDirectory())
@@ -11,6 +11,7 @@ from pathlib import Path
 import functools
 import collections
 
+import lazy_dataset
 import numpy as np
 import torch
 import torch.nn
@@ -21,11 +22,17 @@ from paderbox.utils.nested import deflatten
 import padertorch as pt
 from padertorch.configurable import Configurable
 from padertorch.train.optimizer import Optimizer, Adam
+from padertorch.train.checkpoint import (
+    CheckpointWriter, TensorBlobStore, read_checkpoint, snapshot_state_dict,
+    write_checkpoint,
+)
+from padertorch.summary.background_writer import BackgroundSummaryWriter
 from padertorch.train.runtime_tests import test_run
 from padertorch.train.hooks import *
 
 __all__ = [
     'Trainer',
+    'DistributedTrainer',
     'InteractiveTrainer',
 ]
 
@@ -47,6 +54,15 @@ class Trainer(Configurable):
             checkpoint_trigger=(1, 'epoch'),
             stop_trigger=(1, 'epoch'),
             virtual_minibatch_size=1,
+            prefetch_to_device=0,
+            mixed_precision=None,
+            async_checkpoint=False,
+            deduplicate_checkpoints=False,
+            accumulate_summary_on_device=False,
+            streaming_summary_statistics=False,
+            background_summary_writer=False,
+            detailed_timings=False,
+            split_batch_on_oom=False,
     ):
         """
 
@@ -85,6 +101,87 @@ class Trainer(Configurable):
                 Note: The gradients are accumulated and not averaged.
                 Note: The virtual_minibatch_size is fixed and can contain data
                     from two epochs.
+            prefetch_to_device: Number of examples that are moved to the
+                device in a background thread, while the current example is
+                processed (see `padertorch.data.DevicePrefetcher`). This
+                applies to the train iterator and to the validation
+                iterator. By default (0), the examples are moved to the
+                device in `Trainer.step`.
+                Note: The time_per_data_loading includes then the waiting for
+                    the background thread and the time_per_to_device is
+                    close to zero.
+            mixed_precision: None, 'float16' or 'bfloat16'. If not None,
+                forward and review run in `torch.autocast` with the given
+                dtype. Note, that 'float16' is only supported on GPUs,
+                while 'bfloat16' is supported on the CPU and on recent GPUs.
+                For 'float16' the loss is scaled with a
+                `torch.cuda.amp.GradScaler` (dynamic loss scaling). The
+                gradients are unscaled before gradient clipping and an
+                optimizer step is skipped, when the gradients contain infs or
+                NaNs (reported as `optimizer_step_skipped` in the summary).
+            async_checkpoint: If True, `save_checkpoint` copies the state
+                dict to the CPU and writes the checkpoint in a background
+                thread, while the training continues. The update of the
+                symlinks and the deletion of stale checkpoints are done
+                after the write (see `Trainer.after_checkpoint_write`).
+                The summary reports the stall of the training
+                (time_per_checkpoint_snapshot) and the time of the
+                background write (time_per_checkpoint_write).
+            deduplicate_checkpoints: If True, the tensors of a checkpoint are
+                stored content-addressed in `checkpoints/blobs` (see
+                `padertorch.train.checkpoint.TensorBlobStore`) and the
+                checkpoint file contains only references to them. Tensors
+                that do not change between checkpoints (e.g. frozen
+                parameters) are hence stored only once. Blobs that are no
+                longer referenced are deleted, when the ValidationHook
+                deletes stale checkpoints. Use `Trainer.load_checkpoint`,
+                `Module.from_config_and_checkpoint` or
+                `padertorch.train.checkpoint.read_checkpoint` to load such a
+                checkpoint.
+            accumulate_summary_on_device: If True, the SummaryHook and the
+                ValidationHook accumulate the loss, scalars and histograms
+                of the review on the device and transfer them once per
+                summary instead of in each step (see
+                `padertorch.train.hooks.SummaryHook`).
+            streaming_summary_statistics: If True, the SummaryHook and the
+                ValidationHook keep streaming statistics (mean and variance
+                for scalars, histograms with fixed bins) instead of all
+                values, so the memory does not grow with the summary
+                interval (see `padertorch.train.hooks.SummaryHook`).
+            background_summary_writer: If True, the summaries are written
+                to the tfevents file by a background thread (see
+                `padertorch.summary.background_writer.BackgroundSummaryWriter`),
+                i.e. the encoding of images, audios, figures and histograms
+                does not block the training. The queue is flushed, when
+                `train` returns.
+            detailed_timings: If True, the train_timer measures
+                additionally the time of each `pre_step` and `post_step`
+                call of each hook (reported as
+                `training_timings/hooks/<hook.uid>/pre_step` and
+                `.../post_step`) and the time of the gradient clipping
+                (time_per_clip_grad), the optimizer step
+                (time_per_optimizer_step) and the zero_grad
+                (time_per_zero_grad), which are part of the
+                time_per_backward. See `TorchProfilerHook` for a trace of
+                some steps.
+            split_batch_on_oom: If True, a training step, that runs out of
+                memory in forward, review or backward, is repeated with the
+                batch split into 2, 4, ... parts along the batch axis (see
+                `padertorch.data.split_batch`). The gradients of the parts
+                are accumulated, where the loss of each part is weighted
+                with the fraction of the examples in the part. Hence, the
+                update is the same as for the whole batch, when the loss is
+                a mean over the examples. The scalars `oom_split` (1, when
+                the batch was split) and `oom_batch_parts` in the summary
+                report how often this happened.
+                Note: The examples in a batch must be independent, e.g. a
+                    model with batch normalization sees smaller batches.
+                Note: For a split batch, the `model_output`, that the
+                    `post_step` of the hooks gets, is the list of the
+                    model outputs of the parts (in the order of
+                    `padertorch.data.split_batch`), while the review is
+                    merged.
+                Note: Not supported by the DistributedTrainer.
 
 
         Usage:
@@ -132,9 +229,41 @@ class Trainer(Configurable):
 
         self.loss_weights = loss_weights
         self.virtual_minibatch_size = virtual_minibatch_size
+        self.prefetch_to_device = prefetch_to_device
+
+        self.mixed_precision = mixed_precision
+        if mixed_precision is None:
+            self.grad_scaler = None
+        elif mixed_precision == 'bfloat16':
+            # bfloat16 has the same exponent range as float32,
+            # hence there is no need for loss scaling.
+            self.grad_scaler = None
+        elif mixed_precision == 'float16':
+            self.grad_scaler = torch.cuda.amp.GradScaler()
+        else:
+            raise ValueError(
+                f'Unknown mixed_precision: {mixed_precision!r}.\n'
+                f"Choose None, 'float16' or 'bfloat16'."
+            )
+
+        self.async_checkpoint = async_checkpoint
+        self._checkpoint_writer = None
+        # The durations of the background writes, that are moved to the
+        # train_timer in the main thread (see _write_checkpoint).
+        self._checkpoint_write_times = collections.deque()
+        self.deduplicate_checkpoints = deduplicate_checkpoints
+        self.accumulate_summary_on_device = accumulate_summary_on_device
+        self.streaming_summary_statistics = streaming_summary_statistics
+        self.background_summary_writer = background_summary_writer
+        self.detailed_timings = detailed_timings
+        self.split_batch_on_oom = split_batch_on_oom
 
         self.hooks = [
-            SummaryHook(summary_trigger),
+            SummaryHook(
+                summary_trigger,
+                accumulate_on_device=accumulate_summary_on_device,
+                streaming_statistics=streaming_summary_statistics,
+            ),
             CheckpointHook(checkpoint_trigger),
             StopTrainingHook(stop_trigger),
         ]
@@ -253,7 +382,12 @@ class Trainer(Configurable):
         # Reset all gradients
         self.optimizer_zero_grad()
 
+        if self.async_checkpoint:
+            self._checkpoint_writer = CheckpointWriter()
+
         self.writer = self.writer_cls(str(self.storage_dir))
+        if self.background_summary_writer and self.is_master:
+            self.writer = BackgroundSummaryWriter(self.writer)
         hooks = [*self.hooks]
         if progress_bar:
             try:
@@ -264,6 +398,8 @@ class Trainer(Configurable):
             hooks.append(ProgressBarHook(self._stop_trigger, max_it_len))
         hooks = sorted(hooks, key=lambda h: h.priority, reverse=True)
 
+        train_iterator = self._maybe_prefetch_to_device(train_iterator)
+
         # ================ MAIN TRAINING LOOP! ===================
         try:
             # Count epochs up to infinity if not any stop condition is met. A
@@ -271,7 +407,8 @@ class Trainer(Configurable):
             for self.epoch in itertools.count(start=self.epoch):
                 epoch_start = True
                 for hook in hooks:
-                    hook.pre_step(self)
+                    with self._detailed_timer(f'hooks/{hook.uid}/pre_step'):
+                        hook.pre_step(self)
 
                 for self.iteration, example in self.train_timer(
                     key='time_per_data_loading',
@@ -284,15 +421,23 @@ class Trainer(Configurable):
                         epoch_start = False
                     else:
                         for hook in hooks:
-                            hook.pre_step(self)
+                            with self._detailed_timer(
+                                    f'hooks/{hook.uid}/pre_step'):
+                                hook.pre_step(self)
                     with self.train_timer['time_per_step']:
                         model_output, review = self.train_step(
                             example,
                             optimize=(self.iteration+1) % self.virtual_minibatch_size == 0,
                         )
+                    while self._checkpoint_write_times:
+                        self.train_timer.timings[
+                            'time_per_checkpoint_write'
+                        ].append(self._checkpoint_write_times.popleft())
 
                     for hook in hooks:
-                        hook.post_step(self, example, model_output, review)
+                        with self._detailed_timer(
+                                f'hooks/{hook.uid}/post_step'):
+                            hook.post_step(self, example, model_output, review)
 
                     # Release pytorch object to reduce memory footprint
                     del example  # likely to be numpy
@@ -313,14 +458,30 @@ class Trainer(Configurable):
             pass
         finally:
             try:
-                for hook in hooks:
-                    hook.close(self)
+                try:
+                    for hook in hooks:
+                        hook.close(self)
+                finally:
+                    if self._checkpoint_writer is not None:
+                        checkpoint_writer = self._checkpoint_writer
+                        self._checkpoint_writer = None
+                        checkpoint_writer.close()
             except Exception:
                 print('Exception in finally. May hide actual exception!!!\n'
                       'You may comment this finally block for debugging.')
                 raise
-            self.writer.close()
-            self.writer = None
+            finally:
+                # Writes the queued summaries of the
+                # background_summary_writer.
+                writer, self.writer = self.writer, None
+                writer.close()
+
+    def _maybe_prefetch_to_device(self, iterator):
+        if self.prefetch_to_device > 0:
+            return pt.data.DevicePrefetcher(
+                iterator, self.device, buffer_size=self.prefetch_to_device,
+            )
+        return iterator
 
     _non_validation_start_time = None
 
@@ -331,28 +492,40 @@ class Trainer(Configurable):
         :param validation_iterator:
         :return:
         """
-        validation_start_time = self.validate_timer.timestamp()
-
-        if self._non_validation_start_time is not None:
-            self.validate_timer.timings['non_validation_time'].append(
-                validation_start_time - self._non_validation_start_time
-            )
-
         # Disable backward mode with `no_grad()`.
-        with self.validate_timer['validation_time'], torch.no_grad():
+        with self._time_validation(), torch.no_grad():
             # Change model to eval mode (e.g. deactivate dropout).
             self.model.eval()
             try:
                 for i, example in self.validate_timer(
                     key='time_per_data_loading',
-                    iterable=enumerate(validation_iterator)
+                    iterable=enumerate(
+                        self._maybe_prefetch_to_device(validation_iterator)
+                    )
                 ):
                     with self.validate_timer['time_per_step']:
                         yield self.validation_step(example)
                     del example
             finally:
                 self.model.train()
-                self._non_validation_start_time = self.validate_timer.timestamp()
+
+    @contextlib.contextmanager
+    def _time_validation(self):
+        """
+        Measures the `validation_time` and the `non_validation_time` (the time
+        since the last validation) with the `validate_timer`.
+        """
+        validation_start_time = self.validate_timer.timestamp()
+
+        if self._non_validation_start_time is not None:
+            self.validate_timer.timings['non_validation_time'].append(
+                validation_start_time - self._non_validation_start_time
+            )
+        try:
+            with self.validate_timer['validation_time']:
+                yield
+        finally:
+            self._non_validation_start_time = self.validate_timer.timestamp()
 
     def optimizer_zero_grad(self):
         if isinstance(self.optimizer, dict):
@@ -364,38 +537,162 @@ class Trainer(Configurable):
     def optimizer_step(self):
         if isinstance(self.optimizer, dict):
             for opti in self.optimizer.values():
-                opti.step()
+                opti.step(grad_scaler=self.grad_scaler)
         else:
-            self.optimizer.step()
+            self.optimizer.step(grad_scaler=self.grad_scaler)
+        if self.grad_scaler is not None:
+            self.grad_scaler.update()
 
     def train_step(self, example, optimize=True):
 
-        model_out, review = self.step(example, self.train_timer)
+        if self.split_batch_on_oom:
+            model_out, review = self._step_and_backward_with_oom_recovery(
+                example)
+        else:
+            model_out, review = self.step(example, self.train_timer)
+
+            with self.train_timer['time_per_backward']:
+                self.backward(review)
 
         with self.train_timer['time_per_backward']:
-            self.backward(review)
             if optimize:
-                review = self.clip_grad(review)
-                self.optimizer_step()
-                self.optimizer_zero_grad()
+                with self._detailed_timer('time_per_clip_grad'):
+                    review = self.clip_grad(review)
+                with self._detailed_timer('time_per_optimizer_step'):
+                    self.optimizer_step()
+                with self._detailed_timer('time_per_zero_grad'):
+                    self.optimizer_zero_grad()
 
         return model_out, review
 
+    def _step_and_backward_with_oom_recovery(self, example):
+        """
+        `step` and `backward`, where the example is split into more parts,
+        when the memory is exhausted (see `split_batch_on_oom`).
+        """
+        # The gradients, that are accumulated from the previous steps
+        # (virtual_minibatch_size), are restored in-place, when a failed
+        # backward is discarded. In-place, because the gradients may be
+        # views of a buffer (see `Optimizer(contiguous_grads=True)`). After
+        # an optimizer step, the gradients are zero, i.e. no copy is needed.
+        if self.iteration % self.virtual_minibatch_size != 0:
+            accumulated_grads = [
+                (p, p.grad.clone())
+                for p in self.model.parameters() if p.grad is not None
+            ]
+        else:
+            accumulated_grads = []
+
+        num_parts = 1
+        while True:
+            try:
+                if num_parts == 1:
+                    parts = [example]
+                else:
+                    parts = pt.data.split_batch(example, num_parts)
+                outputs = []
+                for part in parts:
+                    weight = (
+                        1 if num_parts == 1
+                        else pt.data.get_batch_size(part)
+                        / pt.data.get_batch_size(example)
+                    )
+                    model_out, review = self.step(part, self.train_timer)
+                    with self.train_timer['time_per_backward']:
+                        self.backward({**review, 'loss': review['loss'] * weight})
+                    outputs.append((model_out, review, weight))
+                    del model_out, review
+                break
+            except RuntimeError as e:
+                if not _is_out_of_memory_error(e):
+                    raise
+                batch_size = pt.data.get_batch_size(example)
+                if num_parts >= batch_size:
+                    raise
+                warnings.warn(
+                    f'Out of memory in iteration {self.iteration} with '
+                    f'{num_parts} part(s) of the batch with {batch_size} '
+                    f'examples. Retry with {min(2 * num_parts, batch_size)} '
+                    f'parts.'
+                )
+            # The exception (and its traceback, that references the
+            # tensors of the failed step) is released here.
+            outputs = parts = part = None
+            for p in self.model.parameters():
+                if p.grad is not None:
+                    p.grad.zero_()
+            for p, grad in accumulated_grads:
+                p.grad.copy_(grad)
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            num_parts = min(2 * num_parts, batch_size)
+        del accumulated_grads
+
+        if num_parts == 1:
+            (model_out, review, _), = outputs
+        else:
+            model_out = [model_out for model_out, _, _ in outputs]
+            review = _merge_reviews(
+                [review for _, review, _ in outputs],
+                [weight for _, _, weight in outputs],
+            )
+        review.setdefault('scalars', {})
+        review['scalars']['oom_split'] = float(num_parts > 1)
+        review['scalars']['oom_batch_parts'] = num_parts
+        return model_out, review
+
+    def _detailed_timer(self, key):
+        """
+        Measures the time with the train_timer, when `detailed_timings` is
+        enabled.
+        """
+        if self.detailed_timings:
+            return self.train_timer[key]
+        else:
+            return _NO_OP_CONTEXT
+
     def validation_step(self, example):
         return self.step(example, self.validate_timer)
 
     def step(self, example, timer):
-        # TODO: Backup OutOfMemory
         with timer['time_per_to_device']:
             example = pt.data.example_to_device(
                 example, self.device
             )
-        with timer['time_per_forward']:
-            model_out = self.model(example)
+        with timer['time_per_forward'], self.autocast():
+            model_out = self._forward(example)
         with timer['time_per_review']:
-            review = self.model.review(example, model_out)
+            with self.autocast():
+                review = self.model.review(example, model_out)
             return model_out, self._maybe_add_loss_to_review(review)
 
+    def _forward(self, example):
+        return self.model(example)
+
+    @contextlib.contextmanager
+    def autocast(self):
+        """
+        Enables `torch.autocast` when the trainer uses mixed precision,
+        otherwise it does nothing.
+        """
+        if self.mixed_precision is None:
+            yield
+        else:
+            if self.device is None:
+                device_type = 'cuda' if torch.cuda.is_available() else 'cpu'
+            else:
+                device_type = torch.device(
+                    'cuda', self.device
+                ) if isinstance(self.device, int) else torch.device(
+                    self.device
+                )
+                device_type = device_type.type
+            with torch.autocast(
+                    device_type,
+                    dtype=getattr(torch, self.mixed_precision),
+            ):
+                yield
+
     def _maybe_add_loss_to_review(self, review):
         if 'losses' in review:
             assert 'loss' not in review, review
@@ -433,11 +730,16 @@ class Trainer(Configurable):
             assert 'loss' in review, review
 
         assert review['loss'].dim() == 0, review['loss']
-        assert torch.isfinite(review['loss']), review
+        # An assert of the value would synchronize the device in each step,
+        # the SummaryHook checks the accumulated loss at the summary trigger
+        # (see `SummaryHook.check_finite_loss`).
         return review
 
     def backward(self, review, retain_graph=False):
-        review['loss'].backward(retain_graph=retain_graph)
+        loss = review['loss']
+        if self.grad_scaler is not None:
+            loss = self.grad_scaler.scale(loss)
+        loss.backward(retain_graph=retain_graph)
 
     def register_hook(self, hook):
         if isinstance(hook, (tuple, list)):
@@ -449,7 +751,9 @@ class Trainer(Configurable):
     def register_validation_hook(
             self, validation_iterator, metric='loss', maximize=False,
             max_checkpoints=1, n_back_off=0, lr_update_factor=1 / 10,
-            back_off_patience=None, early_stopping_patience=None
+            back_off_patience=None, early_stopping_patience=None,
+            asynchronous=False, validation_device=None, num_workers=0,
+            validation_cache=False,
     ):
         """
 
@@ -470,6 +774,17 @@ class Trainer(Configurable):
                 backing off
             early_stopping_patience: the number of allowed degradations before
                 stopping training. Should be larger than back_off_patience.
+            asynchronous: If True, validate in a background thread on a copy
+                of the model, while the training continues.
+                See ValidationHook.
+            validation_device: The device for the asynchronous validation.
+            num_workers: The number of CPU worker processes, that validate
+                the shards of the validation_iterator in parallel.
+                See ValidationHook.
+            validation_cache: If True or a directory, the validation
+                summaries are cached (True: in `storage_dir/validation_cache`),
+                so the same weights are not validated twice on the same data.
+                See ValidationHook.
 
 
         Returns:
@@ -485,6 +800,12 @@ class Trainer(Configurable):
             lr_update_factor=lr_update_factor,
             back_off_patience=back_off_patience,
             early_stopping_patience=early_stopping_patience,
+            accumulate_on_device=self.accumulate_summary_on_device,
+            streaming_statistics=self.streaming_summary_statistics,
+            asynchronous=asynchronous,
+            validation_device=validation_device,
+            num_workers=num_workers,
+            cache=validation_cache,
         ))
 
     def clip_grad(self, summary: dict):
@@ -496,21 +817,51 @@ class Trainer(Configurable):
 
         if isinstance(self.optimizer, dict):
             for key, opti in self.optimizer.items():
-                grad_norm = opti.clip_grad()
-
-                summary['scalars'][f'{key}_grad_norm'] = grad_norm
-                # underscore was necessary to obtain unique keys to prevent
-                # tensorboard error
-                summary['histograms'][
-                    f'{key}_grad_norm_'] = torch.Tensor([grad_norm])
+                grad_norm = opti.clip_grad(grad_scaler=self.grad_scaler)
+                self._add_grad_norm_to_summary(summary, grad_norm, f'{key}_')
         else:
-            grad_norm = self.optimizer.clip_grad()
-            summary['scalars'][f'grad_norm'] = grad_norm
-            summary['histograms'][f'grad_norm_'] = \
-                torch.Tensor([grad_norm])
+            grad_norm = self.optimizer.clip_grad(grad_scaler=self.grad_scaler)
+            self._add_grad_norm_to_summary(summary, grad_norm)
+
+        if self.grad_scaler is not None:
+            summary['scalars']['grad_scale'] = self.grad_scaler.get_scale()
 
         return summary
 
+    def _add_grad_norm_to_summary(self, summary, grad_norm, prefix=''):
+        summary['scalars'][f'{prefix}grad_norm'] = grad_norm
+        if self.grad_scaler is not None:
+            # The GradScaler skips the optimizer step, when the unscaled
+            # gradients contain infs or NaNs, i.e. the grad_norm is not
+            # finite. The flag stays on the device, the SummaryHook ignores
+            # the non finite values of the histogram.
+            summary['scalars'][f'{prefix}optimizer_step_skipped'] = (
+                ~torch.isfinite(torch.as_tensor(grad_norm))
+            ).float()
+        # underscore was necessary to obtain unique keys to prevent
+        # tensorboard error
+        # torch.as_tensor keeps the grad_norm on the device, i.e. it does not
+        # synchronize.
+        summary['histograms'][f'{prefix}grad_norm_'] = \
+            torch.as_tensor(grad_norm).detach().reshape(1)
+
+    @property
+    def is_master(self):
+        """
+        False, when this trainer is one of multiple processes of a training
+        and another process is responsible for writing the files in
+        `storage_dir` (see `DistributedTrainer`).
+        """
+        return True
+
+    def reduce_summary(self, summary):
+        """
+        Used by the ValidationHook to combine the validation summaries of all
+        processes of a training (see `DistributedTrainer`). A training in a
+        single process does not need any reduction.
+        """
+        return summary
+
     @property
     def checkpoint_dir(self):
         return self.storage_dir / 'checkpoints'
@@ -533,6 +884,8 @@ class Trainer(Configurable):
                 optimizer=optimizer_state_dict,
                 hooks=dict(),
         )
+        if self.grad_scaler is not None:
+            state_dict['grad_scaler'] = self.grad_scaler.state_dict()
         for hook in self.hooks:
             hook_state = hook.state_dict()
             if hook_state is not None:
@@ -544,10 +897,37 @@ class Trainer(Configurable):
         if checkpoint_path is None:
             checkpoint_path = self.default_checkpoint_path()
 
-        torch.save(
-            self.state_dict(),
-            str(checkpoint_path)
-        )
+        if self._checkpoint_writer is None:
+            self._write_checkpoint(
+                self.state_dict(), checkpoint_path, self.iteration)
+        else:
+            with self.train_timer['time_per_checkpoint_snapshot']:
+                state_dict = snapshot_state_dict(self.state_dict())
+            self._checkpoint_writer.submit(
+                self._write_checkpoint,
+                state_dict, checkpoint_path, self.iteration,
+                asynchronous=True,
+            )
+
+    def _write_checkpoint(
+            self, state_dict, checkpoint_path, iteration, asynchronous=False
+    ):
+        if asynchronous:
+            # The main thread clears the train_timer at the summary trigger,
+            # hence the duration is handed over with a (thread safe) deque.
+            start = time.perf_counter()
+            if self.deduplicate_checkpoints:
+                state_dict = TensorBlobStore(
+                    checkpoint_path.parent, fsync=True
+                ).deduplicate(state_dict)
+            write_checkpoint(state_dict, checkpoint_path, fsync=True)
+            self._checkpoint_write_times.append(time.perf_counter() - start)
+        else:
+            if self.deduplicate_checkpoints:
+                state_dict = TensorBlobStore(
+                    checkpoint_path.parent
+                ).deduplicate(state_dict)
+            write_checkpoint(state_dict, checkpoint_path)
 
         # Create relative symlink to latest checkpoint
         latest_symlink_path = (checkpoint_path.parent / f'ckpt_latest.pth').absolute()
@@ -556,7 +936,28 @@ class Trainer(Configurable):
         latest_symlink_path.symlink_to(checkpoint_path.name)
 
         print(f"{datetime.now()}: Saved model and optimizer state "
-              f"at iteration {self.iteration} to {checkpoint_path}")
+              f"at iteration {iteration} to {checkpoint_path}")
+
+    def after_checkpoint_write(self, fn, *args, **kwargs):
+        """
+        Calls `fn(*args, **kwargs)` after all checkpoints, that are saved
+        until now, are written. Used for operations in the checkpoint
+        directory, that depend on the checkpoint files (e.g. symlinks to
+        checkpoints and the deletion of stale checkpoints).
+
+        Without `async_checkpoint`, `fn` is called immediately.
+        """
+        if self._checkpoint_writer is None:
+            fn(*args, **kwargs)
+        else:
+            self._checkpoint_writer.submit(fn, *args, **kwargs)
+
+    def wait_for_checkpoint_writes(self):
+        """
+        Blocks until all checkpoints, that are saved until now, are written.
+        """
+        if self._checkpoint_writer is not None:
+            self._checkpoint_writer.wait()
 
     def load_state_dict(self, state_dict):
         self.model.load_state_dict(state_dict['model'])
@@ -570,6 +971,9 @@ class Trainer(Configurable):
         else:
             self.optimizer.load_state_dict(state_dict['optimizer'])
 
+        if self.grad_scaler is not None and 'grad_scaler' in state_dict:
+            self.grad_scaler.load_state_dict(state_dict['grad_scaler'])
+
         self.iteration = state_dict['iteration']
         self.epoch = state_dict['epoch']
 
@@ -588,11 +992,12 @@ class Trainer(Configurable):
             )
 
     def load_checkpoint(self, map_location='cpu'):
+        self.wait_for_checkpoint_writes()
         checkpoint_path = self.checkpoint_dir / 'ckpt_latest.pth'
         assert checkpoint_path.is_file(), checkpoint_path
 
-        checkpoint_dict = torch.load(
-            str(checkpoint_path), map_location=map_location
+        checkpoint_dict = read_checkpoint(
+            checkpoint_path, map_location=map_location
         )
 
         self.load_state_dict(checkpoint_dict)
@@ -605,6 +1010,11 @@ class Trainer(Configurable):
             return
 
         assert device == 'cpu' or isinstance(device, int), device
+        if self.mixed_precision == 'float16' and device == 'cpu':
+            raise ValueError(
+                "mixed_precision='float16' is only supported on GPUs.\n"
+                "Use mixed_precision='bfloat16' for the training on the CPU."
+            )
         self.model.to(device)
         if isinstance(self.optimizer, dict):
             for key in self.optimizer.keys():
@@ -646,6 +1056,383 @@ class MultiDeviceTrainer(Trainer):
         pass
 
 
+class _NoOpWriter:
+    """
+    Used as `writer_cls` for processes, that should not write tfevents files.
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, item):
+        if item.startswith('add_') or item in ['flush', 'close']:
+            return lambda *args, **kwargs: None
+        raise AttributeError(item)
+
+
+class _NoOpContext:
+    """
+    A context manager, that does nothing (`contextlib.nullcontext` needs
+    Python 3.7). It has no state, hence one instance is reused.
+    """
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NO_OP_CONTEXT = _NoOpContext()
+
+
+class DistributedTrainer(Trainer):
+    """
+    A Trainer for data parallel training with multiple processes using
+    `torch.distributed`.
+
+    Each process has to create the trainer with the same arguments and call
+    `train` with the same (unsharded) train_iterator. Each process iterates
+    only over its part (shard) of the train_iterator and the gradients are
+    averaged over all processes with an all-reduce (bucketed and overlapped
+    with the backward, see `torch.nn.parallel.DistributedDataParallel`).
+    The validation iterator is also sharded and the validation summaries of
+    all processes are merged before the best checkpoint is selected.
+
+    Only the process with rank 0 (`is_master`) writes the tfevents file and
+    the checkpoints. The `storage_dir` has to be shared between all
+    processes (e.g. all processes run on the same node).
+
+    When the default process group is not initialized, it is initialized with
+    `torch.distributed.init_process_group(backend=self.backend)`, where the
+    default backend `gloo` works on CPU-only machines. The process group is
+    then configured with the environment variables (e.g. `MASTER_ADDR`,
+    `MASTER_PORT`, `RANK` and `WORLD_SIZE`, that are set by
+    `python -m torch.distributed.launch` or `torchrun`).
+
+    Note: The gradients are averaged over the processes, while they are
+        summed over the steps of the virtual_minibatch_size.
+    Note: The train_iterator must have a length, so that each process gets
+        the same number of examples. The remaining examples are dropped.
+    Note: The iterators are sharded by slicing, hence a `lazy_dataset` must
+        be indexable. Shard it before the operations that are not indexable
+        (e.g. `.shuffle(reshuffle=True)` and `.prefetch(...)`), so that each
+        process shuffles and loads only its own examples, see `shard`.
+
+    Usage:
+
+        # In each process
+        trainer = DistributedTrainer.from_config(...)
+        trainer.register_validation_hook(validation_dataset)
+        trainer.train(train_dataset)
+
+        # With a non indexable dataset, shard before the shuffle/prefetch
+        train_dataset = trainer.shard(train_dataset, drop_last=True)
+        trainer.train(train_dataset.shuffle(reshuffle=True).prefetch(...))
+
+    """
+    backend = 'gloo'
+    find_unused_parameters = False
+
+    ddp_model = None
+
+    def _init_process_group(self):
+        import torch.distributed as dist
+        if not dist.is_initialized():
+            dist.init_process_group(backend=self.backend)
+
+    @property
+    def rank(self):
+        import torch.distributed as dist
+        self._init_process_group()
+        return dist.get_rank()
+
+    @property
+    def world_size(self):
+        import torch.distributed as dist
+        self._init_process_group()
+        return dist.get_world_size()
+
+    @property
+    def is_master(self):
+        return self.rank == 0
+
+    def barrier(self):
+        import torch.distributed as dist
+        self._init_process_group()
+        dist.barrier()
+
+    def shard(self, iterator, drop_last=False):
+        """
+        Returns the part of the iterator, that belongs to this process.
+
+        `train` and `validate` shard the iterator, except when it is built
+        on a shard of this method (e.g.
+        `trainer.shard(dataset, drop_last=True).shuffle(reshuffle=True)`).
+
+        Args:
+            iterator: Iterable with a length. When the iterator supports
+                slicing (e.g. an indexable lazy_dataset), the iterator is
+                sliced. A lazy_dataset that is not indexable raises an
+                exception, because each process would load and shuffle the
+                complete dataset and the shards would overlap. Other
+                iterators (e.g. generators) are read completely by each
+                process and every `world_size`-th example is kept.
+            drop_last: If True, each process gets the same number of
+                examples and the remaining examples are dropped.
+        """
+        shard = _get_distributed_shard(iterator)
+        if shard is not None:
+            rank, world_size, shard_drop_last = shard
+            assert (rank, world_size) == (self.rank, self.world_size), (
+                'The iterator is a shard of another process.',
+                (rank, world_size), (self.rank, self.world_size)
+            )
+            if drop_last and not shard_drop_last:
+                raise ValueError(
+                    f'The iterator is a shard with drop_last=False, i.e. the '
+                    f'processes may get a different number of examples. Use '
+                    f'{self.__class__.__name__}.shard(..., drop_last=True).'
+                    f'\nGot: {iterator}'
+                )
+            return iterator
+        try:
+            length = len(iterator)
+        except TypeError:
+            if drop_last:
+                raise TypeError(
+                    f'{self.__class__.__name__} needs an iterator with a '
+                    f'length, to ensure that each process gets the same '
+                    f'number of examples.\nGot: {iterator}'
+                )
+            length = None
+        if drop_last:
+            stop = length // self.world_size * self.world_size
+            if stop == 0:
+                raise ValueError(
+                    f'The iterator has fewer examples ({length}) than '
+                    f'processes ({self.world_size}).'
+                )
+        else:
+            stop = length
+
+        sharded = _shard_iterator(iterator, self.rank, self.world_size, stop)
+        if isinstance(sharded, lazy_dataset.Dataset):
+            # Mark the shard, so that train and validate don't shard a
+            # dataset that is built on this shard again.
+            sharded._distributed_shard = (
+                self.rank, self.world_size, drop_last)
+        return sharded
+
+    def train(
+            self,
+            train_iterator,
+            *,
+            progress_bar=True,
+            resume=False,
+            device=None
+    ):
+        if self.split_batch_on_oom:
+            raise NotImplementedError(
+                'split_batch_on_oom is not supported by the '
+                'DistributedTrainer, because all processes have to do the '
+                'same number of backward steps.'
+            )
+        if device is None and torch.cuda.is_available():
+            device = self.rank % torch.cuda.device_count()
+        if not self.is_master:
+            progress_bar = False
+            self.writer_cls = _NoOpWriter
+        return super().train(
+            self.shard(train_iterator, drop_last=True),
+            progress_bar=progress_bar,
+            resume=resume,
+            device=device,
+        )
+
+    def validate(self, validation_iterator):
+        return super().validate(self.shard(validation_iterator))
+
+    def to(self, device):
+        super().to(device)
+        if device is None:
+            return
+        # The construction of DistributedDataParallel synchronizes the
+        # processes and broadcasts the parameters of the master.
+        self.ddp_model = torch.nn.parallel.DistributedDataParallel(
+            self.model,
+            device_ids=[device] if isinstance(device, int) else None,
+            find_unused_parameters=self.find_unused_parameters,
+        )
+
+    def _forward(self, example):
+        if self.model.training and self.ddp_model is not None:
+            return self.ddp_model(example)
+        else:
+            # The validation does not need synchronized processes, hence the
+            # number of validation examples may differ between the processes.
+            return self.model(example)
+
+    def train_step(self, example, optimize=True):
+        if optimize or self.ddp_model is None:
+            return super().train_step(example, optimize=optimize)
+        else:
+            # Accumulate the gradients without an all-reduce.
+            with self.ddp_model.no_sync():
+                return super().train_step(example, optimize=optimize)
+
+    def reduce_summary(self, summary):
+        import torch.distributed as dist
+        summaries = [None] * self.world_size
+        dist.all_gather_object(
+            summaries, {k: dict(v) for k, v in summary.items()}
+        )
+        return SummaryHook.merge_summaries(summaries)
+
+    def save_checkpoint(self, checkpoint_path=None):
+        if self.is_master:
+            super().save_checkpoint(checkpoint_path)
+        # All processes have to wait for the checkpoint, e.g. the
+        # ValidationHook verifies that the checkpoint exists.
+        self.barrier()
+
+    def load_checkpoint(self, map_location='cpu'):
+        # Wait for the master, e.g. the master updates the ckpt_latest.pth
+        # symlink before a back off.
+        self.barrier()
+        super().load_checkpoint(map_location=map_location)
+
+
+def _is_out_of_memory_error(exception):
+    # torch.cuda.OutOfMemoryError is a subclass of RuntimeError, older torch
+    # versions raise a RuntimeError. The CPU allocator raises a RuntimeError.
+    return isinstance(exception, RuntimeError) and (
+        'out of memory' in str(exception)
+        or "can't allocate memory" in str(exception)
+    )
+
+
+def _merge_reviews(reviews, weights):
+    """
+    Combines the reviews of the parts of a batch (see
+    `Trainer(split_batch_on_oom=True)`) to the review of the whole batch.
+    The losses and the scalars with one value are weighted sums, the scalars
+    with multiple values, the histograms and the buffers are concatenated
+    and the snapshots (audios, images, ...) are taken from the first part.
+
+    >>> reviews = [
+    ...     {'loss': torch.tensor(1.), 'scalars': {'a': 2., 'b': [1, 2]}},
+    ...     {'loss': torch.tensor(4.), 'scalars': {'a': 4., 'b': [3]}},
+    ... ]
+    >>> review = _merge_reviews(reviews, [0.75, 0.25])
+    >>> review['loss'], review['scalars']['a'], review['scalars']['b']
+    (tensor(1.7500), 2.5, array([1, 2, 3]))
+    """
+    def weighted_sum(values):
+        values = [
+            v.detach() if torch.is_tensor(v) else v for v in values
+        ]
+        return sum([w * v for w, v in zip(weights, values)])
+
+    def concatenate(values):
+        if all([torch.is_tensor(v) for v in values]):
+            return torch.cat([v.detach().reshape(-1) for v in values])
+        return np.concatenate([
+            np.ravel(pt.utils.to_numpy(v, detach=True)) for v in values
+        ])
+
+    merged = {**reviews[0]}
+    merged['loss'] = weighted_sum([review['loss'] for review in reviews])
+    if 'losses' in merged:
+        merged['losses'] = {
+            key: weighted_sum([review['losses'][key] for review in reviews])
+            for key in merged['losses']
+        }
+    if 'scalars' in merged:
+        merged['scalars'] = {}
+        for key in reviews[0]['scalars']:
+            values = [review['scalars'][key] for review in reviews]
+            if all([np.size(pt.utils.to_numpy(v, detach=True)) == 1
+                    for v in values]):
+                merged['scalars'][key] = weighted_sum(values)
+            else:
+                merged['scalars'][key] = concatenate(values)
+    for summary_key in ['histograms', 'buffers']:
+        if summary_key in merged:
+            merged[summary_key] = {
+                key: concatenate([r[summary_key][key] for r in reviews])
+                for key in reviews[0][summary_key]
+            }
+    return merged
+
+
+def _shard_iterator(iterator, index, num_shards, stop=None):
+    """
+    Returns every `num_shards`-th example of the iterator, starting with the
+    example `index`. When the iterator supports slicing (e.g. lazy_dataset),
+    the iterator is sliced. Other iterators are read completely.
+
+    >>> list(_shard_iterator(range(10), 1, 3))
+    [1, 4, 7]
+    >>> list(_shard_iterator(iter(range(10)), 1, 3))
+    [1, 4, 7]
+    >>> ds = lazy_dataset.new(list(range(10)))
+    >>> list(_shard_iterator(ds, 1, 3))
+    [1, 4, 7]
+    >>> _shard_iterator(ds.shuffle(reshuffle=True), 1, 3)
+    Traceback (most recent call last):
+    ...
+    ValueError: Only an indexable lazy_dataset can be sharded, shard the dataset before the operations that are not indexable (e.g. .shuffle(reshuffle=True), .filter(...) and .prefetch(...)).
+    Got:
+        ListDataset(len=10)
+      MapDataset(_pickle.loads)
+    ReShuffleDataset()
+    """
+    if isinstance(iterator, lazy_dataset.Dataset) and not iterator.indexable:
+        # Slicing is not supported and reading every num_shards-th example
+        # would load (and with a reshuffle: shuffle independently) the
+        # complete dataset in each shard.
+        raise ValueError(
+            f'Only an indexable lazy_dataset can be sharded, shard the '
+            f'dataset before the operations that are not indexable (e.g. '
+            f'.shuffle(reshuffle=True), .filter(...) and .prefetch(...)).'
+            f'\nGot:\n{iterator!r}'
+        )
+    try:
+        return iterator[index:stop:num_shards]
+    except (TypeError, AttributeError, NotImplementedError):
+        return _IteratorShard(iterator, index, stop, num_shards)
+
+
+def _get_distributed_shard(iterator):
+    """
+    Returns (rank, world_size, drop_last) of the `DistributedTrainer.shard`,
+    that the dataset is built on, or None.
+    """
+    while iterator is not None:
+        shard = getattr(iterator, '_distributed_shard', None)
+        if shard is not None:
+            return shard
+        iterator = getattr(iterator, 'input_dataset', None)
+    return None
+
+
+class _IteratorShard:
+    def __init__(self, iterable, start, stop, step):
+        self.iterable = iterable
+        self.start = start
+        self.stop = stop
+        self.step = step
+
+    def __iter__(self):
+        return itertools.islice(self.iterable, self.start, self.stop, self.step)
+
+    def __len__(self):
+        if self.stop is None:
+            raise TypeError(
+                f'object of type {self.__class__.__name__} has no len()'
+            )
+        return len(range(self.start, self.stop, self.step))
+
+
 class ContextTimerDict:
     """
     To be able to keep the measurements, we need to create the object before.
@@ -788,6 +1575,11 @@ class InteractiveWriter:
                       bins='tensorflow', walltime=None):
         pass
 
+    def add_histogram_raw(self, tag, min, max, num, sum, sum_squares,
+                          bucket_limits, bucket_counts, global_step,
+                          walltime=None):
+        pass
+
     def close(self):
         pass
 
@@ -2,6 +2,7 @@ import collections
 
 import numpy as np
 import torch
+import torch.utils.checkpoint
 
 
 def normalize_axis(x, axis):
@@ -129,3 +130,62 @@ def to_numpy(array, detach: bool = False, copy: bool = False) -> np.ndarray:
             'If you want to detach anyway, use `detach=True` as argument.'
             )
         ) from e
+
+
+def checkpoint_indices(checkpoint, num_blocks):
+    """
+    Resolves the `checkpoint` argument of a module with `num_blocks` blocks
+    (e.g. layers) to the indices of the blocks, that are evaluated with
+    `checkpoint_activations`.
+
+    Args:
+        checkpoint: True (all blocks), False (no block), an int n (the first
+            n blocks) or an iterable of block indices (negative indices
+            count from the end).
+        num_blocks: The number of blocks of the module.
+
+    >>> checkpoint_indices(True, 4), checkpoint_indices(False, 4)
+    (frozenset({0, 1, 2, 3}), frozenset())
+    >>> checkpoint_indices(2, 4), checkpoint_indices([0, -1], 4)
+    (frozenset({0, 1}), frozenset({0, 3}))
+    """
+    if isinstance(checkpoint, bool):
+        return frozenset(range(num_blocks)) if checkpoint else frozenset()
+    elif isinstance(checkpoint, int):
+        assert 0 <= checkpoint <= num_blocks, (checkpoint, num_blocks)
+        return frozenset(range(checkpoint))
+    else:
+        checkpoint = [int(i) for i in checkpoint]
+        assert all([-num_blocks <= i < num_blocks for i in checkpoint]), (
+            'Block index out of range', checkpoint, num_blocks)
+        return frozenset([i % num_blocks for i in checkpoint])
+
+
+def checkpoint_activations(function, *args, **kwargs):
+    """
+    Calls `function(*args, **kwargs)` with `torch.utils.checkpoint`, i.e. the
+    intermediate activations of `function` are not stored for the backward,
+    instead `function` is evaluated again in the backward. This reduces the
+    memory of the training at the cost of a second forward of `function`.
+
+    When the gradient is disabled (e.g. in the validation), `function` is
+    called directly.
+
+    Note: Buffers that are updated in the forward (e.g. the running
+        statistics of a batch normalization) are updated twice.
+
+    >>> layer = torch.nn.Linear(3, 2)
+    >>> x = torch.ones(4, 3)
+    >>> checkpoint_activations(layer, x).sum().backward()
+    >>> layer.weight.grad
+    tensor([[4., 4., 4.],
+            [4., 4., 4.]])
+    """
+    if not torch.is_grad_enabled():
+        return function(*args, **kwargs)
+    # The non-reentrant variant computes the gradients of the parameters
+    # also when no input requires a gradient (e.g. the first block of a
+    # stack) and supports keyword arguments.
+    return torch.utils.checkpoint.checkpoint(
+        function, *args, use_reentrant=False, **kwargs
+    )
@@ -23,7 +23,7 @@ with open(path.join(here, 'DESCRIPTION.rst'), encoding='utf-8') as f:
 
 # testing dependencies
 test = ['pytest', 'coverage', 'pylint', 'sacred', 'appdirs',
-        'protobuf3_to_dict', 'torchvision']
+        'protobuf3_to_dict', 'torchvision', 'pytest-benchmark']
 
 setup(
     name='padertorch',
@@ -0,0 +1,145 @@
+"""
+Benchmarks of the training loop of `padertorch.Trainer` on the CPU with
+synthetic models of different sizes.
+
+Run with:
+    pytest tests/benchmarks --benchmark-only
+Compare with a previous run:
+    pytest tests/benchmarks --benchmark-only --benchmark-autosave
+    pytest tests/benchmarks --benchmark-only --benchmark-compare
+
+The measured time is one call of `Trainer.train` with `num_steps`
+iterations. The `extra_info` of each benchmark contains the steps per
+second, the mean time of `pre_step` and `post_step` of each hook
+(`Trainer(detailed_timings=True)`) and the memory high-water mark (maximum
+resident set size) of the process.
+"""
+import collections
+import itertools
+import resource
+
+import numpy as np
+import pytest
+import torch
+
+import padertorch as pt
+from padertorch.summary.tfevents import load_events_as_dict
+
+pytest.importorskip('pytest_benchmark')
+
+# (number of layers, width)
+MODEL_SIZES = {
+    'small': (2, 64),
+    'medium': (4, 256),
+    'large': (6, 512),
+}
+BATCH_SIZE = 32
+NUM_STEPS = 50
+
+
+class MLP(pt.Model):
+    def __init__(self, num_layers, width):
+        super().__init__()
+        self.layers = torch.nn.Sequential(*[
+            torch.nn.Sequential(torch.nn.Linear(width, width), torch.nn.ReLU())
+            for _ in range(num_layers)
+        ])
+        self.out = torch.nn.Linear(width, 1)
+
+    def forward(self, example):
+        return self.out(self.layers(torch.as_tensor(example['x'])))
+
+    def review(self, example, output):
+        target = torch.as_tensor(example['y'])
+        loss = torch.nn.functional.mse_loss(output, target)
+        return {
+            'loss': loss,
+            'scalars': {'output_mean': output.mean()},
+            'histograms': {'output': output},
+        }
+
+
+def get_dataset(width, num_examples):
+    rng = np.random.RandomState(0)
+    return [
+        {
+            'x': rng.randn(BATCH_SIZE, width).astype(np.float32),
+            'y': rng.randn(BATCH_SIZE, 1).astype(np.float32),
+        }
+        for _ in range(num_examples)
+    ]
+
+
+def max_rss_mb():
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def hook_timings(storage_dir):
+    """
+    The mean time of `pre_step` and `post_step` of each hook from the
+    tfevents file.
+    """
+    timings = collections.defaultdict(list)
+    event_file, = storage_dir.glob('*tfevents*')
+    for event in load_events_as_dict(event_file):
+        if 'summary' not in event:
+            continue
+        for value in event['summary']['value']:
+            if value['tag'].startswith('training_timings/hooks/'):
+                key = value['tag'][len('training_timings/hooks/'):]
+                timings[key].append(value['simple_value'])
+    return {key: float(np.mean(values)) for key, values in timings.items()}
+
+
+@pytest.mark.parametrize('hooks', ['default', 'standard'])
+@pytest.mark.parametrize('model_size', list(MODEL_SIZES.keys()))
+def test_train_loop(benchmark, tmp_path, model_size, hooks):
+    """
+    default: SummaryHook, CheckpointHook and StopTrainingHook.
+    standard: Additionally the BackOffValidationHook and the
+        ProgressBarHook.
+    """
+    num_layers, width = MODEL_SIZES[model_size]
+    train_dataset = get_dataset(width, NUM_STEPS)
+    validation_dataset = get_dataset(width, 5)
+    runs = itertools.count()
+    storage_dirs = []
+
+    def setup():
+        torch.manual_seed(0)
+        storage_dir = tmp_path / f'run_{next(runs)}'
+        storage_dirs.append(storage_dir)
+        trainer = pt.Trainer(
+            MLP(num_layers, width),
+            optimizer=pt.optimizer.Adam(),
+            storage_dir=str(storage_dir),
+            summary_trigger=(10, 'iteration'),
+            checkpoint_trigger=(25, 'iteration'),
+            stop_trigger=(NUM_STEPS, 'iteration'),
+            detailed_timings=True,
+        )
+        if hooks == 'standard':
+            trainer.register_validation_hook(validation_dataset)
+        return (trainer,), {}
+
+    def train(trainer):
+        trainer.train(
+            train_dataset, device='cpu', progress_bar=hooks == 'standard')
+
+    rss_before = max_rss_mb()
+    benchmark.pedantic(train, setup=setup, rounds=3, iterations=1)
+
+    benchmark.extra_info['steps_per_second'] = \
+        NUM_STEPS / benchmark.stats.stats.mean
+    benchmark.extra_info['hook_timings'] = hook_timings(storage_dirs[-1])
+    benchmark.extra_info['max_rss_mb'] = max_rss_mb()
+    benchmark.extra_info['max_rss_increase_mb'] = max_rss_mb() - rss_before
+
+    # Each hook of the set has a timing.
+    hook_uids = {key.split('/')[0] for key in
+                 benchmark.extra_info['hook_timings']}
+    expected = {'SummaryHook', 'CheckpointHook', 'StopTrainingHook'}
+    if hooks == 'standard':
+        expected |= {'BackOffValidationHook', 'ProgressBarHook'}
+    assert hook_uids == expected, hook_uids
@@ -0,0 +1,48 @@
+import tempfile
+from pathlib import Path
+
+import pytest
+import torch
+
+import paderbox as pb
+import padertorch as pt
+from padertorch.modules.recurrent import StatefulLSTM
+from padertorch.train.checkpoint import TensorBlobStore, write_checkpoint
+
+
+@pytest.mark.parametrize('deduplicate', [False, True])
+@pytest.mark.parametrize('mmap', [False, True])
+def test_from_storage_dir(deduplicate, mmap):
+    config = StatefulLSTM.get_config({'input_size': 10, 'hidden_size': 20})
+    model = StatefulLSTM.from_config(config)
+    checkpoint = {
+        'model': model.state_dict(),
+        'optimizer': {'state': {0: {'exp_avg': torch.ones(100, 100)}}},
+        'iteration': 10,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage_dir = Path(tmp_dir)
+        pb.io.dump_json(
+            {'trainer': {'model': config}}, storage_dir / 'config.json'
+        )
+        ckpt_dir = storage_dir / 'checkpoints'
+        ckpt_dir.mkdir()
+        if deduplicate:
+            checkpoint = TensorBlobStore(ckpt_dir).deduplicate(checkpoint)
+        write_checkpoint(checkpoint, ckpt_dir / 'ckpt_10.pth')
+        (ckpt_dir / 'ckpt_best_loss.pth').symlink_to('ckpt_10.pth')
+
+        loaded = StatefulLSTM.from_storage_dir(storage_dir, mmap=mmap)
+
+        if deduplicate:
+            # Only the blobs of the model are required
+            (ckpt_dir / 'blobs' / (
+                checkpoint['optimizer']['state'][0]['exp_avg'][
+                    '__tensor_blob__'] + '.pth'
+            )).unlink()
+            loaded = StatefulLSTM.from_storage_dir(storage_dir, mmap=mmap)
+
+    assert isinstance(loaded, pt.Module)
+    for k, v in model.state_dict().items():
+        assert torch.equal(loaded.state_dict()[k], v), k
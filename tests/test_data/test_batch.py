@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import torch
+
+import padertorch as pt
+
+
+def test_device_prefetcher_order_and_conversion():
+    examples = [{'a': np.full(3, i), 'b': [i, np.ones(2)]} for i in range(10)]
+    prefetched = list(pt.data.DevicePrefetcher(
+        examples, device='cpu', buffer_size=3
+    ))
+    assert len(prefetched) == len(examples)
+    for i, example in enumerate(prefetched):
+        assert torch.is_tensor(example['a']), example
+        np.testing.assert_equal(example['a'].numpy(), np.full(3, i))
+        assert example['b'][0] == i
+        assert torch.is_tensor(example['b'][1]), example
+
+
+def test_device_prefetcher_reiterable():
+    prefetcher = pt.data.DevicePrefetcher([np.arange(2)] * 3, device='cpu')
+    assert len(list(prefetcher)) == 3
+    assert len(list(prefetcher)) == 3
+
+
+def test_device_prefetcher_raises_exception_of_iterable():
+    def iterable():
+        yield np.arange(2)
+        raise ValueError('Broken data')
+
+    prefetcher = iter(pt.data.DevicePrefetcher(iterable(), device='cpu'))
+    next(prefetcher)
+    with pytest.raises(ValueError, match='Broken data'):
+        next(prefetcher)
+
+
+def test_device_prefetcher_early_exit():
+    def iterable():
+        for i in range(1000):
+            yield np.array(i)
+
+    for i, example in enumerate(pt.data.DevicePrefetcher(
+            iterable(), device='cpu', buffer_size=2)):
+        if i == 2:
+            break
+    assert example.item() == 2
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason='Requires CUDA')
+def test_device_prefetcher_cuda_record_stream():
+    examples = [{'a': np.full(2 ** 20, i, np.float32)} for i in range(20)]
+    consumer_stream = torch.cuda.Stream(0)
+    with torch.cuda.stream(consumer_stream):
+        for i, example in enumerate(pt.data.DevicePrefetcher(
+                examples, device=0, buffer_size=2)):
+            # The work on the consumer stream is still running, when the
+            # example is released and the next example is copied.
+            total = (example['a'] * 2).sum()
+            del example
+            assert total.item() == 2 * i * 2 ** 20
@@ -0,0 +1,147 @@
+import numpy as np
+import pytest
+import lazy_dataset
+
+import padertorch as pt
+from padertorch.data.bucketing import BucketBatchSampler, bucket_batch
+
+
+def get_lengths(num_examples=1000):
+    return np.random.RandomState(0).randint(16000, 16000 * 10, num_examples)
+
+
+@pytest.mark.parametrize('batch_size,max_total_size,max_padding_rate', [
+    (16, None, 0.1),
+    (None, 16000 * 40, 0.1),
+    (8, 16000 * 40, 0.05),
+])
+def test_guarantees(batch_size, max_total_size, max_padding_rate):
+    lengths = get_lengths()
+    sampler = BucketBatchSampler(
+        lengths, batch_size=batch_size, max_total_size=max_total_size,
+        max_padding_rate=max_padding_rate,
+    )
+    batches = list(sampler)
+    assert len(batches) == len(sampler)
+    indices = np.concatenate(batches)
+    np.testing.assert_equal(np.sort(indices), np.arange(len(lengths)))
+
+    padded = 0
+    for batch in batches:
+        batch_lengths = lengths[batch]
+        # Sorted in descending order
+        np.testing.assert_equal(batch_lengths, np.sort(batch_lengths)[::-1])
+        if batch_size is not None:
+            assert len(batch) <= batch_size
+        if max_total_size is not None and len(batch) > 1:
+            assert len(batch) * batch_lengths.max() <= max_total_size
+        assert (
+            batch_lengths.min() >=
+            batch_lengths.max() * (1 - max_padding_rate)
+        )
+        padded += len(batch) * batch_lengths.max()
+    padding_rate = (padded - lengths.sum()) / padded
+    np.testing.assert_allclose(sampler.padding_rate, padding_rate)
+    assert padding_rate <= max_padding_rate
+
+
+def test_reproducible_epochs():
+    lengths = get_lengths() // 16000  # many equal lengths
+    sampler = BucketBatchSampler(lengths, batch_size=16)
+    epoch_0 = list(sampler)
+    epoch_1 = list(sampler)
+    assert epoch_0 != epoch_1
+    assert sampler.epoch == 2
+
+    other = BucketBatchSampler(lengths, batch_size=16)
+    assert list(other) == epoch_0
+    other.set_epoch(1)
+    assert list(other) == epoch_1
+    assert list(BucketBatchSampler(lengths, batch_size=16, seed=1)) != epoch_0
+
+    unshuffled = BucketBatchSampler(lengths, batch_size=16, shuffle=False)
+    assert list(unshuffled) == list(unshuffled)
+
+
+def test_batches_change_between_epochs():
+    lengths = get_lengths()
+    sampler = BucketBatchSampler(lengths, batch_size=16)
+    epoch_0 = list(sampler)
+    assert len(sampler) == len(epoch_0)
+    statistics_0 = sampler.statistics()
+    epoch_1 = list(sampler)
+    assert len(sampler) == len(epoch_1)
+
+    def members(batches):
+        return {frozenset(batch) for batch in batches}
+
+    # Not only the order of the batches changes, but also their members.
+    # The lengths are unique, i.e. this is not an exchange of equal lengths.
+    assert len(np.unique(lengths)) > 0.9 * len(lengths)
+    assert len(members(epoch_0) & members(epoch_1)) < len(epoch_0) / 2
+    assert sampler.statistics() != statistics_0
+
+    # The padding_rate and the statistics are those of the current epoch
+    sampler.set_epoch(0)
+    assert sampler.statistics() == statistics_0
+    assert members(list(sampler)) == members(epoch_0)
+
+    unshuffled = BucketBatchSampler(lengths, batch_size=16, shuffle=False)
+    assert members(unshuffled) == members(unshuffled)
+
+
+def test_bucket_batch_dataset(monkeypatch):
+    monkeypatch.setenv('OMP_NUM_THREADS', '1')
+    monkeypatch.setenv('MKL_NUM_THREADS', '1')
+    lengths = get_lengths(100)
+    ds = lazy_dataset.new({
+        f'example_{i}': {'example_id': f'example_{i}', 'num_samples': length}
+        for i, length in enumerate(lengths)
+    })
+    batched = bucket_batch(ds, batch_size=8)
+    assert len(batched) == len(batched.sampler)
+
+    batches = list(batched)
+    np.testing.assert_equal(
+        [[ex['num_samples'] for ex in batch] for batch in batches],
+        [lengths[indices].tolist() for indices in batched.sampler.get_batches(0)],
+    )
+
+    # The prefetch freezes the batches of the next epoch
+    prefetched = list(batched.prefetch(2, 4))
+    expected = batched.sampler.get_batches(1)
+    assert len(prefetched) == len(expected)
+    for batch, indices in zip(prefetched, expected):
+        assert [ex['num_samples'] for ex in batch] == \
+               lengths[indices].tolist()
+
+    # Precomputed lengths and a callable len_key
+    padding_rate = bucket_batch(ds, batch_size=8).sampler.padding_rate
+    assert bucket_batch(ds, lengths=lengths, batch_size=8).sampler.padding_rate \
+        == padding_rate
+    assert bucket_batch(
+        ds, len_key=lambda ex: ex['num_samples'], batch_size=8
+    ).sampler.padding_rate == padding_rate
+
+
+def test_data_statistics_hook():
+    class Writer:
+        def __init__(self):
+            self.scalars = {}
+
+        def add_scalar(self, tag, value, iteration):
+            self.scalars[tag] = value
+
+    class Trainer:
+        iteration = 0
+        epoch = 0
+        writer = Writer()
+
+    sampler = BucketBatchSampler(get_lengths(), batch_size=16)
+    hook = pt.train.hooks.DataStatisticsHook(sampler)
+    trainer = Trainer()
+    hook.pre_step(trainer)
+    assert trainer.writer.scalars == {
+        f'training_data/{key}': value
+        for key, value in sampler.statistics().items()
+    }
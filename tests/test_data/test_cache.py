@@ -0,0 +1,209 @@
+import functools
+import os
+import pickle
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+import lazy_dataset
+
+import padertorch
+from padertorch.data.cache import FeatureCache, config_hash
+
+
+class STFT:
+    def __init__(self, size=8, shift=4):
+        self.size = size
+        self.shift = shift
+        self.calls = 0
+
+    def __call__(self, example):
+        self.calls += 1
+        audio = example['audio']
+        frames = np.stack([
+            audio[i:i + self.size]
+            for i in range(0, len(audio) - self.size + 1, self.shift)
+        ])
+        example['features'] = {
+            'stft': np.fft.rfft(frames).astype(np.complex64),
+            'num_frames': len(frames),
+        }
+        return example
+
+
+def get_example(index):
+    return {
+        'example_id': f'example_{index}',
+        'audio': np.random.RandomState(index).randn(100 + index),
+    }
+
+
+def test_cache_hit(tmp_path):
+    stft = STFT()
+    cache = FeatureCache(stft, tmp_path, keys=['features.stft'])
+    expected = cache(get_example(0))
+    assert stft.calls == 1
+    cached = cache(get_example(0))
+    assert stft.calls == 1
+    np.testing.assert_equal(
+        cached['features']['stft'], expected['features']['stft'])
+    assert cached['features']['stft'].dtype == np.complex64
+    # Not cached keys are taken from the input example
+    assert 'num_frames' not in cached['features']
+    np.testing.assert_equal(cached['audio'], get_example(0)['audio'])
+
+    # In-place modifications don't change the cache
+    cached['features']['stft'][...] = 0
+    np.testing.assert_equal(
+        cache(get_example(0))['features']['stft'],
+        expected['features']['stft'],
+    )
+
+
+def test_cache_complete_example(tmp_path):
+    cache = FeatureCache(STFT(), tmp_path)
+    expected = cache(get_example(1))
+    cached = cache(get_example(1))
+    assert cached.keys() == expected.keys()
+    assert cached['example_id'] == 'example_1'
+    assert cached['features']['num_frames'] == \
+        expected['features']['num_frames']
+    np.testing.assert_equal(cached['audio'], expected['audio'])
+
+
+def test_persistence_and_invalidation(tmp_path):
+    cache = FeatureCache(STFT(), tmp_path, keys=['features.stft'])
+    for index in range(3):
+        cache(get_example(index))
+    assert len(cache) == 3
+
+    # A new instance (e.g. the next training) reads the cache
+    stft = STFT()
+    cache = FeatureCache(stft, tmp_path, keys=['features.stft'])
+    assert len(cache) == 3
+    cache(get_example(0))
+    assert stft.calls == 0
+
+    # A changed config uses a new cache
+    stft = STFT(shift=2)
+    other = FeatureCache(stft, tmp_path, keys=['features.stft'])
+    assert other.cache_dir != cache.cache_dir
+    assert len(other) == 0
+    assert other(get_example(0))['features']['stft'].shape == (47, 5)
+    assert stft.calls == 1
+
+    # An explicit config
+    assert FeatureCache(
+        STFT(), tmp_path, config={'size': 8}
+    ).config_hash == config_hash({'size': 8})
+
+    cache.clear()
+    assert not cache.cache_dir.exists()
+    assert len(cache) == 0
+
+
+def test_read_only_and_errors(tmp_path):
+    cache = FeatureCache(STFT(), tmp_path, read_only=True)
+    cache(get_example(0))
+    assert len(cache) == 0
+
+    def transform(example):
+        example['text'] = np.array(['a', 'b'])
+        return example
+
+    with pytest.raises(TypeError):
+        FeatureCache(transform, tmp_path)(get_example(0))
+
+
+def test_pickle(tmp_path):
+    cache = FeatureCache(STFT(), tmp_path, keys=['features.stft'])
+    cache(get_example(0))
+    restored = pickle.loads(pickle.dumps(cache))
+    assert restored._index == {}
+    assert len(restored) == 1
+
+
+def cached_stft(index, cache):
+    return cache(get_example(index))
+
+
+def test_concurrent_writers(tmp_path, monkeypatch):
+    monkeypatch.setenv('OMP_NUM_THREADS', '1')
+    monkeypatch.setenv('MKL_NUM_THREADS', '1')
+    cache = FeatureCache(STFT(), tmp_path, keys=['features.stft'])
+    ds = lazy_dataset.new(list(range(20))).map(
+        functools.partial(cached_stft, cache=cache))
+    expected = [
+        example['features']['stft']
+        for example in ds.prefetch(4, 8, backend='concurrent_mp')
+    ]
+    # Each worker process writes its own shard
+    assert len(list(cache.cache_dir.glob('*.index.jsonl'))) > 1
+    assert len(cache) == 20
+    for index in range(20):
+        np.testing.assert_equal(
+            cache(get_example(index))['features']['stft'],
+            expected[index],
+        )
+    assert cache.transform.calls == 0
+
+
+def test_threaded_writers(tmp_path, monkeypatch):
+    monkeypatch.setenv('OMP_NUM_THREADS', '1')
+    monkeypatch.setenv('MKL_NUM_THREADS', '1')
+    cache = FeatureCache(STFT(), tmp_path, keys=['features.stft'])
+    ds = lazy_dataset.new(list(range(500))).map(
+        functools.partial(cached_stft, cache=cache))
+    for _ in ds.prefetch(8, 16):
+        pass
+
+    fresh = FeatureCache(STFT(), tmp_path, keys=['features.stft'])
+    assert len(fresh) == 500
+    for index in range(500):
+        np.testing.assert_equal(
+            fresh(get_example(index))['features']['stft'],
+            STFT()(get_example(index))['features']['stft'],
+        )
+    assert fresh.transform.calls == 0
+
+
+TRANSFORM = '''
+import numpy as np
+
+
+def transform(example):
+    example['x'] = np.array([v * 2 for v in example['audio']])
+    return example
+'''
+
+
+def test_config_hash_is_stable_across_processes(tmp_path):
+    (tmp_path / 'my_transform.py').write_text(TRANSFORM)
+    command = (
+        'from my_transform import transform;'
+        'from padertorch.data.cache import config_hash;'
+        'print(config_hash(transform))'
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([
+        str(tmp_path), str(Path(padertorch.__file__).parents[1])
+    ]))
+    hashes = {
+        subprocess.run(
+            [sys.executable, '-c', command], cwd=str(tmp_path), env=env,
+            check=True, stdout=subprocess.PIPE, universal_newlines=True,
+        ).stdout
+        for _ in range(3)
+    }
+    assert len(hashes) == 1, hashes
+
+
+def test_config_hash_tensor_attributes():
+    layer = torch.nn.Linear(3, 2)
+    before = config_hash(layer)
+    assert config_hash(layer) == before
+    with torch.no_grad():
+        layer.weight[0, 0] += 1
+    assert config_hash(layer) != before
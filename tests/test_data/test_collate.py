@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+import torch
+
+from padertorch.data.collate import pad_batch
+
+
+def get_arrays(dtype=np.float32, lengths=(5, 3, 4)):
+    rng = np.random.RandomState(0)
+    return [rng.randn(2, length, 3).astype(dtype) for length in lengths]
+
+
+@pytest.mark.parametrize('dtype', [
+    np.float32, np.float64, np.int16, np.int64, np.complex64, np.bool_,
+])
+def test_pad_batch_like_np_pad(dtype):
+    arrays = get_arrays(dtype)
+    batch = pad_batch(arrays)
+    expected = np.stack([
+        np.pad(a, [(0, 0), (0, 5 - a.shape[1]), (0, 0)], mode='constant')
+        for a in arrays
+    ])
+    assert batch.dtype == dtype
+    np.testing.assert_equal(batch, expected)
+
+
+def test_pad_batch_pad_value_and_cut_end():
+    arrays = get_arrays()
+    batch = pad_batch(arrays, pad_value=-1)
+    np.testing.assert_equal(batch[1, :, 3:], -1)
+    np.testing.assert_equal(batch[2, :, 4:], -1)
+
+    batch = pad_batch(arrays, cut_end=True)
+    assert batch.shape == (3, 2, 3, 3)
+    np.testing.assert_equal(batch, np.stack([a[:, :3] for a in arrays]))
+
+
+def test_pad_batch_lengths_and_mask():
+    arrays = get_arrays()
+    batch, lengths, mask = pad_batch(
+        arrays, return_lengths=True, return_mask=True)
+    np.testing.assert_equal(lengths, [5, 3, 4])
+    assert mask.shape == (3, 5)
+    np.testing.assert_equal(mask.sum(axis=-1), lengths)
+
+    batch, lengths, mask = pad_batch(
+        arrays, to_tensor=True, return_lengths=True, return_mask=True)
+    assert torch.is_tensor(lengths) and torch.is_tensor(mask)
+    assert mask.dtype == torch.bool
+
+
+def test_pad_batch_equal_shapes():
+    arrays = get_arrays(lengths=(4, 4))
+    batch, lengths = pad_batch(arrays, return_lengths=True)
+    np.testing.assert_equal(batch, np.stack(arrays))
+    np.testing.assert_equal(lengths, [2, 2])
+
+    batch = pad_batch([np.array(1.), np.array(2.)])
+    np.testing.assert_equal(batch, [1., 2.])
+
+
+def test_pad_batch_different_dims():
+    with pytest.raises(AssertionError):
+        pad_batch([np.zeros((2, 3)), np.zeros((3, 4))])
+
+
+def test_pad_batch_tensor():
+    arrays = get_arrays()
+    batch = pad_batch(arrays, to_tensor=True)
+    assert torch.is_tensor(batch)
+    assert batch.dtype == torch.float32
+    np.testing.assert_equal(batch.numpy(), pad_batch(arrays))
+
+    batch = pad_batch([torch.from_numpy(a) for a in arrays])
+    assert torch.is_tensor(batch)
+    np.testing.assert_equal(batch.numpy(), pad_batch(arrays))
+
+    # Strings are not converted to tensors
+    batch = pad_batch([np.array(['a', 'b']), np.array(['c'])], to_tensor=True)
+    assert isinstance(batch, np.ndarray)
+    np.testing.assert_equal(batch, [['a', 'b'], ['c', '0']])
+
+
+def test_pad_batch_share_memory():
+    arrays = get_arrays()
+    batch = pad_batch(arrays, share_memory=True)
+    assert torch.is_tensor(batch)
+    assert batch.is_shared()
+    np.testing.assert_equal(batch.numpy(), pad_batch(arrays))
+
+    batch = pad_batch([torch.from_numpy(a) for a in arrays], share_memory=True)
+    assert batch.is_shared()
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from padertorch.data.fragmenter import Fragmenter, fragment_axis
+
+
+def reference_fragments(x, length, step, axis, drop_last):
+    """Fragments with slicing in a python loop"""
+    end = x.shape[axis] - (length - 1 if drop_last else 0)
+    fragments = []
+    for start in range(0, end, step):
+        slc = [slice(None)] * x.ndim
+        slc[axis] = slice(start, start + length)
+        fragments.append(x[tuple(slc)])
+    return fragments
+
+
+@pytest.mark.parametrize('length,step', [(4, 4), (4, 2), (3, 5), (1, 1)])
+@pytest.mark.parametrize('axis', [0, 1, -1])
+def test_fragment_axis(length, step, axis):
+    x = np.random.RandomState(0).randn(11, 12, 3)
+    fragments = fragment_axis(x, length, step, axis=axis)
+    expected = reference_fragments(x, length, step, axis, drop_last=True)
+    assert len(fragments) == len(expected)
+    for fragment, e in zip(fragments, expected):
+        np.testing.assert_equal(fragment, e)
+    if len(fragments) > 0:
+        assert np.shares_memory(fragments, x)
+    assert not fragments.flags.writeable
+
+    copied = fragment_axis(x, length, step, axis=axis, copy=True)
+    np.testing.assert_equal(copied, fragments)
+    assert not np.shares_memory(copied, x)
+    assert copied.flags.writeable
+
+
+def test_fragment_axis_too_short():
+    assert fragment_axis(np.zeros((2, 3)), 4, 1).shape == (0, 2, 4)
+
+
+@pytest.mark.parametrize('drop_last', [True, False])
+def test_fragmenter_like_slicing(drop_last):
+    example = {
+        'audio': np.random.RandomState(0).randn(2, 1000),
+        'features': {'stft': np.random.RandomState(1).randn(2, 20, 5)},
+        'meta': {'speaker': ['a', 'b']},
+    }
+    fragmenter = Fragmenter(
+        {'audio': 100, 'features': 2}, {'audio': 200, 'features': 4},
+        axis=1, drop_last=drop_last, copy_keys=['meta'],
+    )
+    fragments = fragmenter(example)
+    audio = reference_fragments(example['audio'], 200, 100, 1, drop_last)
+    stft = reference_fragments(
+        example['features']['stft'], 4, 2, 1, drop_last)
+    assert len(fragments) == len(audio) == len(stft)
+    for fragment, a, s in zip(fragments, audio, stft):
+        np.testing.assert_equal(fragment['audio'], a)
+        np.testing.assert_equal(fragment['features']['stft'], s)
+        # The metadata is shared and not copied
+        assert fragment['meta']['speaker'] is example['meta']['speaker']
+
+
+def test_fragmenter_stack():
+    example = {'a': np.arange(20).reshape(2, 10), 'b': 'meta'}
+    fragmenter = Fragmenter(
+        {'a': 3}, {'a': 4}, drop_last=True, copy_keys=['b'], stack=True)
+    stacked = fragmenter(example)
+    fragments = Fragmenter(
+        {'a': 3}, {'a': 4}, drop_last=True, copy_keys=['b'])(example)
+    assert stacked['b'] == 'meta'
+    np.testing.assert_equal(
+        stacked['a'], np.stack([f['a'] for f in fragments]))
+
+    with pytest.raises(AssertionError):
+        Fragmenter({'a': 3}, stack=True)
@@ -0,0 +1,119 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from padertorch.data.packed_audio import pack_audio, PackedAudioReader
+
+soundfile = pytest.importorskip('soundfile')
+
+
+@pytest.fixture
+def audio_files(tmp_path):
+    rng = np.random.RandomState(0)
+    paths = []
+    for i, (channels, samples) in enumerate([(1, 1000), (2, 1600), (3, 500)]):
+        path = tmp_path / 'audio' / f'{i}.wav'
+        path.parent.mkdir(exist_ok=True)
+        soundfile.write(
+            str(path), rng.uniform(-0.9, 0.9, (samples, channels)), 16000)
+        paths.append(path)
+    return paths
+
+
+def read(path):
+    return soundfile.read(str(path), always_2d=True)[0].T
+
+
+def test_int16(audio_files, tmp_path):
+    storage_dir = pack_audio(
+        audio_files, tmp_path / 'packed', max_container_bytes=9000)
+    # A new container is started, when the next file does not fit
+    assert len(list(storage_dir.glob('audio_*.bin'))) == 2
+    reader = PackedAudioReader(storage_dir)
+    assert reader.sample_rate == 16000
+    for path in audio_files:
+        assert path in reader
+        # The wav files are 16 bit, i.e. int16 is lossless
+        np.testing.assert_equal(reader.read(path), read(path))
+        np.testing.assert_equal(
+            reader.read(path, 100, 300), read(path)[:, 100:300])
+
+
+def test_zero_copy(audio_files, tmp_path):
+    storage_dir = pack_audio(audio_files, tmp_path / 'packed')
+    reader = PackedAudioReader(storage_dir, dtype=None)
+    audio = reader.read(audio_files[1], 10, 20)
+    assert audio.dtype == np.int16
+    assert audio.shape == (2, 10)
+    assert not audio.flags.owndata
+    assert not audio.flags.writeable
+    np.testing.assert_equal(
+        audio / 2 ** 15, read(audio_files[1])[:, 10:20])
+
+
+def test_float32(audio_files, tmp_path):
+    storage_dir = pack_audio(audio_files, tmp_path / 'packed', dtype='float32')
+    reader = PackedAudioReader(storage_dir, dtype=np.float32)
+    np.testing.assert_allclose(
+        reader.read(audio_files[0]), read(audio_files[0]), rtol=1e-6)
+
+
+def test_call_like_audio_reader(audio_files, tmp_path):
+    reader = PackedAudioReader(pack_audio(audio_files, tmp_path / 'packed'))
+    example = reader({
+        'audio_path': audio_files[0],
+        'audio_start_samples': 10,
+        'audio_stop_samples': 50,
+    })
+    np.testing.assert_equal(example['audio_data'], read(audio_files[0])[:, 10:50])
+
+    # Lists of paths are concatenated along the time axis
+    example = reader({
+        'audio_path': [audio_files[0], audio_files[0]],
+        'audio_start_samples': [0, 100],
+        'audio_stop_samples': [10, 120],
+    })
+    assert example['audio_data'].shape == (1, 30)
+
+    restored = pickle.loads(pickle.dumps(reader))
+    np.testing.assert_equal(
+        restored.read(audio_files[2]), reader.read(audio_files[2]))
+
+
+def test_extend(audio_files, tmp_path):
+    storage_dir = tmp_path / 'packed'
+    pack_audio(audio_files[:1], storage_dir)
+    calls = []
+
+    def read_fn(path, sample_rate):
+        calls.append(path)
+        return read(path), 16000
+
+    pack_audio(audio_files, storage_dir, read_fn=read_fn)
+    # Already packed files are skipped
+    assert calls == [str(p) for p in audio_files[1:]]
+    reader = PackedAudioReader(storage_dir)
+    for path in audio_files:
+        np.testing.assert_equal(reader.read(path), read(path))
+
+    with pytest.raises(AssertionError):
+        pack_audio(audio_files, storage_dir, sample_rate=8000)
+
+
+def test_resampled(audio_files, tmp_path):
+    def read_fn(path, sample_rate):
+        # Decimation from 32 kHz as stand-in for the resampling
+        return read(path)[:, ::2], 32000
+
+    storage_dir = pack_audio(audio_files, tmp_path / 'packed', read_fn=read_fn)
+    reader = PackedAudioReader(storage_dir)
+    assert reader.files[str(audio_files[0])]['source_sample_rate'] == 32000
+    # The start and stop samples are at the sample rate of the file
+    np.testing.assert_equal(
+        reader.read(audio_files[0], 200, 600), read(audio_files[0])[:, 200:600:2])
+    example = reader({
+        'audio_path': audio_files[1],
+        'audio_start_samples': 100,
+    })
+    np.testing.assert_equal(example['audio_data'], read(audio_files[1])[:, 100::2])
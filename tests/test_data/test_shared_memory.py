@@ -0,0 +1,150 @@
+import functools
+import gc
+import os
+import pickle
+
+import numpy as np
+import pytest
+import torch
+import lazy_dataset
+
+import padertorch as pt
+from padertorch.data.shared_memory import (
+    SharedArray, to_shared_memory, from_shared_memory
+)
+
+
+def get_example(rng):
+    return {
+        'stft': (rng.randn(2, 6, 100, 257)
+                 + 1j * rng.randn(2, 6, 100, 257)).astype(np.complex64),
+        'features': rng.randn(2, 200, 80).astype(np.float32),
+        'num_frames': np.array([100, 90]),
+        'example_id': ['a', 'b'],
+    }
+
+
+def test_pickle_round_trip(tmp_path):
+    array = np.random.RandomState(0).randn(3, 4).astype(np.float32)
+    handle = SharedArray(array, directory=tmp_path)
+    data = pickle.dumps(handle)
+    assert len(data) < 1000
+
+    # After pickling the sending handle doesn't delete the file anymore.
+    del handle
+    gc.collect()
+    assert len(list(tmp_path.iterdir())) == 1
+
+    received = pickle.loads(data)
+    np.testing.assert_equal(received.numpy(), array)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unresolved_handle_deletes_file(tmp_path):
+    handle = SharedArray(np.ones(3), directory=tmp_path)
+    assert len(list(tmp_path.iterdir())) == 1
+    del handle
+    gc.collect()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_to_and_from_shared_memory(tmp_path):
+    example = get_example(np.random.RandomState(0))
+    shared = to_shared_memory(example, directory=tmp_path)
+    assert isinstance(shared['stft'], SharedArray)
+    assert isinstance(shared['features'], SharedArray)
+    # Small arrays and strings stay as they are
+    assert isinstance(shared['num_frames'], np.ndarray)
+    assert shared['example_id'] == ['a', 'b']
+
+    restored = from_shared_memory(shared)
+    for key in example:
+        np.testing.assert_equal(restored[key], example[key])
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_example_to_device(tmp_path):
+    example = get_example(np.random.RandomState(0))
+    shared = to_shared_memory(example, directory=tmp_path)
+    on_device = pt.data.example_to_device(shared, 'cpu')
+    assert torch.is_tensor(on_device['features'])
+    np.testing.assert_equal(
+        on_device['features'].numpy(), example['features'])
+    # Complex arrays stay numpy arrays
+    assert isinstance(on_device['stft'], np.ndarray)
+    np.testing.assert_equal(on_device['stft'], example['stft'])
+    assert list(tmp_path.iterdir()) == []
+
+
+def get_shared_example(index, directory):
+    return to_shared_memory(
+        get_example(np.random.RandomState(index)), directory=directory)
+
+
+@pytest.mark.parametrize('backend', ['concurrent_mp', 'mp'])
+def test_prefetch(tmp_path, monkeypatch, backend):
+    if backend == 'mp':
+        pytest.importorskip('pathos')
+    monkeypatch.setenv('OMP_NUM_THREADS', '1')
+    monkeypatch.setenv('MKL_NUM_THREADS', '1')
+
+    ds = lazy_dataset.new(list(range(4))).map(
+        functools.partial(get_shared_example, directory=str(tmp_path)))
+    for index, example in enumerate(ds.prefetch(2, 2, backend=backend)):
+        assert isinstance(example['stft'], SharedArray)
+        example = pt.data.example_to_device(example)
+        np.testing.assert_equal(
+            example['features'].numpy(),
+            get_example(np.random.RandomState(index))['features'],
+        )
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_copy_keeps_the_ownership(tmp_path):
+    import copy
+    handle = SharedArray(np.ones(3), directory=tmp_path)
+    assert copy.copy(handle) is handle
+    assert copy.deepcopy({'a': handle})['a'] is handle
+    np.testing.assert_equal(handle.numpy(), np.ones(3))
+    assert list(tmp_path.iterdir()) == []
+
+
+_DROPPED_HANDLES_SCRIPT = """
+import multiprocessing
+import pickle
+import numpy as np
+from padertorch.data.shared_memory import SharedArray
+
+def work(index):
+    # The pickled handle, that the consumer never unpickles (e.g. a
+    # prefetched batch, when the training stops early).
+    return pickle.dumps(SharedArray(np.full(10, index)))
+
+with multiprocessing.get_context('fork').Pool(2) as pool:
+    dropped = pool.map(work, range(4))
+"""
+
+
+def test_dropped_handles_do_not_leak():
+    import subprocess
+    import sys
+    from pathlib import Path
+    from padertorch.data.shared_memory import _default_directory
+    directory = Path(_default_directory())
+    before = set(directory.glob('padertorch_*'))
+    try:
+        subprocess.run(
+            [sys.executable, '-c', _DROPPED_HANDLES_SCRIPT], check=True,
+            env={
+                **os.environ,
+                'PYTHONPATH': os.pathsep.join([
+                    str(Path(__file__).parents[2]),
+                    os.environ.get('PYTHONPATH', ''),
+                ]),
+            },
+        )
+        leaked = set(directory.glob('padertorch_*')) - before
+        assert leaked == set(), leaked
+    finally:
+        for path in set(directory.glob('padertorch_*')) - before:
+            path.unlink()
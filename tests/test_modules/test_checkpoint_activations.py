@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import torch
+
+from padertorch.modules.dual_path_rnn import DPRNN
+from padertorch.modules.wavenet.wavenet import WaveNet
+from padertorch.contrib.je.modules.conv import CNN1d
+from padertorch.contrib.je.modules.transformer import TransformerStack
+
+
+def get_dprnn(checkpoint):
+    return DPRNN(
+        feat_size=4, rnn_size=3, window_length=4, hop_size=2, num_blocks=2,
+        checkpoint=checkpoint,
+    ), (torch.randn(2, 20, 4), torch.tensor([20, 15]))
+
+
+def get_transformer(checkpoint):
+    return TransformerStack(
+        8, 6, 2, 6, 2, bidirectional=True, checkpoint=checkpoint,
+    ), (torch.randn(2, 5, 8),)
+
+
+def get_cnn(checkpoint):
+    return CNN1d(
+        in_channels=3, out_channels=[4, 4, 5], kernel_size=3,
+        residual_connections=[None, 2, None], norm='batch',
+        checkpoint=checkpoint,
+    ), (torch.randn(2, 3, 16),)
+
+
+def get_wavenet(checkpoint):
+    return WaveNet(
+        n_cond_channels=8, upsamp_window=16, upsamp_stride=4, n_layers=4,
+        max_dilation=4, n_residual_channels=8, n_skip_channels=8,
+        checkpoint=checkpoint,
+    ), (torch.randn(2, 8, 10), torch.rand(2, 28) * 2 - 1)
+
+
+@pytest.mark.parametrize('checkpoint', [True, 1, [-1]])
+@pytest.mark.parametrize('get_module', [
+    get_dprnn, get_transformer, get_cnn, get_wavenet,
+])
+def test_checkpoint_activations(get_module, checkpoint):
+    torch.manual_seed(0)
+    reference, inputs = get_module(checkpoint=False)
+    module, _ = get_module(checkpoint=checkpoint)
+    module.load_state_dict(reference.state_dict())
+
+    outputs = []
+    grads = []
+    for m in [reference, module]:
+        out = m(*inputs)[0]
+        out.sum().backward()
+        outputs.append(out.detach().numpy())
+        grads.append({
+            name: p.grad.numpy() for name, p in m.named_parameters()
+            if p.grad is not None
+        })
+
+    np.testing.assert_allclose(outputs[1], outputs[0], rtol=1e-5, atol=1e-6)
+    assert grads[0].keys() == grads[1].keys()
+    assert len(grads[0]) == len(list(reference.parameters()))
+    for name in grads[0]:
+        np.testing.assert_allclose(
+            grads[1][name], grads[0][name], rtol=1e-5, atol=1e-6,
+            err_msg=name,
+        )
+
+    # Without gradient, e.g. in the validation, the module is called
+    # directly.
+    with torch.no_grad():
+        np.testing.assert_allclose(
+            module(*inputs)[0].numpy(), reference(*inputs)[0].numpy(),
+            rtol=1e-5, atol=1e-6,
+        )
@@ -0,0 +1,115 @@
+import threading
+
+import numpy as np
+import pytest
+import tensorboardX.utils
+
+from padertorch.summary.background_writer import BackgroundSummaryWriter
+
+
+class RecordingWriter:
+    def __init__(self, delay_event=None):
+        self.calls = []
+        self.threads = []
+        self.flushed = 0
+        self.closed = False
+        self.delay_event = delay_event
+
+    def add_scalar(self, tag, scalar_value, global_step=None):
+        if self.delay_event is not None:
+            self.delay_event.wait()
+        self.calls.append(('add_scalar', tag, scalar_value, global_step))
+        self.threads.append(threading.current_thread())
+
+    def add_image(self, tag, img_tensor, global_step=None, walltime=None,
+                  dataformats='CHW'):
+        self.calls.append(('add_image', tag, img_tensor.shape, dataformats))
+        self.threads.append(threading.current_thread())
+
+    def flush(self):
+        self.flushed += 1
+
+    def close(self):
+        self.closed = True
+
+
+def test_order():
+    writer = RecordingWriter()
+    with BackgroundSummaryWriter(writer, max_queue_size=4) as background:
+        for step in range(100):
+            background.add_scalar('loss', float(step), step)
+    assert writer.calls == [
+        ('add_scalar', 'loss', float(step), step) for step in range(100)
+    ]
+    assert threading.current_thread() not in writer.threads
+    assert writer.closed
+
+
+def test_flush_and_close_wait_for_the_queue():
+    event = threading.Event()
+    writer = RecordingWriter(delay_event=event)
+    background = BackgroundSummaryWriter(writer)
+    background.add_scalar('a', 1., 0)
+    background.add_scalar('b', 2., 0)
+    assert writer.calls == []
+    event.set()
+    background.flush()
+    assert [call[1] for call in writer.calls] == ['a', 'b']
+    assert writer.flushed == 1
+
+    background.add_scalar('c', 3., 1)
+    background.close()
+    assert [call[1] for call in writer.calls] == ['a', 'b', 'c']
+    assert writer.closed
+
+    # A second close is a no-op, an add after the close fails.
+    background.close()
+    with pytest.raises(AssertionError, match='closed'):
+        background.add_scalar('d', 4., 2)
+
+
+def test_exception_propagation():
+    writer = RecordingWriter()
+    background = BackgroundSummaryWriter(writer)
+    background.add_scalar('a', 1., step=0)
+    with pytest.raises(TypeError, match="unexpected keyword argument 'step'"):
+        background.flush()
+    # The exception is raised once, the following calls are written.
+    background.add_scalar('b', 2., 1)
+    background.close()
+    assert writer.calls == [('add_scalar', 'b', 2., 1)]
+    assert writer.closed
+
+    # An exception in the thread is raised by the next add.
+    background = BackgroundSummaryWriter(writer)
+    background.add_scalar('a', 1., step=0)
+    background._queue.join()
+    with pytest.raises(TypeError):
+        background.add_scalar('b', 2., 1)
+    # The exception is raised by close and the writer is closed.
+    background.add_scalar('c', 1., step=0)
+    writer.closed = False
+    with pytest.raises(TypeError):
+        background.close()
+    assert writer.closed
+
+    # The writer has no add_audio.
+    with BackgroundSummaryWriter(writer) as background:
+        with pytest.raises(AttributeError):
+            background.add_audio
+
+
+def test_figure_is_rasterized_in_the_calling_thread(monkeypatch):
+    threads = []
+
+    def figure_to_image(figure, close=True):
+        threads.append(threading.current_thread())
+        return np.zeros((3, 4, 5))
+
+    monkeypatch.setattr(tensorboardX.utils, 'figure_to_image', figure_to_image)
+    writer = RecordingWriter()
+    with BackgroundSummaryWriter(writer) as background:
+        background.add_figure('figure', object(), 0)
+    assert threads == [threading.current_thread()]
+    assert writer.calls == [('add_image', 'figure', (3, 4, 5), 'CHW')]
+    assert writer.threads[0] is not threading.current_thread()
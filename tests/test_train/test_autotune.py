@@ -0,0 +1,92 @@
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+
+import paderbox as pb
+import padertorch as pt
+
+
+class Model(pt.Model):
+    def __init__(self, max_batch_size=None):
+        super().__init__()
+        self.l = torch.nn.Linear(3, 1)
+        self.max_batch_size = max_batch_size
+
+    def forward(self, example):
+        x = torch.as_tensor(example['x'])
+        if self.max_batch_size is not None \
+                and x.shape[0] > self.max_batch_size:
+            raise RuntimeError('CUDA out of memory. Tried to allocate 1 GiB')
+        return self.l(x)
+
+    def review(self, example, output):
+        target = torch.as_tensor(example['y'])
+        return {'loss': torch.nn.functional.mse_loss(output, target)}
+
+
+def get_train_iterator(batch_size):
+    rng = np.random.RandomState(0)
+    examples = []
+    for _ in range(20):
+        x = rng.randn(batch_size, 3).astype(np.float32)
+        y = x @ np.array([[1.], [-2.], [3.]], dtype=np.float32) + 0.5
+        examples.append({'x': x, 'y': y})
+    return examples
+
+
+def get_trainer(storage_dir, max_batch_size=None):
+    return pt.Trainer(
+        Model(max_batch_size),
+        optimizer=pt.optimizer.SGD(),
+        storage_dir=str(storage_dir),
+        stop_trigger=(1, 'epoch'),
+    )
+
+
+def test_batch_size_sweep():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        t = get_trainer(tmp_dir, max_batch_size=8)
+        state_dict = {k: v.clone() for k, v in t.model.state_dict().items()}
+        results = pt.train.autotune.batch_size_sweep(
+            t, get_train_iterator, device='cpu', num_steps=5,
+        )
+        assert [r['batch_size'] for r in results] == [1, 2, 4, 8, 16]
+        assert [r['out_of_memory'] for r in results] == 4 * [False] + [True]
+        assert all([r['examples_per_second'] > 0 for r in results[:-1]])
+
+        # The state of the trainer is restored and nothing is written.
+        assert (t.iteration, t.epoch) == (-1, -1), (t.iteration, t.epoch)
+        for k, v in t.model.state_dict().items():
+            np.testing.assert_equal(v.numpy(), state_dict[k].numpy())
+        assert list(Path(tmp_dir).iterdir()) == []
+
+
+def test_lr_range_test():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        t = get_trainer(tmp_dir)
+        result = pt.train.autotune.lr_range_test(
+            t, get_train_iterator(8), min_lr=1e-5, max_lr=100.,
+            num_steps=60, device='cpu',
+        )
+        # The training diverges for large learning rates and stops early.
+        assert len(result['losses']) < 60, len(result['losses'])
+        assert len(result['lrs']) == len(result['losses'])
+        assert 1e-5 < result['suggested_lr'] <= result['min_loss_lr'] < 100.
+        assert t.optimizer.optimizer.param_groups[0]['lr'] == 1e-3
+
+
+def test_autotune():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        t = get_trainer(Path(tmp_dir) / 'train', max_batch_size=4)
+        report = pt.train.autotune.autotune(
+            t, get_train_iterator, storage_dir=tmp_dir,
+            batch_sizes=[2, 4, 8], batch_size_steps=5, lr_steps=30,
+            device='cpu',
+        )
+        assert report['batch_size'] in [2, 4], report['batch_size']
+        assert report['config_patch'] == {
+            'optimizer': {'lr': report['lr_range_test']['suggested_lr']}}
+        assert pb.io.load_json(Path(tmp_dir) / 'autotune.json') == report
@@ -0,0 +1,139 @@
+import socket
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+import padertorch as pt
+import paderbox as pb
+
+
+class Model(pt.Model):
+    def __init__(self):
+        super().__init__()
+        self.l = torch.nn.Linear(5, 3)
+
+    def forward(self, inputs):
+        return self.l(inputs['x'])
+
+    def review(self, inputs, outputs):
+        return {'loss': torch.nn.CrossEntropyLoss()(
+            outputs, inputs['y'].long()
+        )}
+
+
+def get_dataset(num_examples, seed):
+    rng = np.random.RandomState(seed)
+    return [
+        {
+            'x': rng.randn(4, 5).astype(np.float32),
+            'y': rng.randint(0, 3, size=4),
+        }
+        for _ in range(num_examples)
+    ]
+
+
+def _train(rank, world_size, port, storage_dir, result_dir):
+    dist.init_process_group(
+        backend='gloo', init_method=f'tcp://127.0.0.1:{port}',
+        rank=rank, world_size=world_size,
+    )
+    try:
+        torch.manual_seed(rank)  # The master broadcasts the parameters
+        t = pt.DistributedTrainer(
+            Model(),
+            optimizer=pt.optimizer.SGD(lr=0.1),
+            storage_dir=storage_dir,
+            stop_trigger=(2, 'epoch'),
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+            virtual_minibatch_size=2,
+        )
+        assert t.is_master == (rank == 0)
+        t.register_validation_hook(get_dataset(5, 1), max_checkpoints=1)
+        t.train(get_dataset(9, 0), progress_bar=False, device='cpu')
+        torch.save(
+            {
+                'model': t.model.state_dict(),
+                'ckpt_ranking': t.hooks[-1].ckpt_ranking,
+            },
+            str(Path(result_dir) / f'rank_{rank}.pth')
+        )
+    finally:
+        dist.destroy_process_group()
+
+
+def get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_distributed_trainer():
+    world_size = 2
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage_dir = Path(tmp_dir) / 'storage_dir'
+        result_dir = Path(tmp_dir)
+        mp.spawn(
+            _train,
+            args=(world_size, get_free_port(), str(storage_dir),
+                  str(result_dir)),
+            nprocs=world_size,
+        )
+
+        results = [
+            pt.train.checkpoint.torch_load(result_dir / f'rank_{rank}.pth')
+            for rank in range(world_size)
+        ]
+        pb.utils.nested.nested_op(
+            lambda x, y: np.testing.assert_equal(
+                pt.utils.to_numpy(x), pt.utils.to_numpy(y)),
+            results[0]['model'], results[1]['model'],
+        )
+        # The validation summary is reduced, hence identical rankings.
+        assert results[0]['ckpt_ranking'] == results[1]['ckpt_ranking']
+
+        # Only the master writes files.
+        assert len(list(storage_dir.glob('*tfevents*'))) == 1
+        checkpoints = {f.name for f in (storage_dir / 'checkpoints').glob('*')}
+        # 9 examples, 2 processes => 4 iterations per epoch
+        assert checkpoints == {
+            'ckpt_latest.pth', 'ckpt_best_loss.pth', 'ckpt_8.pth',
+            *[results[0]['ckpt_ranking'][0][0]]
+        }, checkpoints
+
+
+class _Rank1Of2(pt.DistributedTrainer):
+    rank = 1
+    world_size = 2
+
+
+def test_shard(monkeypatch):
+    import lazy_dataset
+    # Required by lazy_dataset for the prefetch with multiple threads.
+    monkeypatch.setenv('OMP_NUM_THREADS', '1')
+    monkeypatch.setenv('MKL_NUM_THREADS', '1')
+    t = object.__new__(_Rank1Of2)
+    ds = lazy_dataset.new(list(range(7)))
+
+    assert list(t.shard(ds)) == [1, 3, 5]
+    assert list(t.shard(ds, drop_last=True)) == [1, 3, 5]
+    assert list(t.shard(list(range(7)), drop_last=True)) == [1, 3, 5]
+
+    # Each process would load the complete dataset and the reshuffled
+    # shards would overlap.
+    for not_indexable in [ds.shuffle(reshuffle=True), ds.prefetch(2, 4)]:
+        with pytest.raises(ValueError, match='shard the dataset before'):
+            t.shard(not_indexable)
+
+    # A dataset that is built on a shard is not sharded again.
+    sharded = t.shard(ds, drop_last=True).shuffle(reshuffle=True)
+    sharded = sharded.prefetch(2, 4)
+    assert t.shard(sharded, drop_last=True) is sharded
+    assert sorted(sharded) == [1, 3, 5]
+    with pytest.raises(ValueError, match='drop_last=False'):
+        t.shard(t.shard(ds).prefetch(2, 4), drop_last=True)
@@ -184,6 +184,180 @@ def test_summary_hook():
         assert events == expect, pretty([events, expect])
 
 
+def test_summary_hook_accumulate_on_device():
+    reviews = [
+        {
+            'loss': torch.tensor(float(i)),
+            'losses': {'ce': torch.tensor(2. * i)},
+            'scalars': {
+                'a': 2,
+                'b': torch.tensor([i, i + 1]),
+                'c': torch.tensor(i % 2 == 0),
+            },
+            'histograms': {'h': torch.arange(10 * i, 10 * i + 10)},
+        }
+        for i in range(20)
+    ]
+    hook = pt.train.hooks.SummaryHook((1, 'iteration'))
+    accumulate_hook = pt.train.hooks.SummaryHook(
+        (1, 'iteration'), accumulate_on_device=True, max_histogram_size=50,
+    )
+    for review in reviews:
+        hook.update_summary(review)
+        accumulate_hook.update_summary(review)
+
+    assert len(accumulate_hook.summary['scalars']['loss']) == 0
+    accumulate_hook.transfer_accumulators()
+    for key in ['loss', 'ce', 'a', 'b', 'c']:
+        for reduce in [np.mean, np.sum, np.var]:
+            np.testing.assert_allclose(
+                reduce(accumulate_hook.summary['scalars'][key]),
+                reduce(hook.summary['scalars'][key]),
+                err_msg=f'{key}: {reduce.__name__}',
+            )
+    # The accumulated scalars are not repeated count times.
+    assert isinstance(
+        accumulate_hook.summary['scalars']['loss'],
+        pt.summary.streaming.StreamingMean,
+    )
+
+    # The reservoir is a sample without replacement of all values.
+    histogram = accumulate_hook.summary['histograms']['h']
+    assert len(histogram) == 50, len(histogram)
+    assert set(histogram) <= set(range(200)), histogram
+    assert len(set(histogram)) == 50, histogram
+    assert max(histogram) >= 50, histogram
+
+    # A second transfer does not duplicate the values.
+    accumulate_hook.transfer_accumulators()
+    assert len(accumulate_hook.summary['histograms']['h']) == 50
+
+
+def test_summary_hook_histogram_reservoir():
+    hook = pt.train.hooks.SummaryHook((1, 'iteration'), max_histogram_size=50)
+    for i in range(20):
+        hook.update_summary({
+            'loss': torch.tensor(1.),
+            'histograms': {'h': torch.arange(10 * i, 10 * i + 10)},
+        })
+    histogram = hook.summary['histograms']['h']
+    assert len(histogram) == 50, len(histogram)
+    assert len(set(histogram)) == 50, histogram
+    # A uniform sample of all values and not the last values.
+    assert min(histogram) < 150, histogram
+
+    # The merge of the samples of two workers is a sample of all values.
+    rng = np.random.RandomState(0)
+    merged = []
+    for _ in range(100):
+        samples = []
+        for value, count in [(0, 900), (1, 100)]:
+            sample = pt.summary.streaming.ReservoirSample(
+                10, seed=rng.randint(2 ** 31))
+            sample.update(np.full(count, value))
+            samples.append({'histograms': {'h': sample}})
+        summary = pt.train.hooks.SummaryHook.merge_summaries(samples)
+        assert summary['histograms']['h'].count == 1000
+        merged.extend(summary['histograms']['h'])
+    assert len(merged) == 1000, len(merged)
+    np.testing.assert_allclose(np.mean(merged), 0.1, atol=0.03)
+
+
+@pytest.mark.parametrize('accumulate_on_device', [False, True])
+def test_summary_hook_streaming_statistics(accumulate_on_device):
+    rng = np.random.RandomState(0)
+    reviews = [
+        {
+            'loss': torch.tensor(rng.randn()),
+            'scalars': {
+                'a': 2,
+                'b': torch.tensor(rng.randn(3)),
+            },
+            'histograms': {
+                'h': torch.tensor(rng.randn(100) * 10 ** rng.randint(-3, 3)),
+                'h_list': rng.randn(5).tolist(),
+            },
+        }
+        for i in range(20)
+    ]
+
+    def get_events(hook):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            trainer = types.SimpleNamespace(
+                iteration=10,
+                writer=tensorboardX.SummaryWriter(tmp_dir),
+            )
+            for review in reviews:
+                hook.update_summary(review)
+            hook.transfer_accumulators()
+            # The base implementation of modify_summary
+            hook.summary = pt.Model.modify_summary(None, hook.summary)
+            hook.dump_summary(trainer)
+            trainer.writer.close()
+            event_file, = Path(tmp_dir).glob('*tfevents*')
+            events = list(pt.summary.tfevents.load_events_as_dict(event_file))
+        return {
+            e['summary']['value'][0]['tag']: e['summary']['value'][0]
+            for e in events if 'summary' in e
+        }
+
+    expected = get_events(pt.train.hooks.SummaryHook((1, 'iteration')))
+    events = get_events(pt.train.hooks.SummaryHook(
+        (1, 'iteration'),
+        streaming_statistics=True,
+        accumulate_on_device=accumulate_on_device,
+    ))
+    assert events.keys() == expected.keys(), (events.keys(), expected.keys())
+    for tag in ['training/loss', 'training/a', 'training/b']:
+        np.testing.assert_allclose(
+            events[tag]['simple_value'], expected[tag]['simple_value'],
+            rtol=1e-6, err_msg=tag,
+        )
+    for tag in ['training/h', 'training/h_list']:
+        histo, expected_histo = events[tag]['histo'], expected[tag]['histo']
+        assert histo.keys() == expected_histo.keys(), (histo, expected_histo)
+        for key in histo.keys():
+            np.testing.assert_allclose(
+                histo[key], expected_histo[key], rtol=1e-6,
+                err_msg=f'{tag}: {key}',
+            )
+
+
+@pytest.mark.parametrize('streaming_statistics', [False, True])
+@pytest.mark.parametrize('accumulate_on_device', [False, True])
+def test_summary_hook_non_finite_histogram(
+        accumulate_on_device, streaming_statistics
+):
+    hook = pt.train.hooks.SummaryHook(
+        (1, 'iteration'),
+        accumulate_on_device=accumulate_on_device,
+        streaming_statistics=streaming_statistics,
+    )
+    # e.g. the grad_norm of a step, that the GradScaler skipped.
+    for value in [1., float('inf'), 2., float('nan')]:
+        hook.update_summary({
+            'loss': torch.tensor(1.),
+            'histograms': {'grad_norm_': torch.tensor([value])},
+        })
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        trainer = types.SimpleNamespace(
+            iteration=10, writer=tensorboardX.SummaryWriter(tmp_dir),
+        )
+        hook.transfer_accumulators()
+        hook.summary = pt.Model.modify_summary(None, hook.summary)
+        hook.dump_summary(trainer)
+        trainer.writer.close()
+        event_file, = Path(tmp_dir).glob('*tfevents*')
+        histo, = [
+            e['summary']['value'][0]['histo']
+            for e in pt.summary.tfevents.load_events_as_dict(event_file)
+            if 'summary' in e
+            and e['summary']['value'][0]['tag'] == 'training/grad_norm_'
+        ]
+    assert (histo['min'], histo['max'], histo['num'], histo['sum']) == (
+        1, 2, 2, 3), histo
+
+
 def test_summary_hook_fail_duplicate_key():
     hook = pt.train.hooks.SummaryHook((1, 'iteration'))
 
@@ -279,3 +453,41 @@ def test_lr_annealing_hook():
         values.append(trainer.optimizer.optimizer.param_groups[0]['lr'])
     expected_values = np.linspace(0, .1, 6).tolist() + np.linspace(.08, 0, 5).tolist()
     pb.testing.assert_almost_equal(values, expected_values)
+
+
+def test_back_off_removes_newer_checkpoints(tmp_path):
+    class DummyTrainer:
+        iteration = 50
+        checkpoint_dir = tmp_path
+        is_master = True
+        optimizer = MagicMock()
+        optimizer.optimizer.param_groups = [{'lr': .1}]
+
+        def wait_for_checkpoint_writes(self):
+            pass
+
+        def default_checkpoint_path(self):
+            return self.checkpoint_dir / f'ckpt_{self.iteration}.pth'
+
+        def load_checkpoint(self):
+            pass
+
+    hook = pt.train.hooks.BackOffValidationHook(
+        (10, 'iteration'), [], n_back_off=1, back_off_patience=2)
+    # Sorted by the score, the best checkpoint is the first.
+    hook.ckpt_ranking = [
+        ('ckpt_20.pth', 1.), ('ckpt_10.pth', 2.), ('ckpt_40.pth', 3.),
+        ('ckpt_30.pth', 4.), ('ckpt_50.pth', 5.),
+    ]
+    for ckpt, _ in hook.ckpt_ranking:
+        (tmp_path / ckpt).touch()
+    hook._back_off(DummyTrainer())
+
+    # The checkpoints after the best are removed, except the latest.
+    assert hook.ckpt_ranking == [
+        ('ckpt_20.pth', 1.), ('ckpt_10.pth', 2.), ('ckpt_50.pth', 5.)]
+    assert sorted(p.name for p in tmp_path.glob('ckpt_*.pth')) == [
+        'ckpt_10.pth', 'ckpt_20.pth', 'ckpt_50.pth', 'ckpt_latest.pth']
+    assert (tmp_path / 'ckpt_latest.pth').resolve().name == 'ckpt_20.pth'
+    assert DummyTrainer.optimizer.optimizer.param_groups[0]['lr'] == \
+        pytest.approx(.01)
@@ -1,3 +1,5 @@
+import numpy as np
+import pytest
 import padertorch as pt
 import torch
 
@@ -15,3 +17,63 @@ def test_frad_norm():
     )
     assert grad_norm == grad_norm_ref and grad_norm_ref > 0., \
         (grad_norm, grad_norm_ref)
+
+
+def _train(optimizer, steps=3):
+    torch.manual_seed(0)
+    model = torch.nn.Sequential(
+        torch.nn.Linear(16, 8), torch.nn.ReLU(), torch.nn.Linear(8, 4)
+    )
+    optimizer.set_parameters(model.parameters())
+    grad_norms = []
+    for _ in range(steps):
+        optimizer.zero_grad()
+        model(torch.randn(5, 16)).pow(2).sum().backward()
+        grad_norms.append(optimizer.clip_grad())
+        optimizer.step()
+    return model, grad_norms
+
+
+@pytest.mark.parametrize('optimizer_cls,kwargs', [
+    (pt.optimizer.Adam, {'foreach': True}),
+    (pt.optimizer.Adam, {'contiguous_grads': True}),
+    (pt.optimizer.Adam, {'foreach': True, 'contiguous_grads': True}),
+    (pt.optimizer.SGD, {'foreach': True, 'momentum': 0.9}),
+    (pt.optimizer.SGD, {'contiguous_grads': True, 'momentum': 0.9}),
+])
+def test_foreach_and_contiguous_grads(optimizer_cls, kwargs):
+    reference_kwargs = {k: v for k, v in kwargs.items()
+                        if k not in ['foreach', 'contiguous_grads']}
+    # A small gradient_clipping, so the gradients are clipped.
+    reference, reference_grad_norms = _train(
+        optimizer_cls(gradient_clipping=1, **reference_kwargs))
+    optimizer = optimizer_cls(gradient_clipping=1, **kwargs)
+    model, grad_norms = _train(optimizer)
+
+    np.testing.assert_allclose(grad_norms, reference_grad_norms, rtol=1e-6)
+    assert reference_grad_norms[0] > 1, reference_grad_norms
+    for p, p_ref in zip(model.parameters(), reference.parameters()):
+        np.testing.assert_allclose(
+            p.detach().numpy(), p_ref.detach().numpy(), rtol=1e-5, atol=1e-7)
+
+    if kwargs.get('contiguous_grads', False):
+        # The backward accumulates into the views of the buffer, i.e. the
+        # buffer is not reallocated.
+        buffer, = optimizer._grad_buffers
+        for p in model.parameters():
+            assert p.grad._base is buffer
+
+
+def test_contiguous_grads_reallocate():
+    optimizer = pt.optimizer.Adam(contiguous_grads=True)
+    model, _ = _train(optimizer, steps=1)
+    buffer, = optimizer._grad_buffers
+    model.double()
+    model(torch.randn(5, 16, dtype=torch.float64)).sum().backward()
+    grads = [p.grad.clone() for p in model.parameters()]
+    optimizer.clip_grad()
+    new_buffer, = optimizer._grad_buffers
+    assert new_buffer is not buffer and new_buffer.dtype == torch.float64
+    for p, grad in zip(model.parameters(), grads):
+        assert p.grad._base is new_buffer
+        np.testing.assert_allclose(p.grad.numpy(), grad.numpy())
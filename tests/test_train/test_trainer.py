@@ -629,3 +629,746 @@ def test_released_tensors():
         )
         t.register_hook(ReleaseTestHook())  # This hook will do the tests
         t.train(tr_dataset)
+
+
+def test_prefetch_to_device():
+    """
+    Test idea:
+
+    Prefetching the examples to the device must not change the training,
+    hence the parameters after the training have to be identical to the
+    parameters of a training without prefetching.
+    """
+    it_tr, it_dt = get_dataset()
+    it_tr = it_tr[:4]
+    it_dt = it_dt[:2]
+
+    state_dicts = []
+    for prefetch_to_device in [0, 2]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            torch.manual_seed(0)
+            t = pt.Trainer(
+                Model(),
+                optimizer=pt.optimizer.Adam(),
+                storage_dir=str(tmp_dir),
+                stop_trigger=(2, 'epoch'),
+                summary_trigger=(1, 'epoch'),
+                checkpoint_trigger=(1, 'epoch'),
+                prefetch_to_device=prefetch_to_device,
+            )
+            t.register_validation_hook(
+                validation_iterator=it_dt, max_checkpoints=None
+            )
+            t.train(train_iterator=it_tr, progress_bar=False)
+            state_dicts.append(pb.utils.nested.nested_op(
+                pt.utils.to_numpy, t.state_dict()['model']
+            ))
+
+    np.testing.assert_equal(*state_dicts)
+
+
+def test_mixed_precision_bfloat16():
+    it_tr, it_dt = get_dataset()
+    it_tr = it_tr[:4]
+    it_dt = it_dt[:2]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        t = pt.Trainer(
+            Model(),
+            optimizer=pt.optimizer.Adam(),
+            storage_dir=str(tmp_dir),
+            stop_trigger=(2, 'epoch'),
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+            mixed_precision='bfloat16',
+        )
+        t.register_validation_hook(
+            validation_iterator=it_dt, max_checkpoints=None
+        )
+
+        model_out = []
+
+        class SpyHook(pt.train.hooks.Hook):
+            def post_step(self, trainer, example, model_output, review):
+                model_out.append(model_output)
+
+        t.register_hook(SpyHook())
+        t.train(train_iterator=it_tr, progress_bar=False, device='cpu')
+
+        assert len(model_out) == 8, len(model_out)
+        for out in model_out:
+            assert out.dtype == torch.bfloat16, out.dtype
+        for parameter in t.model.parameters():
+            assert parameter.dtype == torch.float32, parameter.dtype
+        assert 'grad_scaler' not in t.state_dict()
+
+
+def test_mixed_precision_float16_on_cpu():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        t = pt.Trainer(
+            Model(),
+            optimizer=pt.optimizer.Adam(),
+            storage_dir=str(tmp_dir),
+            mixed_precision='float16',
+        )
+        with pytest.raises(ValueError, match='only supported on GPUs'):
+            t.train(train_iterator=[], progress_bar=False, device='cpu')
+
+
+def test_async_checkpoint():
+    it_tr, it_dt = get_dataset()
+    it_tr = it_tr[:2]
+    it_dt = it_dt[:2]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        t = pt.Trainer(
+            Model(),
+            optimizer=pt.optimizer.Adam(),
+            storage_dir=str(tmp_dir),
+            stop_trigger=(4, 'epoch'),
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+            async_checkpoint=True,
+        )
+        t.register_validation_hook(
+            validation_iterator=it_dt, max_checkpoints=1
+        )
+        t.train(train_iterator=it_tr, progress_bar=False)
+
+        ckpt_dir = tmp_dir / 'checkpoints'
+        ckpt_ranking = torch.load(
+            str(ckpt_dir / 'ckpt_latest.pth')
+        )['hooks']['BackOffValidationHook']['ckpt_ranking']
+        best_ckpt = ckpt_ranking[0][0]
+        assert {f.name for f in ckpt_dir.glob('*')} == {
+            'ckpt_latest.pth', 'ckpt_best_loss.pth', 'ckpt_8.pth', best_ckpt,
+        }, (list(ckpt_dir.glob('*')), ckpt_ranking)
+        assert (ckpt_dir / 'ckpt_latest.pth').resolve().name == 'ckpt_8.pth'
+        assert (ckpt_dir / 'ckpt_best_loss.pth').resolve().name == best_ckpt
+
+        event_file, = tmp_dir.glob('*tfevents*')
+        tags = {
+            event['summary']['value'][0]['tag']
+            for event in load_events_as_dict(event_file)
+            if 'summary' in event
+        }
+        assert 'training_timings/time_per_checkpoint_snapshot' in tags, tags
+        assert 'training_timings/time_per_checkpoint_write' in tags, tags
+
+
+class FrozenEmbeddingModel(Model):
+    def __init__(self):
+        super().__init__()
+        self.frozen = torch.nn.Linear(28 * 28, 10)
+        self.frozen.requires_grad_(False)
+
+    def forward(self, inputs):
+        image = torch.reshape(torch.as_tensor(inputs['image']), [-1])
+        return self.l(image) + self.frozen(image)
+
+
+@pytest.mark.parametrize('async_checkpoint', [False, True])
+def test_deduplicate_checkpoints(async_checkpoint):
+    from padertorch.train.checkpoint import (
+        read_checkpoint, tensor_blob_digests, tensor_digest
+    )
+    it_tr, it_dt = get_dataset()
+    it_tr = it_tr[:2]
+    it_dt = it_dt[:2]
+
+    def get_trainer(stop_trigger, max_checkpoints=None):
+        t = pt.Trainer(
+            FrozenEmbeddingModel(),
+            optimizer=pt.optimizer.Adam(),
+            storage_dir=str(tmp_dir),
+            stop_trigger=stop_trigger,
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+            async_checkpoint=async_checkpoint,
+            deduplicate_checkpoints=True,
+        )
+        t.register_validation_hook(
+            validation_iterator=it_dt, max_checkpoints=max_checkpoints
+        )
+        return t
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        t = get_trainer((3, 'epoch'))
+        t.train(train_iterator=it_tr, progress_bar=False)
+        t = get_trainer((5, 'epoch'))
+        t.train(train_iterator=it_tr, resume=True, progress_bar=False)
+
+        ckpt_dir = tmp_dir / 'checkpoints'
+        frozen_digest = tensor_digest(t.model.frozen.weight)
+        checkpoints = [
+            ckpt for ckpt in ckpt_dir.glob('ckpt_*.pth')
+            if not ckpt.is_symlink()
+        ]
+        assert len(checkpoints) == 6, checkpoints
+        digests = set()
+        for ckpt in checkpoints:
+            ckpt_digests = tensor_blob_digests(torch.load(str(ckpt)))
+            assert frozen_digest in ckpt_digests, ckpt
+            digests |= ckpt_digests
+        # The frozen weight is written once, the trained weight
+        # (and the optimizer state) changes with each checkpoint.
+        assert {
+            blob.name for blob in (ckpt_dir / 'blobs').iterdir()
+        } == {f'{digest}.pth' for digest in digests}
+        assert len(digests) < 6 * 4, len(digests)
+
+        state_dict = read_checkpoint(ckpt_dir / 'ckpt_latest.pth')
+        assert state_dict['iteration'] == 10, state_dict['iteration']
+        for k, v in t.model.state_dict().items():
+            np.testing.assert_equal(
+                state_dict['model'][k].numpy(), v.numpy(), err_msg=k
+            )
+
+        # The ValidationHook deletes the blobs of stale checkpoints.
+        t = get_trainer((6, 'epoch'), max_checkpoints=1)
+        t.train(train_iterator=it_tr, resume=True, progress_bar=False)
+        checkpoints = [
+            ckpt for ckpt in ckpt_dir.glob('ckpt_*.pth')
+            if not ckpt.is_symlink()
+        ]
+        digests = set.union(*[
+            tensor_blob_digests(torch.load(str(ckpt)))
+            for ckpt in checkpoints
+        ])
+        assert {
+            blob.name for blob in (ckpt_dir / 'blobs').iterdir()
+        } == {f'{digest}.pth' for digest in digests}
+
+
+@pytest.mark.parametrize('background_summary_writer', [False, True])
+def test_accumulate_summary_on_device(background_summary_writer):
+    it_tr, it_dt = get_dataset()
+    it_tr = it_tr[:4]
+    it_dt = it_dt[:2]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        t = pt.Trainer(
+            Model(),
+            optimizer=pt.optimizer.Adam(gradient_clipping=1),
+            storage_dir=str(tmp_dir),
+            stop_trigger=(2, 'epoch'),
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+            accumulate_summary_on_device=True,
+            background_summary_writer=background_summary_writer,
+        )
+        t.register_validation_hook(validation_iterator=it_dt)
+        t.train(train_iterator=it_tr, progress_bar=False)
+
+        event_file, = tmp_dir.glob('*tfevents*')
+        tags = collections.Counter(
+            event['summary']['value'][0]['tag']
+            for event in load_events_as_dict(event_file)
+            if 'summary' in event
+        )
+        for tag, count in [
+            ('training/loss', 2),
+            ('training/grad_norm', 2),
+            ('training/grad_norm_', 2),
+            ('validation/loss', 3),  # validation at start
+        ]:
+            assert tags[tag] == count, (tag, tags)
+
+
+@pytest.mark.parametrize('accumulate_summary_on_device', [True, False])
+def test_non_finite_loss_is_checked_at_the_summary_trigger(
+        accumulate_summary_on_device
+):
+    it_tr, _ = get_dataset()
+    it_tr = it_tr[:4]
+
+    class NaNModel(Model):
+        def review(self, inputs, output):
+            review = super().review(inputs, output)
+            if self.training and inputs['example_id'] == it_tr[1]['example_id']:
+                review['loss'] = review['loss'] * float('nan')
+            return review
+
+    iterations = []
+
+    class IterationHook(pt.train.hooks.Hook):
+        def post_step(self, trainer, example, model_output, review):
+            iterations.append(trainer.iteration)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        t = pt.Trainer(
+            NaNModel(),
+            optimizer=pt.optimizer.Adam(),
+            storage_dir=str(tmp_dir),
+            stop_trigger=(2, 'epoch'),
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+            accumulate_summary_on_device=accumulate_summary_on_device,
+        )
+        t.register_hook(IterationHook())
+        with pytest.raises(AssertionError, match='not finite'):
+            t.train(train_iterator=it_tr, progress_bar=False)
+    # The loss is not checked in each step, but before the summary.
+    assert iterations == [0, 1, 2, 3], iterations
+    assert t.iteration == 4, t.iteration
+
+
+def test_detailed_timings_and_profiler():
+    it_tr, it_dt = get_dataset()
+    it_tr = it_tr[:4]
+    it_dt = it_dt[:2]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        t = pt.Trainer(
+            Model(),
+            optimizer=pt.optimizer.Adam(),
+            storage_dir=str(tmp_dir),
+            stop_trigger=(2, 'epoch'),
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+            detailed_timings=True,
+        )
+        t.register_validation_hook(validation_iterator=it_dt)
+        t.register_hook(pt.train.hooks.TorchProfilerHook(
+            start_iteration=1, num_steps=2,
+        ))
+        t.train(train_iterator=it_tr, progress_bar=False)
+
+        trace = pb.io.load_json(tmp_dir / 'profiler_trace_1.json')
+        assert len(trace['traceEvents']) > 0, trace
+
+        event_file, = tmp_dir.glob('*tfevents*')
+        tags = {
+            event['summary']['value'][0]['tag']
+            for event in load_events_as_dict(event_file)
+            if 'summary' in event
+        }
+        for tag in [
+            'training_timings/hooks/SummaryHook/post_step',
+            'training_timings/hooks/BackOffValidationHook/pre_step',
+            'training_timings/hooks/CheckpointHook/pre_step',
+            'training_timings/hooks/TorchProfilerHook/post_step',
+            'training_timings/time_per_clip_grad',
+            'training_timings/time_per_optimizer_step',
+            'training_timings/time_per_zero_grad',
+        ]:
+            assert tag in tags, (tag, tags)
+
+
+def test_asynchronous_validation():
+    it_tr, it_dt = get_dataset()
+    it_tr = it_tr[:2]
+    it_dt = it_dt[:2]
+
+    def train(storage_dir, asynchronous):
+        torch.manual_seed(0)
+        t = pt.Trainer(
+            Model(),
+            optimizer=pt.optimizer.Adam(),
+            storage_dir=str(storage_dir),
+            stop_trigger=(4, 'epoch'),
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+        )
+        t.register_validation_hook(
+            validation_iterator=it_dt, max_checkpoints=1,
+            asynchronous=asynchronous,
+        )
+        t.train(train_iterator=it_tr, progress_bar=False)
+
+        event_file, = storage_dir.glob('*tfevents*')
+        validation_losses = {
+            event.get('step', 0): event['summary']['value'][0]['simple_value']
+            for event in load_events_as_dict(event_file)
+            if 'summary' in event
+            and event['summary']['value'][0]['tag'] == 'validation/loss'
+        }
+        ckpt_ranking = torch.load(
+            str(storage_dir / 'checkpoints' / 'ckpt_latest.pth')
+        )['hooks']['BackOffValidationHook']['ckpt_ranking']
+        return validation_losses, ckpt_ranking
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        sync_losses, sync_ranking = train(tmp_dir / 'sync', False)
+        async_losses, async_ranking = train(tmp_dir / 'async', True)
+
+        assert sync_losses.keys() == async_losses.keys(), (
+            sync_losses, async_losses)
+        for step, loss in sync_losses.items():
+            np.testing.assert_allclose(async_losses[step], loss, rtol=1e-5)
+
+        best_ckpt = sync_ranking[0][0]
+        assert async_ranking[0][0] == best_ckpt, (sync_ranking, async_ranking)
+        ckpt_dir = tmp_dir / 'async' / 'checkpoints'
+        assert {f.name for f in ckpt_dir.glob('*')} == {
+            'ckpt_latest.pth', 'ckpt_best_loss.pth', 'ckpt_8.pth', best_ckpt,
+        }, (list(ckpt_dir.glob('*')), async_ranking)
+        assert (ckpt_dir / 'ckpt_best_loss.pth').resolve().name == best_ckpt
+
+
+def test_validation_workers():
+    it_tr, it_dt = get_dataset()
+    it_tr = it_tr[:2]
+    it_dt = it_dt[:5]
+
+    def train(storage_dir, num_workers):
+        torch.manual_seed(0)
+        t = pt.Trainer(
+            Model(),
+            optimizer=pt.optimizer.Adam(),
+            storage_dir=str(storage_dir),
+            stop_trigger=(2, 'epoch'),
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+        )
+        t.register_validation_hook(
+            validation_iterator=it_dt, num_workers=num_workers,
+        )
+        t.train(train_iterator=it_tr, progress_bar=False)
+
+        event_file, = storage_dir.glob('*tfevents*')
+        return {
+            (event['summary']['value'][0]['tag'], event.get('step', 0)):
+                event['summary']['value'][0].get('simple_value')
+            for event in load_events_as_dict(event_file)
+            if 'summary' in event
+            and event['summary']['value'][0]['tag'].startswith('validation')
+        }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        reference = train(tmp_dir / 'reference', 0)
+        # 3 workers for 5 examples, i.e. the shards have different lengths.
+        sharded = train(tmp_dir / 'sharded', 3)
+
+        assert reference.keys() == sharded.keys(), (reference, sharded)
+        for key, value in reference.items():
+            if key[0].startswith('validation_timings'):
+                continue
+            np.testing.assert_allclose(sharded[key], value, err_msg=str(key))
+        assert ('validation/loss', 0) in sharded, sharded
+
+
+def test_validation_workers_need_indexable_iterator(monkeypatch):
+    # Required by lazy_dataset for the prefetch with multiple threads.
+    monkeypatch.setenv('OMP_NUM_THREADS', '1')
+    monkeypatch.setenv('MKL_NUM_THREADS', '1')
+    _, it_dt = get_dataset()
+    it_dt = it_dt[:5]
+
+    for iterator in [it_dt.prefetch(2, 4), iter(it_dt)]:
+        with pytest.raises(ValueError, match='indexable iterator'):
+            pt.train.hooks.ValidationHook(
+                (1, 'epoch'), iterator, num_workers=2)
+    for iterator in [it_dt, list(it_dt)]:
+        pt.train.hooks.ValidationHook((1, 'epoch'), iterator, num_workers=2)
+    # Without workers, the iterator is only iterated.
+    pt.train.hooks.ValidationHook((1, 'epoch'), it_dt.prefetch(2, 4))
+
+
+@pytest.mark.parametrize('option,value', [
+    ('prefetch_to_device', 2),
+    ('background_summary_writer', True),
+    ('async_checkpoint', True),
+])
+def test_validation_workers_reject_background_threads(option, value):
+    it_tr, it_dt = get_dataset()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        t = pt.Trainer(
+            Model(),
+            optimizer=pt.optimizer.Adam(),
+            storage_dir=str(tmp_dir),
+            stop_trigger=(1, 'epoch'),
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+            **{option: value},
+        )
+        t.register_validation_hook(
+            validation_iterator=it_dt[:5], num_workers=2,
+        )
+        with pytest.raises(ValueError, match=option):
+            t.train(train_iterator=it_tr[:2], progress_bar=False)
+
+
+def test_validation_cache(capsys):
+    it_tr, it_dt = get_dataset()
+    it_tr = it_tr[:2]
+    it_dt = it_dt[:2]
+
+    def train(storage_dir):
+        torch.manual_seed(0)
+        t = pt.Trainer(
+            Model(),
+            optimizer=pt.optimizer.Adam(),
+            storage_dir=str(storage_dir),
+            stop_trigger=(2, 'epoch'),
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+        )
+        t.register_validation_hook(
+            validation_iterator=it_dt, validation_cache=cache_dir,
+        )
+        t.train(train_iterator=it_tr, progress_bar=False)
+
+        event_file, = storage_dir.glob('*tfevents*')
+        return {
+            event.get('step', 0): event['summary']['value'][0]['simple_value']
+            for event in load_events_as_dict(event_file)
+            if 'summary' in event
+            and event['summary']['value'][0]['tag'] == 'validation/loss'
+        }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        cache_dir = tmp_dir / 'cache'
+        losses = train(tmp_dir / 'first')
+        # Validation at iteration 0, 2 and 4.
+        assert len(list(cache_dir.iterdir())) == 3
+        assert 'from the cache' not in capsys.readouterr().out
+
+        # Same seed, i.e. the same weights are validated again.
+        cached_losses = train(tmp_dir / 'second')
+        out = capsys.readouterr().out
+        assert out.count(
+            'Loaded the validation summary from the cache') == 3, out
+        assert 'Starting Validation' not in out, out
+        assert len(list(cache_dir.iterdir())) == 3
+        assert cached_losses == losses, (cached_losses, losses)
+
+
+class MemoryLimitedModel(pt.Model):
+    """Raises an out of memory error for batches with more than
+    `max_batch_size` examples."""
+    def __init__(self, max_batch_size=None):
+        super().__init__()
+        self.l = torch.nn.Linear(3, 2)
+        self.max_batch_size = max_batch_size
+
+    def forward(self, inputs):
+        x = torch.as_tensor(inputs['x'])
+        if self.max_batch_size is not None \
+                and x.shape[0] > self.max_batch_size:
+            raise RuntimeError('CUDA out of memory. Tried to allocate 1 GiB')
+        return self.l(x)
+
+    def review(self, inputs, output):
+        return {
+            'loss': torch.mean(
+                (output - torch.as_tensor(inputs['y'])) ** 2),
+            'scalars': {'mean_output': torch.mean(output)},
+        }
+
+
+class GradPointerHook(pt.train.hooks.Hook):
+    def __init__(self):
+        self.data_ptrs = set()
+
+    def post_step(self, trainer, example, model_output, review):
+        self.data_ptrs.add(tuple(
+            p.grad.data_ptr() for p in trainer.model.parameters()))
+
+
+@pytest.mark.parametrize('virtual_minibatch_size,contiguous_grads', [
+    (1, False),
+    (2, False),
+    (2, True),
+])
+def test_split_batch_on_oom(virtual_minibatch_size, contiguous_grads):
+    rng = np.random.RandomState(0)
+    batches = [
+        {
+            'x': rng.randn(batch_size, 3).astype(np.float32),
+            'y': rng.randn(batch_size, 2).astype(np.float32),
+            'example_id': [str(i) for i in range(batch_size)],
+        }
+        for batch_size in [2, 5, 3, 7]
+    ]
+
+    def train(storage_dir, max_batch_size):
+        torch.manual_seed(0)
+        t = pt.Trainer(
+            MemoryLimitedModel(max_batch_size),
+            optimizer=pt.optimizer.SGD(
+                lr=0.1, contiguous_grads=contiguous_grads),
+            storage_dir=str(storage_dir),
+            stop_trigger=(1, 'epoch'),
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+            virtual_minibatch_size=virtual_minibatch_size,
+            split_batch_on_oom=max_batch_size is not None,
+        )
+        grad_pointers = GradPointerHook()
+        t.register_hook(grad_pointers)
+        t.train(train_iterator=batches, progress_bar=False, device='cpu')
+        if contiguous_grads:
+            # The gradients stay views of the same buffer.
+            assert len(grad_pointers.data_ptrs) == 1, grad_pointers.data_ptrs
+        event_file, = storage_dir.glob('*tfevents*')
+        scalars = {
+            event['summary']['value'][0]['tag']:
+                event['summary']['value'][0]['simple_value']
+            for event in load_events_as_dict(event_file)
+            if 'summary' in event
+            and 'simple_value' in event['summary']['value'][0]
+        }
+        return t.model, scalars
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        reference, reference_scalars = train(tmp_dir / 'reference', None)
+        with pytest.warns(UserWarning, match='Out of memory in iteration'):
+            model, scalars = train(tmp_dir / 'split', 2)
+
+        for (name, p_ref), p in zip(
+                reference.named_parameters(), model.parameters()):
+            np.testing.assert_allclose(
+                p.detach().numpy(), p_ref.detach().numpy(), rtol=1e-5,
+                err_msg=name,
+            )
+        np.testing.assert_allclose(
+            scalars['training/loss'], reference_scalars['training/loss'],
+            rtol=1e-5,
+        )
+        # Batch sizes 5 and 7 are split into 4 parts and batch size 3 into
+        # 2 parts.
+        assert scalars['training/oom_split'] == 0.75, scalars
+        assert scalars['training/oom_batch_parts'] == 11 / 4, scalars
+        np.testing.assert_allclose(
+            scalars['training/mean_output'],
+            reference_scalars['training/mean_output'], rtol=1e-5,
+        )
+
+        # A single example, that does not fit into the memory.
+        with pytest.raises(RuntimeError, match='out of memory'):
+            train(tmp_dir / 'too_large', 0)
+
+
+class WeightRecorderHook(pt.train.hooks.Hook):
+    def __init__(self):
+        self.weights = []
+
+    def post_step(self, trainer, example, model_output, review):
+        self.weights.append({
+            k: v.detach().clone()
+            for k, v in trainer.model.state_dict().items()
+        })
+
+
+@pytest.mark.parametrize('decay,device,asynchronous', [
+    (0.5, None, False),
+    (None, 'cpu', False),
+    (0.5, None, True),
+])
+def test_weight_averaging(decay, device, asynchronous):
+    it_tr, it_dt = get_dataset()
+    it_tr = it_tr[:2]
+    it_dt = it_dt[:2]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        torch.manual_seed(0)
+        t = pt.Trainer(
+            Model(),
+            optimizer=pt.optimizer.Adam(lr=0.1),
+            storage_dir=str(tmp_dir),
+            stop_trigger=(2, 'epoch'),
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+        )
+        recorder = WeightRecorderHook()
+        t.register_hook(recorder)
+        t.register_hook(pt.train.hooks.WeightAveragingHook(
+            decay=decay, device=device, checkpoint_trigger=(1, 'epoch'),
+        ))
+        t.register_validation_hook(
+            validation_iterator=it_dt, asynchronous=asynchronous)
+        t.train(train_iterator=it_tr, progress_bar=False)
+
+        # The recorder is called before the WeightAveragingHook, i.e. it
+        # records the weights after each optimizer step.
+        assert len(recorder.weights) == 4, len(recorder.weights)
+        expected = {}
+        for count, weights in enumerate(recorder.weights):
+            d = count / (count + 1) if decay is None else decay
+            if count == 0:
+                d = 0
+            expected = {
+                k: d * expected.get(k, 0) + (1 - d) * v
+                for k, v in weights.items()
+            }
+
+        averaged = torch.load(tmp_dir / 'checkpoints' / 'ckpt_averaged.pth')
+        assert averaged['iteration'] == 4, averaged['iteration']
+        assert averaged['count'] == 4, averaged['count']
+        for k, v in expected.items():
+            np.testing.assert_allclose(
+                averaged['model'][k].numpy(), v.numpy(), rtol=1e-5, atol=1e-7)
+        # The model itself is not averaged.
+        np.testing.assert_equal(
+            t.model.l.weight.detach().numpy(),
+            recorder.weights[-1]['l.weight'].numpy(),
+        )
+
+        # The averaged weights are not part of the trainer checkpoint.
+        ckpt = torch.load(tmp_dir / 'checkpoints' / 'ckpt_latest.pth')
+        assert ckpt['hooks']['WeightAveragingHook'] == {
+            'count': 4, 'iteration': 4}
+
+        # The last validation (iteration 4) used the averaged weights.
+        model = Model()
+        model.load_state_dict(averaged['model'])
+        with torch.no_grad():
+            loss = np.mean([
+                model.review(example, model(example))['loss'].item()
+                for example in it_dt
+            ])
+        event_file, = tmp_dir.glob('*tfevents*')
+        validation_losses = {
+            event['step']: event['summary']['value'][0]['simple_value']
+            for event in load_events_as_dict(event_file)
+            if 'summary' in event
+            and event['summary']['value'][0]['tag'] == 'validation/loss'
+            and 'step' in event
+        }
+        np.testing.assert_allclose(validation_losses[4], loss, rtol=1e-5)
+
+
+def test_weight_averaging_virtual_minibatch_size():
+    it_tr, _ = get_dataset()
+    it_tr = it_tr[:4]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        t = pt.Trainer(
+            Model(),
+            optimizer=pt.optimizer.Adam(lr=0.1),
+            storage_dir=str(tmp_dir),
+            stop_trigger=(1, 'epoch'),
+            summary_trigger=(1, 'epoch'),
+            checkpoint_trigger=(1, 'epoch'),
+            virtual_minibatch_size=2,
+        )
+        recorder = WeightRecorderHook()
+        t.register_hook(recorder)
+        t.register_hook(pt.train.hooks.WeightAveragingHook(
+            decay=0.5, checkpoint_trigger=(1, 'epoch'),
+        ))
+        t.train(train_iterator=it_tr, progress_bar=False)
+
+        averaged = pt.train.checkpoint.torch_load(
+            tmp_dir / 'checkpoints' / 'ckpt_averaged.pth')
+        # Only the iterations 1 and 3 have an optimizer step.
+        assert averaged['count'] == 2, averaged['count']
+        for k, v in averaged['model'].items():
+            np.testing.assert_allclose(
+                v.numpy(),
+                (0.5 * recorder.weights[1][k] + 0.5 * recorder.weights[3][k]
+                 ).numpy(),
+                rtol=1e-5, atol=1e-7,
+            )